@@ -0,0 +1,70 @@
+import threading
+
+"""
+Admission control of the API requests. Each request is given a class: 'light' for the point
+lookups and the keyset pages, whose cost is bounded, and 'heavy' for the full flight lists, the
+streams and the exports, which may read a large part of the flights table. Each class has its own
+limit of requests running at once (ADMISSION_LIMITS), so heavy requests can never hold all the
+server threads and the point lookups keep being answered while they run. A request finding its
+class full waits up to ADMISSION_WAIT seconds for a slot, then is rejected, and the client is told
+to come back after RETRY_AFTER seconds.
+"""
+ADMISSION_LIMITS = {'light': 32, 'heavy': 4}
+ADMISSION_WAIT = 0.5
+RETRY_AFTER = 2
+
+
+class AdmissionTicket:
+    """
+    The slot taken by an admitted request, given back with release().
+    Releasing a ticket more than once has no effect.
+    """
+
+    def __init__(self, semaphore):
+        self._semaphore = semaphore
+        self._lock = threading.Lock()
+        self._released = False
+
+    def release(self):
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._semaphore.release()
+
+
+class AdmissionController:
+    """
+    The AdmissionController class limits the number of requests of each class (see ADMISSION_LIMITS)
+    running at once, and counts the admitted and rejected requests.
+    """
+
+    def __init__(self, limits=None):
+        self.limits = dict(limits or ADMISSION_LIMITS)
+        self._semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in self.limits.items()}
+        self._lock = threading.Lock()
+        self._admitted = {name: 0 for name in self.limits}
+        self._rejected = {name: 0 for name in self.limits}
+
+    def try_acquire(self, request_class, timeout=ADMISSION_WAIT):
+        """
+        Takes a slot of the given request class, waiting up to timeout seconds (0 does not wait).
+        Returns an AdmissionTicket, or None if the class stayed full.
+        """
+        semaphore = self._semaphores[request_class]
+        acquired = semaphore.acquire(timeout=timeout) if timeout else semaphore.acquire(blocking=False)
+        with self._lock:
+            if acquired:
+                self._admitted[request_class] += 1
+            else:
+                self._rejected[request_class] += 1
+        return AdmissionTicket(semaphore) if acquired else None
+
+    def stats(self):
+        """
+        Returns the limit and the admitted and rejected counters of every request class.
+        """
+        with self._lock:
+            return {name: {'limit': self.limits[name], 'admitted': self._admitted[name],
+                           'rejected': self._rejected[name]}
+                    for name in self.limits}
@@ -1,171 +1,548 @@
-from flask import Flask, jsonify, request
+import os
+import time
+from flask import Flask, Response, g, jsonify, request
 from main import *
+from admission import ADMISSION_WAIT, RETRY_AFTER, AdmissionController
+from metrics import PROMETHEUS_CONTENT_TYPE, MetricsRegistry
+from compression import compress_response
+from export import EXPORT_FILE_EXTENSIONS, EXPORT_FORMATS, export_available, write_export
+from http_cache import CACHED_METHODS, is_not_modified, not_modified_response, set_validators, validators
+from partitions import PartitionedFlightData
+from query_cache import QueryCache
+from serialization import (API_FLIGHT_FIELDS, JSON_MIMETYPE, TRUNCATED_HEADER, dumps, iter_flights, row_getter,
+                           serialize_flights)
 
 
 app = Flask(__name__)
 
-SQLITE_URI = 'sqlite:///data/flights.sqlite3'
-data_manager = data.FlightDataVisuals(SQLITE_URI)
+SQLITE_URI = os.environ.get('SKYSQL_DB_URI', 'sqlite:///data/flights.sqlite3')
+ENGINE_PROFILE = os.environ.get('SKYSQL_ENGINE_PROFILE', 'readonly')
+PARTITIONS_DIR = os.environ.get('SKYSQL_PARTITIONS_DIR')
+MAX_PAGE_LIMIT = 10000
+MAX_BATCH_IDS = 10000
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+STREAM_FORMATS = {'ndjson': 'application/x-ndjson', 'json': 'application/json'}
+
+"""
+Bounds of the API queries: a query running longer than QUERY_TIMEOUT seconds is interrupted and the
+request answered with 503, and the full flight lists stop at MAX_RESULT_ROWS flights (the response
+then has the TRUNCATED_HEADER; the keyset pages give the rest). The list endpoints are 'heavy'
+requests for the admission control (see admission.py), unless they ask for a page.
+"""
+QUERY_TIMEOUT = float(os.environ.get('SKYSQL_QUERY_TIMEOUT', 10))
+MAX_RESULT_ROWS = 100000
+HEAVY_ENDPOINTS = ('get_flights', 'get_export', 'get_flights_by_date', 'get_delayed_flights_by_airline',
+                   'get_delayed_flights_by_airport')
+metrics = MetricsRegistry()
+admission = AdmissionController()
+if PARTITIONS_DIR:
+    data_manager = PartitionedFlightData(PARTITIONS_DIR, use_summaries=True, engine_profile=ENGINE_PROFILE,
+                                         metrics=metrics, query_timeout=QUERY_TIMEOUT, max_rows=MAX_RESULT_ROWS)
+else:
+    data_manager = data.FlightDataVisuals(SQLITE_URI, use_summaries=True, engine_profile=ENGINE_PROFILE,
+                                          cache=QueryCache(CACHE_MAX_ENTRIES, CACHE_MAX_BYTES), metrics=metrics,
+                                          query_timeout=QUERY_TIMEOUT, max_rows=MAX_RESULT_ROWS)
+
+
+def json_response(obj):
+    """
+    Returns obj encoded with the fast JSON encoder (see serialization.dumps) as a response.
+    A truncated list of flights (see data.TruncatedRecords) is flagged with the TRUNCATED_HEADER.
+    """
+    response = Response(dumps(obj), mimetype=JSON_MIMETYPE)
+    if getattr(obj, 'truncated', False):
+        response.headers[TRUNCATED_HEADER] = 'true'
+    return response
 
 
-def flight_by_id(data_manager, flight_id):
+def retry_later_response(status, message):
     """
-    Fetches flight details by ID from the data manager and returns them.
+    Returns an error response asking the client to retry after RETRY_AFTER seconds.
     """
-    results = data_manager.get_flight_by_id(flight_id)
-
-    flight_details = []
-    for result in results:
-        result_dict = dict(result._mapping)
-        delay = int(result_dict.get('DELAY', 0))
-        flight_details.append({
-            'ID': result_dict.get('ID'),
-            'ORIGIN_AIRPORT': result_dict.get('ORIGIN_AIRPORT'),
-            'DESTINATION_AIRPORT': result_dict.get('DESTINATION_AIRPORT'),
-            'AIRLINE': result_dict.get('AIRLINE'),
-            'DELAY': delay
-        })
-    return flight_details
+    return jsonify({'error': message}), status, {'Retry-After': str(RETRY_AFTER)}
 
 
-def flights_by_date(data_manager, day, month, year):
+def request_class(endpoint, args):
     """
-    Fetches flights by date from the data manager and returns them as a list of dictionaries.
+    Returns the admission class of a request (see admission.py): the list endpoints are heavy,
+    unless they are asked for a keyset page.
     """
-    results = data_manager.get_flights_by_date(day, month, year)
+    if endpoint in HEAVY_ENDPOINTS and ('limit' not in args or 'stream' in args):
+        return 'heavy'
+    return 'light'
 
-    flight_details = []
-    for result in results:
-        result_dict = dict(result._mapping)
 
-        delay_str = result_dict.get('DELAY', '')
+def get_list_arguments(args):
+    """
+    Reads the pagination and streaming arguments of the list endpoints from the request args:
+    'limit' (page size), 'after' (ID of the last flight of the previous page)
+    and 'stream' (ndjson or json).
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    limit = args.get('limit')
+    after = args.get('after')
+    stream_format = args.get('stream')
+
+    if limit is not None:
+        if not limit.isdigit() or not 0 < int(limit) <= MAX_PAGE_LIMIT:
+            raise ValueError(f'limit must be an integer between 1 and {MAX_PAGE_LIMIT}')
+        limit = int(limit)
+    if after is not None:
         try:
-            delay = int(delay_str) if delay_str else 0
+            after = int(after)
         except ValueError:
-            delay = 0
+            raise ValueError('after must be a flight ID')
+    if stream_format is not None and stream_format not in STREAM_FORMATS:
+        raise ValueError(f'stream must be one of: {", ".join(STREAM_FORMATS)}')
+    if stream_format and limit is not None:
+        raise ValueError('stream and limit cannot be combined')
+    return limit, after, stream_format
 
-        flight_details.append({
-            'ID': result_dict.get('ID'),
-            'ORIGIN_AIRPORT': result_dict.get('ORIGIN_AIRPORT'),
-            'DESTINATION_AIRPORT': result_dict.get('DESTINATION_AIRPORT'),
-            'AIRLINE': result_dict.get('AIRLINE'),
-            'DELAY': delay
-        })
 
-    return flight_details
+def page_response(flight_details, limit):
+    """
+    Wraps a keyset page of flights together with the cursor of the next page
+    (None when this is the last page).
+    """
+    next_after = flight_details[-1]['ID'] if len(flight_details) == limit else None
+    return json_response({'flights': flight_details, 'next_after': next_after})
 
 
-def delayed_flights_by_airline(data_manager, airline_name):
+def stream_response(results, stream_format):
     """
-    Fetches delayed flights by airline from the data manager and returns them.
+    Streams the records from a database cursor as a chunked response, either
+    as newline delimited JSON or as a single JSON array.
     """
-    results = data_manager.get_delayed_flights_by_airline(airline_name)
+    def generate_ndjson():
+        for flight in iter_flights(results):
+            yield dumps(flight) + b'\n'
+
+    def generate_json_array():
+        separator = b''
+        yield b'['
+        for flight in iter_flights(results):
+            yield separator + dumps(flight)
+            separator = b','
+        yield b']'
+
+    generate = generate_ndjson if stream_format == 'ndjson' else generate_json_array
+    return Response(generate(), mimetype=STREAM_FORMATS[stream_format])
 
+
+def flight_by_id(data_manager, flight_id):
+    """
+    Fetches flight details by ID from the data manager and returns them.
+    """
+    return serialize_flights(data_manager.get_flight_by_id(flight_id))
+
+
+def flights_by_ids(data_manager, flight_ids):
+    """
+    Fetches the details of many flights by ID from the data manager and returns them
+    in the requested order, with an error entry for each ID that was not found.
+    """
+    results = data_manager.get_flights_by_ids(flight_ids)
+
+    getter = None
     flight_details = []
-    for result in results:
-        result_dict = dict(result._mapping)
-        delay_str = result_dict.get('DELAY', '')
-        try:
-            delay = int(delay_str) if delay_str else 0
-        except ValueError:
-            delay = 0
-
-        flight_details.append({
-                'ID': result_dict.get('ID'),
-                'ORIGIN_AIRPORT': result_dict.get('ORIGIN_AIRPORT'),
-                'DESTINATION_AIRPORT': result_dict.get('DESTINATION_AIRPORT'),
-                'AIRLINE': result_dict.get('AIRLINE'),
-                'DELAY': delay
-            })
+    for flight_id, result in zip(flight_ids, results):
+        if result is None:
+            flight_details.append({'ID': flight_id, 'error': 'No flight found with this ID'})
+            continue
+        if getter is None:
+            getter = row_getter(result._fields)
+        flight_details.append(dict(zip(API_FLIGHT_FIELDS, getter(result))))
     return flight_details
 
 
-def delayed_flights_by_airport(data_manager, airport_code):
+def flights_by_date(data_manager, day, month, year, limit=None, after=None):
+    """
+    Fetches flights by date from the data manager and returns them as a list of dictionaries.
+    """
+    return serialize_flights(data_manager.get_flights_by_date(day, month, year, limit, after))
+
+
+def delayed_flights_by_airline(data_manager, airline_name, limit=None, after=None):
+    """
+    Fetches delayed flights by airline from the data manager and returns them.
+    """
+    return serialize_flights(data_manager.get_delayed_flights_by_airline(airline_name, limit, after))
+
+
+def delayed_flights_by_airport(data_manager, airport_code, limit=None, after=None):
     """
     Fetches delayed flights by airport code from the data manager and returns them.
     """
-    results = data_manager.get_delayed_flights_by_airport(airport_code)
+    return serialize_flights(data_manager.get_delayed_flights_by_airport(airport_code, limit, after))
 
-    flight_details = []
-    for result in results:
-        result_dict = dict(result._mapping)
 
-        delay_str = result_dict.get('DELAY', '')
+def get_search_filters(args):
+    """
+    Reads the flight search filters from the request args: 'start_date' and 'end_date'
+    (DD/MM/YYYY), 'airline' (name), 'origin' and 'destination' (IATA codes) and
+    'min_delay' (minutes). Returns a dictionary with the given filters.
+    Raises ValueError with a message for the client if a filter is invalid.
+    """
+    filters = {}
+    for name in ('start_date', 'end_date'):
+        if args.get(name):
+            try:
+                filters[name] = datetime.strptime(args[name], '%d/%m/%Y').date()
+            except ValueError:
+                raise ValueError(f'{name} format must be DD/MM/YYYY')
+    if args.get('airline'):
+        filters['airline'] = args['airline']
+    for name in ('origin', 'destination'):
+        if args.get(name):
+            if not (args[name].isalpha() and len(args[name]) == 3):
+                raise ValueError(f'{name} must be a valid 3-letter airport code')
+            filters[name] = args[name].upper()
+    if args.get('min_delay'):
         try:
-            delay = int(delay_str) if delay_str else 0
+            filters['min_delay'] = int(args['min_delay'])
         except ValueError:
-            delay = 0
+            raise ValueError('min_delay must be an integer number of minutes')
+    return filters
 
-        flight_details.append({
-            'ID': result_dict.get('ID'),
-            'ORIGIN_AIRPORT': result_dict.get('ORIGIN_AIRPORT'),
-            'DESTINATION_AIRPORT': result_dict.get('DESTINATION_AIRPORT'),
-            'AIRLINE': result_dict.get('AIRLINE'),
-            'DELAY': delay
-        })
 
-    return flight_details
+def search_flights(data_manager, filters, limit=None, after=None):
+    """
+    Searches for the flights matching the filters and returns them as a list of dictionaries.
+    """
+    return serialize_flights(data_manager.search_flights(**filters, limit=limit, after=after))
 
 
-@app.route('/api/flight_number', methods=['GET'])
-def get_flight_by_number():
-    flight_no = request.args.get('flight_no')
+def get_flight_number_argument(args):
+    """
+    Reads the 'flight_no' argument (a flight ID) of the flight_number endpoint.
+    Raises ValueError with a message for the client if it is missing or invalid.
+    """
+    flight_no = args.get('flight_no')
     if not flight_no:
-        return jsonify({'error': 'Please provide a flight ID'}), 400
-
+        raise ValueError('Please provide a flight ID')
     try:
-        flight_no = int(flight_no)  # Convert to integer
-        flight_details = flight_by_id(data_manager, flight_no)
-        if not flight_details:
-            return jsonify({'error': 'No flight found with this ID'}), 404
-        return jsonify(flight_details), 200
+        return int(flight_no)
     except ValueError:
-        return jsonify({'error': 'Invalid flight ID format'}), 400
+        raise ValueError('Invalid flight ID format')
 
 
-@app.route('/api/flights_by_date', methods=['GET'])
-def get_flights_by_date():
-    # Get date from request arguments
-    date_str = request.args.get('date')
+def get_flight_ids(flight_ids):
+    """
+    Checks a list of flight IDs (from the comma separated 'ids' argument or a JSON body)
+    and returns them as integers.
+    Raises ValueError with a message for the client if the list is missing, too long or invalid.
+    """
+    if not flight_ids or not isinstance(flight_ids, list):
+        raise ValueError('Please provide a list of flight IDs')
+    if len(flight_ids) > MAX_BATCH_IDS:
+        raise ValueError(f'Please provide at most {MAX_BATCH_IDS} flight IDs')
+    try:
+        return [int(flight_id) for flight_id in flight_ids]
+    except (TypeError, ValueError):
+        raise ValueError('Invalid flight ID format')
 
-    if not date_str:
-        return jsonify({'error': 'Please provide a date in DD/MM/YYYY format'}), 400
 
+def get_flight_ids_argument(args):
+    """
+    Reads the comma separated 'ids' argument of the flights_by_ids endpoint (see get_flight_ids).
+    """
+    ids_str = args.get('ids')
+    return get_flight_ids(ids_str.split(',') if ids_str else None)
+
+
+def get_search_arguments(args):
+    """
+    Reads the search filters (at least one is required) and the list arguments of the flights endpoint.
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    filters = get_search_filters(args)
+    limit, after, stream_format = get_list_arguments(args)
+    if not filters:
+        raise ValueError('Please provide at least one of: start_date, end_date, airline, '
+                         'origin, destination, min_delay')
+    return filters, limit, after, stream_format
+
+
+def get_export_arguments(args):
+    """
+    Reads the 'format' (parquet by default) and the search filters of the export endpoint.
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    export_format = args.get('format', 'parquet')
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f'format must be one of: {", ".join(EXPORT_FORMATS)}')
+    return export_format, get_search_filters(args)
+
+
+def get_date_arguments(args):
+    """
+    Reads the 'date' (DD/MM/YYYY) and the list arguments of the flights_by_date endpoint.
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    date_str = args.get('date')
+    if not date_str:
+        raise ValueError('Please provide a date in DD/MM/YYYY format')
     try:
         date = datetime.strptime(date_str, '%d/%m/%Y')
     except ValueError:
-        return jsonify({'error': 'Date format must be DD/MM/YYYY'}), 400
+        raise ValueError('Date format must be DD/MM/YYYY')
+    return (date, *get_list_arguments(args))
+
+
+def get_airline_arguments(args):
+    """
+    Reads the 'airline_name' and the list arguments of the delayed_flights_by_airline endpoint.
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    airline_name = args.get('airline_name')
+    if not airline_name:
+        raise ValueError('Please provide an airline name')
+    return (airline_name, *get_list_arguments(args))
+
+
+def get_airport_arguments(args):
+    """
+    Reads the 'airport_code' and the list arguments of the delayed_flights_by_airport endpoint.
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    airport_code = args.get('airport_code')
+    if not airport_code or not (airport_code.isalpha() and len(airport_code) == 3):
+        raise ValueError('Please provide a valid 3-letter airport code')
+    return (airport_code, *get_list_arguments(args))
+
+
+"""
+Argument readers of the API endpoints, by endpoint. They only parse the request args, so a
+conditional request is validated before its view runs (see answer_unchanged_request).
+"""
+ARGUMENT_READERS = {
+    'get_flight_by_number': get_flight_number_argument,
+    'get_flights_by_ids': get_flight_ids_argument,
+    'get_flights': get_search_arguments,
+    'get_export': get_export_arguments,
+    'get_flights_by_date': get_date_arguments,
+    'get_delayed_flights_by_airline': get_airline_arguments,
+    'get_delayed_flights_by_airport': get_airport_arguments,
+}
+
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def record_request_metrics(response):
+    # Streamed responses are timed until their first chunk, and their size is unknown
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    size = None if response.is_streamed else response.calculate_content_length()
+    metrics.observe_request(endpoint, request.method, response.status_code,
+                            time.perf_counter() - g.request_start, size)
+    return response
+
+
+@app.before_request
+def read_validators():
+    # The validators are taken before the query runs, so they never claim newer data than it read
+    g.validators = None
+    if request.method in CACHED_METHODS and request.path.startswith('/api/'):
+        g.validators = validators(data_manager.data_version())
+
+
+@app.before_request
+def answer_unchanged_request():
+    # The API responses only change with the data version, so a client holding the current one
+    # gets a 304 before the request is admitted and its view runs, without querying SQLite.
+    # Only a request with valid arguments is answered here: an invalid one goes on to get its 400.
+    if g.validators is None or request.endpoint not in ARGUMENT_READERS:
+        return None
+    if not is_not_modified(request, *g.validators):
+        return None
+    try:
+        ARGUMENT_READERS[request.endpoint](request.args)
+    except ValueError:
+        return None
+    return not_modified_response(*g.validators)
+
+
+@app.before_request
+def admit_request():
+    g.admission_ticket = None
+    if not request.path.startswith('/api/'):
+        return None
+    g.admission_ticket = admission.try_acquire(request_class(request.endpoint, request.args), ADMISSION_WAIT)
+    if g.admission_ticket is None:
+        return retry_later_response(429, 'Too many requests of this kind are running, please retry later')
+    return None
+
+
+@app.after_request
+def release_admission_on_close(response):
+    # A stream keeps its slot until its last chunk was sent (its request context ends before that)
+    ticket = g.get('admission_ticket')
+    if ticket is not None and response.is_streamed:
+        response.call_on_close(ticket.release)
+        g.admission_ticket = None
+    return response
+
+
+@app.teardown_request
+def release_admission(exception=None):
+    # The other requests give their slot back as soon as their response is built
+    ticket = g.get('admission_ticket')
+    if ticket is not None:
+        ticket.release()
+
+
+@app.errorhandler(data.QueryTimeoutError)
+def query_timed_out(e):
+    return retry_later_response(503, 'The query took too long and was cancelled, please retry later')
+
+
+@app.after_request
+def compress_json_response(response):
+    return compress_response(response, request.accept_encodings)
+
+
+@app.after_request
+def answer_conditional_request(response):
+    # Sets the validators of the successful responses. A conditional request that was not answered
+    # before its view (an endpoint without an argument reader) still gets a 304 without the body;
+    # a streamed body is dropped before it runs its query.
+    if g.get('validators') is None or response.status_code != 200:
+        return response
+    if is_not_modified(request, *g.validators):
+        response.close()
+        return not_modified_response(*g.validators)
+    return set_validators(response, *g.validators)
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(data_manager.cache_stats(), admission.stats()),
+                    content_type=PROMETHEUS_CONTENT_TYPE)
 
-    results = flights_by_date(data_manager, date.day, date.month, date.year)
+
+@app.route('/api/flight_number', methods=['GET'])
+def get_flight_by_number():
+    try:
+        flight_no = get_flight_number_argument(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    flight_details = flight_by_id(data_manager, flight_no)
+    if not flight_details:
+        return jsonify({'error': 'No flight found with this ID'}), 404
+    return json_response(flight_details), 200
+
+
+@app.route('/api/flights_by_ids', methods=['GET', 'POST'])
+def get_flights_by_ids():
+    # IDs come as a comma separated query string (GET) or as a JSON body {"ids": [...]} (POST)
+    try:
+        if request.method == 'POST':
+            body = request.get_json(silent=True) or {}
+            flight_ids = get_flight_ids(body.get('ids'))
+        else:
+            flight_ids = get_flight_ids_argument(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    return json_response(flights_by_ids(data_manager, flight_ids)), 200
+
+
+@app.route('/api/flights', methods=['GET'])
+def get_flights():
+    try:
+        filters, limit, after, stream_format = get_search_arguments(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if stream_format:
+        results = data_manager.search_flights(**filters, after=after, stream=True)
+        return stream_response(results, stream_format)
+
+    results = search_flights(data_manager, filters, limit, after)
+    if limit is not None:
+        return page_response(results, limit), 200
+    if not results:
+        return jsonify({'message': 'No flights found'}), 404
+    return json_response(results), 200
+
+
+@app.route('/api/export', methods=['GET'])
+def get_export():
+    # Streams the flights matching the search filters as an Arrow IPC stream or a Parquet file
+    try:
+        export_format, filters = get_export_arguments(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not export_available():
+        return jsonify({'error': 'Exports are not available: pyarrow is not installed'}), 501
+
+    chunks = write_export(data_manager.export_flights(**filters), export_format)
+    filename = f"flights.{EXPORT_FILE_EXTENSIONS[export_format]}"
+    return Response(chunks, mimetype=EXPORT_FORMATS[export_format],
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+@app.route('/api/flights_by_date', methods=['GET'])
+def get_flights_by_date():
+    try:
+        date, limit, after, stream_format = get_date_arguments(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if stream_format:
+        results = data_manager.get_flights_by_date(date.day, date.month, date.year, after=after, stream=True)
+        return stream_response(results, stream_format)
+
+    results = flights_by_date(data_manager, date.day, date.month, date.year, limit, after)
+    if limit is not None:
+        return page_response(results, limit), 200
     if not results:
         return jsonify({'message': 'No flights found for this date'}), 404
-    return jsonify(results), 200
+    return json_response(results), 200
 
 
 @app.route('/api/delayed_flights_by_airline', methods=['GET'])
 def get_delayed_flights_by_airline():
-    airline_name = request.args.get('airline_name')
-    if not airline_name:
-        return jsonify({'error': 'Please provide an airline name'}), 400
+    try:
+        airline_name, limit, after, stream_format = get_airline_arguments(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    if stream_format:
+        results = data_manager.get_delayed_flights_by_airline(airline_name, after=after, stream=True)
+        return stream_response(results, stream_format)
 
-    flight_details = delayed_flights_by_airline(data_manager, airline_name)
+    flight_details = delayed_flights_by_airline(data_manager, airline_name, limit, after)
+    if limit is not None:
+        return page_response(flight_details, limit), 200
     if not flight_details:
         return jsonify({'error': 'No flights found for this airline'}), 404
 
-    return jsonify(flight_details), 200
+    return json_response(flight_details), 200
 
 
 @app.route('/api/delayed_flights_by_airport', methods=['GET'])
 def get_delayed_flights_by_airport():
-    airport_code = request.args.get('airport_code')
+    try:
+        airport_code, limit, after, stream_format = get_airport_arguments(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-    if not airport_code or not (airport_code.isalpha() and len(airport_code) == 3):
-        return jsonify({'error': 'Please provide a valid 3-letter airport code'}), 400
+    if stream_format:
+        results = data_manager.get_delayed_flights_by_airport(airport_code, after=after, stream=True)
+        return stream_response(results, stream_format)
 
-    results = delayed_flights_by_airport(data_manager, airport_code)
+    results = delayed_flights_by_airport(data_manager, airport_code, limit, after)
+    if limit is not None:
+        return page_response(results, limit), 200
     if not results:
         return jsonify({'message': 'No delayed flights found'}), 404
-    return jsonify(results), 200
+    return json_response(results), 200
 
 
 if __name__ == '__main__':
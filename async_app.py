@@ -0,0 +1,187 @@
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from quart import Quart, Response, g, jsonify, request
+from admission import RETRY_AFTER, AdmissionController
+from app import (data_manager, metrics, flight_by_id, flights_by_date, delayed_flights_by_airline,
+                 delayed_flights_by_airport, get_list_arguments, request_class)
+from data import QueryTimeoutError
+from serialization import JSON_MIMETYPE, TRUNCATED_HEADER, dumps
+from metrics import PROMETHEUS_CONTENT_TYPE
+
+"""
+The asynchronous variant of the API server (app.py), exposing the same endpoints.
+The database work runs on bounded thread pools, so the event loop is never blocked:
+point lookups have their own pool and do not queue behind slow list queries.
+The admission control (see admission.py) does not wait for a slot here, as it would block
+the event loop: a request finding its class full is rejected at once.
+"""
+LIGHT_WORKERS = 4
+HEAVY_WORKERS = 4
+
+app = Quart(__name__)
+light_executor = ThreadPoolExecutor(max_workers=LIGHT_WORKERS, thread_name_prefix='light-query')
+heavy_executor = ThreadPoolExecutor(max_workers=HEAVY_WORKERS, thread_name_prefix='heavy-query')
+admission = AdmissionController()
+
+
+async def run_query(executor, func, *args):
+    """
+    Runs a blocking data manager call on the given executor and awaits its result.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+def get_page_arguments():
+    """
+    Reads the 'limit' and 'after' pagination arguments (streaming is only offered by app.py).
+    Raises ValueError with a message for the client if an argument is invalid.
+    """
+    limit, after, stream_format = get_list_arguments(request.args)
+    if stream_format:
+        raise ValueError('stream is not supported by the async server')
+    return limit, after
+
+
+def json_response(obj):
+    """
+    Returns obj encoded with the fast JSON encoder (see serialization.dumps) as a response.
+    A truncated list of flights (see data.TruncatedRecords) is flagged with the TRUNCATED_HEADER.
+    """
+    response = Response(dumps(obj), mimetype=JSON_MIMETYPE)
+    if getattr(obj, 'truncated', False):
+        response.headers[TRUNCATED_HEADER] = 'true'
+    return response
+
+
+def list_response(flight_details, limit, not_found):
+    """
+    Returns a page of flights (if a limit was given), the flights, or the not found error.
+    """
+    if limit is not None:
+        next_after = flight_details[-1]['ID'] if len(flight_details) == limit else None
+        return json_response({'flights': flight_details, 'next_after': next_after}), 200
+    if not flight_details:
+        return jsonify(not_found), 404
+    return json_response(flight_details), 200
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+async def record_request_metrics(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.observe_request(endpoint, request.method, response.status_code,
+                            time.perf_counter() - g.request_start, response.content_length)
+    return response
+
+
+@app.before_request
+async def admit_request():
+    g.admission_ticket = None
+    if not request.path.startswith('/api/'):
+        return None
+    g.admission_ticket = admission.try_acquire(request_class(request.endpoint, request.args), timeout=0)
+    if g.admission_ticket is None:
+        return (jsonify({'error': 'Too many requests of this kind are running, please retry later'}), 429,
+                {'Retry-After': str(RETRY_AFTER)})
+    return None
+
+
+@app.teardown_request
+async def release_admission(exception=None):
+    ticket = g.get('admission_ticket')
+    if ticket is not None:
+        ticket.release()
+
+
+@app.errorhandler(QueryTimeoutError)
+async def query_timed_out(e):
+    return (jsonify({'error': 'The query took too long and was cancelled, please retry later'}), 503,
+            {'Retry-After': str(RETRY_AFTER)})
+
+
+@app.route('/metrics', methods=['GET'])
+async def get_metrics():
+    return Response(metrics.render(data_manager.cache_stats(), admission.stats()),
+                    content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.route('/api/flight_number', methods=['GET'])
+async def get_flight_by_number():
+    flight_no = request.args.get('flight_no')
+    if not flight_no:
+        return jsonify({'error': 'Please provide a flight ID'}), 400
+
+    try:
+        flight_no = int(flight_no)  # Convert to integer
+    except ValueError:
+        return jsonify({'error': 'Invalid flight ID format'}), 400
+
+    flight_details = await run_query(light_executor, flight_by_id, data_manager, flight_no)
+    if not flight_details:
+        return jsonify({'error': 'No flight found with this ID'}), 404
+    return json_response(flight_details), 200
+
+
+@app.route('/api/flights_by_date', methods=['GET'])
+async def get_flights_by_date():
+    date_str = request.args.get('date')
+    if not date_str:
+        return jsonify({'error': 'Please provide a date in DD/MM/YYYY format'}), 400
+
+    try:
+        date = datetime.strptime(date_str, '%d/%m/%Y')
+    except ValueError:
+        return jsonify({'error': 'Date format must be DD/MM/YYYY'}), 400
+
+    try:
+        limit, after = get_page_arguments()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = await run_query(heavy_executor, flights_by_date, data_manager,
+                              date.day, date.month, date.year, limit, after)
+    return list_response(results, limit, {'message': 'No flights found for this date'})
+
+
+@app.route('/api/delayed_flights_by_airline', methods=['GET'])
+async def get_delayed_flights_by_airline():
+    airline_name = request.args.get('airline_name')
+    if not airline_name:
+        return jsonify({'error': 'Please provide an airline name'}), 400
+
+    try:
+        limit, after = get_page_arguments()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    flight_details = await run_query(heavy_executor, delayed_flights_by_airline, data_manager,
+                                     airline_name, limit, after)
+    return list_response(flight_details, limit, {'error': 'No flights found for this airline'})
+
+
+@app.route('/api/delayed_flights_by_airport', methods=['GET'])
+async def get_delayed_flights_by_airport():
+    airport_code = request.args.get('airport_code')
+    if not airport_code or not (airport_code.isalpha() and len(airport_code) == 3):
+        return jsonify({'error': 'Please provide a valid 3-letter airport code'}), 400
+
+    try:
+        limit, after = get_page_arguments()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    results = await run_query(heavy_executor, delayed_flights_by_airport, data_manager,
+                              airport_code, limit, after)
+    return list_response(results, limit, {'message': 'No delayed flights found'})
+
+
+if __name__ == '__main__':
+    app.run(host="0.0.0.0", port=5001)
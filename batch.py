@@ -0,0 +1,222 @@
+import csv
+import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import sqlalchemy
+from serialization import dumps
+
+"""
+Non-interactive batch mode of the CLI (python main.py --batch queries.jsonl). The batch file has one
+query spec per line, a JSON object naming an operation of the menu (by the name of its function in
+main.FUNCTIONS, or by its menu number) and its arguments, e.g.:
+    {"op": "flight_by_id", "id": 280}
+    {"op": "flights_by_date", "date": "01/01/2015"}
+    {"op": 3, "airline": "Delta Air Lines Inc."}
+    {"op": "plot_percentage_of_delayed_flights_per_hour_of_day", "approximate": true}
+The plot operations write the data of their chart instead of drawing it. Blank lines and lines
+starting with # are skipped. The queries run over one shared data manager, on BATCH_WORKERS threads
+(SQLite releases the GIL while it executes a query), and their results are written in the order of
+the batch file, one query at a time, to a buffered output.
+"""
+BATCH_WORKERS = 1
+BATCH_FORMATS = ('plain', 'csv', 'json')
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+IATA_LENGTH = 3
+
+
+class BatchError(Exception):
+    """
+    Raised for a query spec that cannot be run, with a message for the user.
+    """
+
+
+def _required(spec, name):
+    if spec.get(name) in (None, ''):
+        raise BatchError(f"'{name}' is required")
+    return spec[name]
+
+
+def _flight_by_id(data_manager, spec):
+    try:
+        flight_id = int(_required(spec, 'id'))
+    except (TypeError, ValueError):
+        raise BatchError("'id' must be a flight ID")
+    return data_manager.get_flight_by_id(flight_id)
+
+
+def _flights_by_date(data_manager, spec):
+    try:
+        date = datetime.strptime(str(_required(spec, 'date')), '%d/%m/%Y')
+    except ValueError:
+        raise BatchError("'date' must be in DD/MM/YYYY format")
+    return data_manager.get_flights_by_date(date.day, date.month, date.year)
+
+
+def _delayed_flights_by_airline(data_manager, spec):
+    return data_manager.get_delayed_flights_by_airline(str(_required(spec, 'airline')))
+
+
+def _delayed_flights_by_airport(data_manager, spec):
+    airport = str(_required(spec, 'airport'))
+    if not (airport.isalpha() and len(airport) == IATA_LENGTH):
+        raise BatchError("'airport' must be an IATA 3-letter airport code")
+    return data_manager.get_delayed_flights_by_airport(airport.upper())
+
+
+def _aggregate(getter_name):
+    def run(data_manager, spec):
+        return getattr(data_manager, getter_name)(columnar=True, approximate=bool(spec.get('approximate')))
+    return run
+
+
+"""
+The batch operations, by the name of the menu function in main.FUNCTIONS they stand for:
+each one validates the arguments of a spec and returns the records of its query
+(flight records, or a structured array for the aggregates behind the plots).
+"""
+BATCH_OPERATIONS = {
+    'flight_by_id': _flight_by_id,
+    'flights_by_date': _flights_by_date,
+    'delayed_flights_by_airline': _delayed_flights_by_airline,
+    'delayed_flights_by_airport': _delayed_flights_by_airport,
+    'plot_percentage_of_delayed_flights_per_airline':
+        _aggregate('get_percentage_of_delayed_flights_by_airline'),
+    'plot_percentage_of_delayed_flights_per_hour_of_day':
+        _aggregate('get_percentage_of_delayed_flights_per_hour'),
+    'plot_heatmap_of_delayed_flights_per_route': _aggregate('get_delayed_flights_per_route'),
+    'plot_map_of_delayed_flights_per_route': _aggregate('get_delayed_flights_per_route_with_coordinates'),
+}
+
+
+def read_specs(lines, aliases=None):
+    """
+    Parses the lines of a batch file into (line number, operation name, spec) tuples.
+    aliases maps the menu numbers to operation names. A line that cannot be parsed
+    gets the BatchError explaining why in place of its spec.
+    """
+    aliases = aliases or {}
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            spec = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, BatchError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(spec, dict):
+            yield line_number, None, BatchError("a query spec must be a JSON object")
+            continue
+        operation = spec.get('op')
+        operation = aliases.get(operation, operation)
+        if operation not in BATCH_OPERATIONS:
+            yield line_number, operation, BatchError(f"unknown operation {spec.get('op')!r}")
+            continue
+        yield line_number, operation, spec
+
+
+def run_query(data_manager, operation, spec):
+    """
+    Runs one query spec and returns its column names and rows (as tuples).
+    Raises BatchError if the spec is invalid.
+    """
+    if isinstance(spec, BatchError):
+        raise spec
+    results = BATCH_OPERATIONS[operation](data_manager, spec)
+    if hasattr(results, 'dtype'):
+        return results.dtype.names, results.tolist()
+    if not results:
+        return (), []
+    return results[0]._fields, [tuple(record) for record in results]
+
+
+def _format_plain(line_number, operation, columns, rows):
+    lines = [f"# line {line_number}: {operation}, {len(rows)} results\n"]
+    if {'ID', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'AIRLINE', 'DELAY'}.issubset(columns):
+        # The flights are written as in print_results, without the colors
+        positions = {name: position for position, name in enumerate(columns)}
+        id_, origin, destination, airline, delay = (positions[name] for name in
+                                                    ('ID', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT',
+                                                     'AIRLINE', 'DELAY'))
+        for row in rows:
+            line = f"{row[id_]}. {row[origin]} -> {row[destination]} by {row[airline]}"
+            if row[delay] and row[delay] > 0:
+                line += f", Delay: {row[delay]} Minutes"
+            lines.append(line + '\n')
+    else:
+        lines.append('\t'.join(columns) + '\n')
+        lines.extend('\t'.join(map(str, row)) + '\n' for row in rows)
+    return lines
+
+
+class BatchWriter:
+    """
+    Writes the results of the queries of a batch to a text output in one of the BATCH_FORMATS:
+    - plain: a comment line per query followed by its records, one per line,
+    - csv: the line number and operation of the query followed by the columns of each record,
+      with a header row whenever the columns change from those of the previous query,
+    - json: one JSON object per query and line, with its records as objects (or its error).
+    The errors are written to stderr in every format (and to the output as well in json).
+    """
+
+    def __init__(self, output, output_format='plain'):
+        self.output = output
+        self.output_format = output_format
+        self._csv_writer = csv.writer(output) if output_format == 'csv' else None
+        self._csv_columns = None
+
+    def write_results(self, line_number, operation, columns, rows):
+        if self.output_format == 'json':
+            results = [dict(zip(columns, row)) for row in rows]
+            self.output.write(dumps({'line': line_number, 'op': operation, 'results': results}).decode() + '\n')
+        elif self.output_format == 'csv':
+            if columns and columns != self._csv_columns:
+                self._csv_writer.writerow(('line', 'op') + tuple(columns))
+                self._csv_columns = columns
+            self._csv_writer.writerows((line_number, operation) + row for row in rows)
+        else:
+            self.output.writelines(_format_plain(line_number, operation, columns, rows))
+
+    def write_error(self, line_number, operation, error):
+        print(f"\u001b[38;5;160;1mLine {line_number}: {error}\u001b[0m", file=sys.stderr)
+        if self.output_format == 'json':
+            self.output.write(dumps({'line': line_number, 'op': operation, 'error': str(error)}).decode() + '\n')
+
+
+def run_batch(data_manager, lines, output, output_format='plain', workers=BATCH_WORKERS, aliases=None):
+    """
+    Runs the query specs of a batch file (an iterable of lines) over a data manager and writes
+    their results to output, in the order of the file. Returns the number of queries
+    that failed; the others run and are written regardless.
+    """
+    writer = BatchWriter(output, output_format)
+    specs = list(read_specs(lines, aliases))
+
+    def run(item):
+        line_number, operation, spec = item
+        try:
+            return run_query(data_manager, operation, spec), None
+        except (BatchError, sqlalchemy.exc.SQLAlchemyError) as e:
+            return None, e
+
+    failures = 0
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='batch') as executor:
+        for (line_number, operation, _), (result, error) in zip(specs, executor.map(run, specs)):
+            if error is not None:
+                writer.write_error(line_number, operation, error)
+                failures += 1
+            else:
+                writer.write_results(line_number, operation, *result)
+    output.flush()
+    return failures
+
+
+def open_output(path):
+    """
+    Opens the batch output file (stdout for None or '-') with a large write buffer.
+    """
+    if path in (None, '-'):
+        return open(sys.stdout.fileno(), 'w', buffering=OUTPUT_BUFFER_SIZE, encoding='utf-8',
+                    newline='', closefd=False)
+    return open(path, 'w', buffering=OUTPUT_BUFFER_SIZE, encoding='utf-8', newline='')
@@ -0,0 +1,124 @@
+"""
+Concurrency benchmark comparing the API servers (app.py and async_app.py).
+Slow list requests (a whole airline) are fired together with cheap flight ID lookups,
+and the latency of the lookups shows how much they are blocked behind the slow requests.
+Requests rejected by the admission control (429) are counted apart and left out of the latencies.
+Start both servers first, e.g.:
+    SKYSQL_ENGINE_PROFILE=readonly python app.py        (port 5000)
+    python async_app.py                                  (port 5001)
+    python -m benchmarks.concurrency --airline "Southwest Airlines Co."
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_TARGETS = ['sync=http://localhost:5000', 'async=http://localhost:5001']
+
+
+REJECTED_STATUS = 429
+
+
+def timed_get(url):
+    """
+    Sends a GET request and returns its latency in seconds and its status code
+    (None for both if no response arrived).
+    Error responses (e.g. 404 for an unknown flight ID) count as answered requests.
+    """
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(url, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        return None, None
+    return time.perf_counter() - start, status
+
+
+def run_workload(base_url, airline, heavy_requests, light_requests, max_flight_id, concurrency):
+    """
+    Runs the mixed workload against one server and returns the latency statistics.
+    The heavy requests use a random 'after' cursor, so they are not answered from the result cache.
+    """
+    heavy_urls = [f"{base_url}/api/delayed_flights_by_airline?"
+                  + urllib.parse.urlencode({'airline_name': airline, 'after': random.randint(0, 1000)})
+                  for _ in range(heavy_requests)]
+    light_urls = [f"{base_url}/api/flight_number?flight_no={random.randint(1, max_flight_id)}"
+                  for _ in range(light_requests)]
+
+    heavy_latencies, light_latencies = [], []
+    lock = threading.Lock()
+
+    def send(url, latencies):
+        result = timed_get(url)
+        with lock:
+            latencies.append(result)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for url in heavy_urls:
+            executor.submit(send, url, heavy_latencies)
+        for url in light_urls:
+            executor.submit(send, url, light_latencies)
+    elapsed = time.perf_counter() - start
+    return {'elapsed': elapsed,
+            'heavy': summarize(heavy_latencies),
+            'light': summarize(light_latencies)}
+
+
+def summarize(results):
+    """
+    Takes the (latency, status) of the requests and returns the median, 95th percentile and maximum
+    latency in milliseconds of the answered requests, the failure count and the share of the requests
+    rejected by the admission control.
+    """
+    rejected = sum(1 for _, status in results if status == REJECTED_STATUS)
+    succeeded = sorted(latency for latency, status in results
+                       if latency is not None and status != REJECTED_STATUS)
+    stats = {'p50': None, 'p95': None, 'max': None,
+             'failed': len(results) - len(succeeded) - rejected,
+             'rejected': rejected / len(results) if results else 0.0}
+    if succeeded:
+        p95_index = min(len(succeeded) - 1, int(len(succeeded) * 0.95))
+        stats.update(p50=statistics.median(succeeded) * 1000, p95=succeeded[p95_index] * 1000,
+                     max=succeeded[-1] * 1000)
+    return stats
+
+
+def format_ms(value):
+    return '-' if value is None else f"{value:9.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the latency of the sync and async API servers")
+    parser.add_argument('--target', action='append', default=None,
+                        help="name=base_url of a server to benchmark (default: sync on 5000, async on 5001)")
+    parser.add_argument('--airline', default='Southwest Airlines Co.')
+    parser.add_argument('--heavy', type=int, default=16, help="number of slow airline list requests")
+    parser.add_argument('--light', type=int, default=200, help="number of flight ID lookups")
+    parser.add_argument('--max-flight-id', type=int, default=100000)
+    parser.add_argument('--concurrency', type=int, default=32, help="number of concurrent clients")
+    args = parser.parse_args()
+
+    print(f"{'server':10} {'kind':6} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'failed':>6} {'rejected':>8} "
+          f"{'total s':>8}")
+    for target in args.target or DEFAULT_TARGETS:
+        name, base_url = target.split('=', 1)
+        result = run_workload(base_url.rstrip('/'), args.airline, args.heavy, args.light,
+                              args.max_flight_id, args.concurrency)
+        for kind in ('light', 'heavy'):
+            stats = result[kind]
+            print(f"{name:10} {kind:6} {format_ms(stats['p50'])} {format_ms(stats['p95'])} "
+                  f"{format_ms(stats['max'])} {stats['failed']:6} {stats['rejected']:8.1%} {result['elapsed']:8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Export benchmark: fetches a whole month of flights through the Flask app, once day by day
+from /api/flights_by_date (JSON, as the analytics notebooks did) and once with a single
+/api/export request per columnar format, and compares the time (including the decoding of the
+responses by the consumer, with json or pyarrow) and the transferred bytes:
+    python -m benchmarks.export --db data/synthetic_1000000.sqlite3 --year 2015 --month 1
+The requests go through the Flask test client, so no server has to be started.
+"""
+import argparse
+import calendar
+import io
+import json
+import os
+import time
+
+
+def timed_get(client, url, decode, expected=(200,)):
+    """
+    Sends a GET request, decodes its body with decode, and returns the time spent in seconds
+    and the size of the body. Raises RuntimeError if the response status is not an expected one.
+    """
+    start = time.perf_counter()
+    with client.get(url) as response:
+        body = response.get_data()
+        if response.status_code not in expected:
+            raise RuntimeError(f"{url} answered {response.status_code}: {body[:200]!r}")
+    decode(body)
+    return time.perf_counter() - start, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the JSON day by day and the columnar month exports")
+    parser.add_argument('--db', required=True, help="flights database file")
+    parser.add_argument('--year', type=int, default=2015)
+    parser.add_argument('--month', type=int, default=1)
+    args = parser.parse_args()
+
+    # The app reads its database from the environment when it is imported
+    os.environ['SKYSQL_DB_URI'] = f"sqlite:///{os.path.abspath(args.db)}"
+    import app
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    decoders = {'arrow': lambda body: pa.ipc.open_stream(body).read_all(),
+                'parquet': lambda body: pq.read_table(io.BytesIO(body))}
+    client = app.app.test_client()
+
+    days = calendar.monthrange(args.year, args.month)[1]
+    json_seconds = json_size = 0
+    for day in range(1, days + 1):
+        # A day without flights is answered with 404
+        seconds, size = timed_get(client, f"/api/flights_by_date?date={day:02d}/{args.month:02d}/{args.year}",
+                                  json.loads, expected=(200, 404))
+        json_seconds += seconds
+        json_size += size
+    cases = {'JSON, day by day': (json_seconds, json_size)}
+
+    date_range = f"start_date=01/{args.month:02d}/{args.year}&end_date={days}/{args.month:02d}/{args.year}"
+    for export_format in app.EXPORT_FORMATS:
+        cases[f"{export_format} export"] = timed_get(client, f"/api/export?format={export_format}&{date_range}",
+                                                         decoders[export_format])
+
+    print(f"{args.year}-{args.month:02d}, {days} days")
+    baseline_seconds, baseline_size = cases['JSON, day by day']
+    for name, (seconds, size) in cases.items():
+        print(f"{name:20} {seconds * 1000:9.1f} ms  x{baseline_seconds / seconds:6.1f}  "
+              f"{size / 1024 / 1024:8.2f} MB  x{baseline_size / size:6.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Synthetic flight dataset generator.
+Writes flights, airlines and airports tables compatible with data/flights.sqlite3 at a chosen
+scale. Traffic is skewed like the real data: a few hub airports and large airlines carry most
+of the flights (Zipf-like weights), and delays depend on the hour of the day.
+"""
+import argparse
+import os
+import sqlite3
+import string
+import time
+from datetime import date, timedelta
+import numpy as np
+
+BATCH_SIZE = 100000
+
+AIRLINES = [('WN', 'Southwest Airlines Co.'), ('DL', 'Delta Air Lines Inc.'), ('AA', 'American Airlines Inc.'),
+            ('OO', 'Skywest Airlines Inc.'), ('EV', 'Atlantic Southeast Airlines'), ('UA', 'United Air Lines Inc.'),
+            ('MQ', 'American Eagle Airlines Inc.'), ('B6', 'JetBlue Airways'), ('US', 'US Airways Inc.'),
+            ('AS', 'Alaska Airlines Inc.'), ('NK', 'Spirit Air Lines'), ('F9', 'Frontier Airlines Inc.'),
+            ('HA', 'Hawaiian Airlines Inc.'), ('VX', 'Virgin America')]
+
+HUB_AIRPORTS = [('ATL', 'Atlanta', 'GA', 33.64, -84.43), ('ORD', 'Chicago', 'IL', 41.98, -87.90),
+                ('DFW', 'Dallas-Fort Worth', 'TX', 32.90, -97.04), ('DEN', 'Denver', 'CO', 39.86, -104.67),
+                ('LAX', 'Los Angeles', 'CA', 33.94, -118.41), ('SFO', 'San Francisco', 'CA', 37.62, -122.37),
+                ('PHX', 'Phoenix', 'AZ', 33.43, -112.01), ('IAH', 'Houston', 'TX', 29.98, -95.34),
+                ('LAS', 'Las Vegas', 'NV', 36.08, -115.15), ('MSP', 'Minneapolis', 'MN', 44.88, -93.22),
+                ('MCO', 'Orlando', 'FL', 28.43, -81.31), ('SEA', 'Seattle', 'WA', 47.45, -122.31),
+                ('DTW', 'Detroit', 'MI', 42.21, -83.35), ('BOS', 'Boston', 'MA', 42.36, -71.01),
+                ('EWR', 'Newark', 'NJ', 40.69, -74.17), ('CLT', 'Charlotte', 'NC', 35.21, -80.94),
+                ('LGA', 'New York', 'NY', 40.78, -73.87), ('SLC', 'Salt Lake City', 'UT', 40.79, -111.98),
+                ('JFK', 'New York', 'NY', 40.64, -73.78), ('BWI', 'Baltimore', 'MD', 39.18, -76.67),
+                ('MDW', 'Chicago', 'IL', 41.79, -87.75), ('DCA', 'Arlington', 'VA', 38.85, -77.04),
+                ('FLL', 'Fort Lauderdale', 'FL', 26.07, -80.15), ('SAN', 'San Diego', 'CA', 32.73, -117.19),
+                ('MIA', 'Miami', 'FL', 25.79, -80.29), ('PHL', 'Philadelphia', 'PA', 39.87, -75.24),
+                ('TPA', 'Tampa', 'FL', 27.98, -82.53), ('DAL', 'Dallas', 'TX', 32.85, -96.85),
+                ('HOU', 'Houston', 'TX', 29.65, -95.28), ('BNA', 'Nashville', 'TN', 36.12, -86.68)]
+
+SCHEMA = """
+DROP TABLE IF EXISTS flights;
+DROP TABLE IF EXISTS airlines;
+DROP TABLE IF EXISTS airports;
+CREATE TABLE airlines (ID TEXT, AIRLINE TEXT);
+CREATE TABLE airports (IATA_CODE TEXT, AIRPORT TEXT, CITY TEXT, STATE TEXT, COUNTRY TEXT,
+                       LATITUDE REAL, LONGITUDE REAL);
+CREATE TABLE flights (ID INTEGER, YEAR INTEGER, MONTH INTEGER, DAY INTEGER, DAY_OF_WEEK INTEGER,
+                      AIRLINE TEXT, FLIGHT_NUMBER INTEGER, TAIL_NUMBER TEXT, ORIGIN_AIRPORT TEXT,
+                      DESTINATION_AIRPORT TEXT, SCHEDULED_DEPARTURE TEXT, DEPARTURE_TIME TEXT,
+                      DEPARTURE_DELAY INTEGER, ARRIVAL_TIME TEXT, ARRIVAL_DELAY INTEGER,
+                      DIVERTED INTEGER, CANCELLED INTEGER);
+"""
+INSERT_FLIGHT = "INSERT INTO flights VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Returns normalized Zipf-like weights: the first items get most of the traffic.
+    """
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_airports(count, rng):
+    """
+    Returns the airports table rows: the real hubs first, then synthetic regional airports
+    (unused 3-letter codes) scattered over the continental USA.
+    """
+    airports = [(code, f"{city} Airport", city, state, 'USA', latitude, longitude)
+                for code, city, state, latitude, longitude in HUB_AIRPORTS[:count]]
+    used = {airport[0] for airport in airports}
+    letters = np.array(list(string.ascii_uppercase))
+    while len(airports) < count:
+        code = ''.join(rng.choice(letters, 3))
+        if code in used:
+            continue
+        used.add(code)
+        airports.append((code, f"{code} Regional Airport", f"City {code}", 'XX', 'USA',
+                         round(rng.uniform(25.0, 48.0), 4), round(rng.uniform(-123.0, -70.0), 4)))
+    return airports
+
+
+def generate_flights(rows, airports, year, rng):
+    """
+    Yields batches of flights rows ordered by date (and ID), BATCH_SIZE rows at a time.
+    """
+    codes = np.array([airport[0] for airport in airports])
+    airport_weights = zipf_weights(len(codes))
+    airline_codes = np.array([code for code, name in AIRLINES])
+    airline_weights = zipf_weights(len(airline_codes), 0.8)
+    first_day = date(year, 1, 1)
+    days_in_year = (date(year + 1, 1, 1) - first_day).days
+    calendar = []
+    for offset in range(days_in_year):
+        day = first_day + timedelta(days=offset)
+        calendar.append((day.year, day.month, day.day, day.isoweekday()))
+
+    for start in range(0, rows, BATCH_SIZE):
+        size = min(BATCH_SIZE, rows - start)
+        ids = np.arange(start + 1, start + size + 1)
+        day_offsets = (ids - 1) * days_in_year // rows
+        origins = rng.choice(len(codes), size, p=airport_weights)
+        # Draw destinations from the same skew, moving the ones equal to their origin to the next airport
+        destinations = rng.choice(len(codes), size, p=airport_weights)
+        destinations = np.where(destinations == origins, (destinations + 1) % len(codes), destinations)
+        airlines = rng.choice(len(airline_codes), size, p=airline_weights)
+
+        hours = np.clip(rng.normal(13, 4.5, size), 0, 23).astype(int)
+        minutes = rng.integers(0, 60, size)
+        # Later departures are delayed more often, as delays propagate through the day
+        delayed = rng.random(size) < 0.2 + hours * 0.012
+        delays = np.where(delayed, rng.exponential(30, size).astype(int) + 1, -rng.integers(0, 10, size))
+        cancelled = rng.random(size) < 0.015
+
+        days = [calendar[offset] for offset in day_offsets]
+        scheduled = [f"{hour:02d}{minute:02d}" for hour, minute in zip(hours, minutes)]
+        delays = [None if is_cancelled else int(delay) for delay, is_cancelled in zip(delays, cancelled)]
+        batch = list(zip(ids.tolist(),
+                         [day[0] for day in days], [day[1] for day in days], [day[2] for day in days],
+                         [day[3] for day in days],
+                         airline_codes[airlines].tolist(),
+                         rng.integers(1, 7000, size).tolist(),
+                         [f"N{flight_id % 5000:04d}" for flight_id in ids.tolist()],
+                         codes[origins].tolist(),
+                         codes[destinations].tolist(),
+                         scheduled,
+                         [None if is_cancelled else departure for departure, is_cancelled in zip(scheduled, cancelled)],
+                         delays,
+                         [None] * size,
+                         delays,
+                         [0] * size,
+                         cancelled.astype(int).tolist()))
+        yield batch
+
+
+def generate_dataset(path, rows, airport_count=300, year=2015, seed=0):
+    """
+    Writes a synthetic flights database with the given number of flights to path.
+    """
+    rng = np.random.default_rng(seed)
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = sqlite3.connect(path)
+    connection.execute("PRAGMA journal_mode = OFF")
+    connection.execute("PRAGMA synchronous = OFF")
+    connection.executescript(SCHEMA)
+    connection.executemany("INSERT INTO airlines VALUES (?, ?)", AIRLINES)
+    airports = make_airports(airport_count, rng)
+    connection.executemany("INSERT INTO airports VALUES (?, ?, ?, ?, ?, ?, ?)", airports)
+    for batch in generate_flights(rows, airports, year, rng):
+        connection.executemany(INSERT_FLIGHT, batch)
+        connection.commit()
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic flights database")
+    parser.add_argument('--rows', type=int, default=100000, help="number of flights (10k to 50M)")
+    parser.add_argument('--airports', type=int, default=300, help="number of airports")
+    parser.add_argument('--year', type=int, default=2015)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="database file (default: data/synthetic_<rows>.sqlite3)")
+    args = parser.parse_args()
+
+    output = args.output or os.path.join('data', f"synthetic_{args.rows}.sqlite3")
+    start = time.perf_counter()
+    generate_dataset(output, args.rows, args.airports, args.year, args.seed)
+    print(f"Generated {args.rows} flights in {output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
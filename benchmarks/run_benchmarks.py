@@ -0,0 +1,248 @@
+"""
+Benchmark suite.
+Times every query in flightdata_queries.QUERIES, the FlightDataVisuals aggregate getters,
+every API route and every plot function against a flights database (e.g. one written by
+benchmarks.generate_dataset), and records the timings in a JSON file per version, so that
+runs can be compared and regressions spotted:
+    python -m benchmarks.generate_dataset --rows 1000000
+    python -m benchmarks.run_benchmarks --db data/synthetic_1000000.sqlite3 --compare benchmarks/results/<old>.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import data
+import plots
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+REGRESSION_THRESHOLD = 1.2
+REGRESSION_MIN_MS = 1.0
+
+"""
+API requests timed for each route, filled with the sample values of the dataset.
+"""
+ROUTE_CASES = {
+    'flight_number': '/api/flight_number?flight_no={id}',
+    'flights_by_ids': '/api/flights_by_ids?ids={ids}',
+    'flights_by_date': '/api/flights_by_date?date={day:02d}/{month:02d}/{year}',
+    'flights_by_date_page': '/api/flights_by_date?date={day:02d}/{month:02d}/{year}&limit=100',
+    'delayed_flights_by_airline': '/api/delayed_flights_by_airline?airline_name={airline_quoted}',
+    'delayed_flights_by_airport': '/api/delayed_flights_by_airport?airport_code={airport}',
+    'search_flights': '/api/flights?origin={airport}&min_delay=30&limit=100',
+    'export_arrow': '/api/export?format=arrow&origin={airport}&min_delay=30',
+    'export_parquet': '/api/export?format=parquet&origin={airport}&min_delay=30',
+}
+
+"""
+Plot functions timed with the columnar result of their FlightDataVisuals getter.
+"""
+PLOT_CASES = {
+    'plot_percentage_of_delayed_flights_by_airline': 'get_percentage_of_delayed_flights_by_airline',
+    'plot_percentage_of_delayed_flights_per_hour': 'get_percentage_of_delayed_flights_per_hour',
+    'plot_heatmap_of_delayed_flights_by_route': 'get_delayed_flights_per_route',
+    'plot_routes_on_map': 'get_delayed_flights_per_route_with_coordinates',
+}
+
+
+def sample_params(data_manager):
+    """
+    Picks the parameters of the benchmarked queries from the dataset: a flight in the middle
+    of the table, its date, the busiest airline and origin airport, and a batch of IDs.
+    """
+    def scalar(query):
+        return data_manager._execute_query(query, {})[0][0]
+
+    flight_id = scalar("SELECT ID FROM flights ORDER BY ID LIMIT 1 OFFSET (SELECT COUNT(*) / 2 FROM flights)")
+    year, month, day = data_manager._execute_query("SELECT YEAR, MONTH, DAY FROM flights WHERE ID = :id",
+                                                   {'id': flight_id})[0]
+    airline = scalar("SELECT airlines.AIRLINE FROM airlines "
+                     "JOIN (SELECT AIRLINE, COUNT(*) AS flights FROM flights GROUP BY AIRLINE "
+                     "ORDER BY flights DESC LIMIT 1) AS busiest ON busiest.AIRLINE = airlines.ID")
+    airport = scalar("SELECT ORIGIN_AIRPORT FROM flights GROUP BY ORIGIN_AIRPORT ORDER BY COUNT(*) DESC LIMIT 1")
+    ids = list(range(flight_id, flight_id + 1000, 10))
+    return {'id': flight_id, 'year': year, 'month': month, 'day': day,
+            'airline': airline, 'airport': airport, 'ids': ids}
+
+
+def time_call(func, repeat):
+    """
+    Calls func repeat times and returns the first (cold) call time and the min, median
+    and max times in milliseconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {'first': timings[0], 'min': min(timings), 'median': statistics.median(timings), 'max': max(timings)}
+
+
+def benchmark_queries(data_manager, params, repeat):
+    """
+    Times every registered query, the flight details ones with the default projection.
+    """
+    query_params = {'id': params['id'], 'year': params['year'], 'month': params['month'],
+                    'day': params['day'], 'airline': params['airline'], 'airport': params['airport'],
+                    'ids': json.dumps(params['ids']),
+                    'start_year': params['year'], 'start_month': params['month'], 'start_day': 1,
+                    'end_year': params['year'], 'end_month': params['month'], 'end_day': 31}
+    results = {}
+    for name, query in data.QUERIES.items():
+        query = data._project(query, data.DEFAULT_FLIGHT_COLUMNS)
+        bound = {key: value for key, value in query_params.items() if f":{key}" in query}
+        results[name] = time_call(lambda: data_manager._execute_query(query, bound), repeat)
+    return results
+
+
+def benchmark_visuals(data_manager, repeat):
+    """
+    Times the FlightDataVisuals aggregate getters (answered from the summary tables if they exist,
+    see --provision-indexes).
+    """
+    return {getter: time_call(lambda: getattr(data_manager, getter)(columnar=True), repeat)
+            for getter in PLOT_CASES.values()}
+
+
+def get_ok(client, url):
+    """
+    Sends a GET request with the Flask test client and reads its body.
+    Raises RuntimeError if the response is not a success, so rejections and errors are never timed.
+    """
+    with client.get(url) as response:
+        response.get_data()
+        if not 200 <= response.status_code < 300:
+            raise RuntimeError(f"{url} answered {response.status_code}")
+
+
+def benchmark_routes(db_uri, params, repeat):
+    """
+    Times every API route with the Flask test client.
+    The first call of each route is uncached; the following ones may be served from the result cache.
+    A route answering with an error is reported and left out of the results.
+    """
+    os.environ['SKYSQL_DB_URI'] = db_uri
+    import app
+
+    values = dict(params, ids=','.join(map(str, params['ids'])),
+                  airline_quoted=urllib.parse.quote(params['airline']))
+    client = app.app.test_client()
+    results = {}
+    for name, url in ROUTE_CASES.items():
+        try:
+            results[name] = time_call(lambda: get_ok(client, url.format(**values)), repeat)
+        except RuntimeError as e:
+            print(f"\u001b[38;5;160;1mRoute case {name} failed: {e}\u001b[0m")
+
+    covered = {url.split('?')[0] for url in ROUTE_CASES.values()}
+    missing = [rule.rule for rule in app.app.url_map.iter_rules()
+               if rule.rule.startswith('/api/') and rule.rule not in covered]
+    if missing:
+        print(f"Routes without a benchmark case: {', '.join(missing)}")
+    return results
+
+
+def benchmark_plots(data_manager, repeat):
+    """
+    Times every plot function, rendering to a temporary directory without showing the figures.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as output_dir:
+        for name, getter in PLOT_CASES.items():
+            plot_data = getattr(data_manager, getter)(columnar=True)
+            output_path = os.path.join(output_dir, f"{name}.png")
+            plot_function = getattr(plots, name)
+            results[name] = time_call(lambda: plot_function(plot_data, output_path=output_path, show=False),
+                                      repeat)
+    return results
+
+
+def current_version():
+    """
+    Returns the short hash of the checked out git commit, or 'unknown'.
+    """
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def compare(results, previous):
+    """
+    Prints the median of every benchmark next to the previous run and flags regressions
+    (slower by more than REGRESSION_THRESHOLD, ignoring sub-millisecond noise).
+    Returns the number of regressions.
+    """
+    regressions = 0
+    print(f"{'benchmark':60} {'previous':>10} {'current':>10} {'ratio':>7}")
+    for section, benchmarks in results['benchmarks'].items():
+        for name, timings in benchmarks.items():
+            old = previous['benchmarks'].get(section, {}).get(name)
+            if old is None:
+                print(f"{section + '.' + name:60} {'-':>10} {timings['median']:10.2f}")
+                continue
+            ratio = timings['median'] / old['median'] if old['median'] else float('inf')
+            slower = timings['median'] - old['median'] > REGRESSION_MIN_MS
+            flag = '  REGRESSION' if ratio > REGRESSION_THRESHOLD and slower else ''
+            regressions += bool(flag)
+            print(f"{section + '.' + name:60} {old['median']:10.2f} {timings['median']:10.2f} {ratio:7.2f}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the queries, API routes and plots")
+    parser.add_argument('--db', required=True, help="flights database file")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--label', default=None, help="name of this run (default: git commit)")
+    parser.add_argument('--output', default=None, help="results file (default: benchmarks/results/<label>.json)")
+    parser.add_argument('--compare', default=None, help="results file of a previous run to compare with")
+    parser.add_argument('--provision-indexes', action='store_true',
+                        help="create the indexes and the summary tables before timing")
+    parser.add_argument('--skip', action='append', default=[], choices=['queries', 'visuals', 'routes', 'plots'])
+    args = parser.parse_args()
+
+    db_uri = f"sqlite:///{os.path.abspath(args.db)}"
+    label = args.label or current_version()
+    data_manager = data.FlightDataVisuals(db_uri, provision_indexes=args.provision_indexes, use_summaries=True,
+                                          prepare_tables=args.provision_indexes)
+    params = sample_params(data_manager)
+    row_count = data_manager._execute_query("SELECT COUNT(*) FROM flights", {})[0][0]
+
+    sections = {'queries': lambda: benchmark_queries(data_manager, params, args.repeat),
+                'visuals': lambda: benchmark_visuals(data_manager, args.repeat),
+                'routes': lambda: benchmark_routes(db_uri, params, args.repeat),
+                'plots': lambda: benchmark_plots(data_manager, args.repeat)}
+    results = {'label': label,
+               'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+               'python': platform.python_version(),
+               'dataset': {'path': os.path.abspath(args.db), 'rows': row_count},
+               'benchmarks': {}}
+    for section, run in sections.items():
+        if section not in args.skip:
+            print(f"Running {section} benchmarks...")
+            results['benchmarks'][section] = run()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{label}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as previous_file:
+            previous = json.load(previous_file)
+        if compare(results, previous):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Serialization throughput benchmark.
+Fetches the delayed flights of an airport (or every flight with --all) once, then compares
+the per-row conversion and JSON encoding of the previous API helpers (dict(record._mapping),
+DELAY parsed in Python, jsonify) with serialize_flights and dumps:
+    python -m benchmarks.serialization --db data/flights.sqlite3 --airport LAX
+"""
+import argparse
+import os
+import time
+import data
+from flask import Flask, jsonify
+from serialization import dumps, serialize_flights
+
+COLUMN_DELAY = 'flights.DEPARTURE_DELAY AS DELAY'
+QUERY_ALL_FLIGHTS = """
+SELECT {columns}
+FROM flights JOIN airlines ON flights.airline = airlines.id
+"""
+
+
+def legacy_serialize(results):
+    """
+    The per-row conversion of the API helpers before the shared serializer.
+    """
+    flight_details = []
+    for result in results:
+        result_dict = dict(result._mapping)
+        delay_str = result_dict.get('DELAY', '')
+        try:
+            delay = int(delay_str) if delay_str else 0
+        except ValueError:
+            delay = 0
+
+        flight_details.append({
+            'ID': result_dict.get('ID'),
+            'ORIGIN_AIRPORT': result_dict.get('ORIGIN_AIRPORT'),
+            'DESTINATION_AIRPORT': result_dict.get('DESTINATION_AIRPORT'),
+            'AIRLINE': result_dict.get('AIRLINE'),
+            'DELAY': delay
+        })
+    return flight_details
+
+
+def best_time(func, repeat):
+    """
+    Returns the best of repeat calls of func, in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the legacy and the shared row serializers")
+    parser.add_argument('--db', required=True, help="flights database file")
+    parser.add_argument('--airport', default='LAX', help="origin airport of the benchmarked flights")
+    parser.add_argument('--all', action='store_true', help="serialize every flight instead")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data_manager = data.FlightData(f"sqlite:///{os.path.abspath(args.db)}")
+    if args.all:
+        query = QUERY_ALL_FLIGHTS
+        params = {}
+    else:
+        query = data.QUERY_DELAYED_FLIGHTS_BY_AIRPORT
+        params = {'airport': args.airport}
+    # The legacy path read the raw DEPARTURE_DELAY column, the new one gets it converted by SQL
+    legacy_rows = data_manager._execute_query(
+        data._project(query, data.DEFAULT_FLIGHT_COLUMNS).replace(data.FLIGHT_COLUMNS['DELAY'], COLUMN_DELAY),
+        params)
+    rows = data_manager._execute_query(data._project(query, data.DEFAULT_FLIGHT_COLUMNS), params)
+
+    app = Flask(__name__)
+    with app.app_context():
+        cases = {'legacy (dict + jsonify)': lambda: jsonify(legacy_serialize(legacy_rows)).get_data(),
+                 'serialize_flights + dumps': lambda: dumps(serialize_flights(rows))}
+        print(f"{len(rows)} rows, best of {args.repeat}")
+        baseline = None
+        for name, func in cases.items():
+            seconds = best_time(func, args.repeat)
+            baseline = baseline or seconds
+            print(f"{name:28} {seconds * 1000:9.1f} ms  {len(rows) / seconds:12,.0f} rows/s  "
+                  f"x{baseline / seconds:.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import gzip
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+"""
+Compression of the JSON responses, with brotli when it is installed (pip install brotli)
+and the client accepts it, otherwise gzip. Bodies smaller than COMPRESS_MIN_SIZE are sent as they
+are; streamed responses are compressed chunk by chunk. The levels favor speed over ratio,
+as the responses are compressed on every request.
+"""
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson')
+COMPRESS_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def choose_encoding(accept_encodings):
+    """
+    Returns the content encoding to use ('br' or 'gzip') given the Accept-Encoding
+    header of a request (werkzeug's request.accept_encodings), or None.
+    """
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """
+    Compresses a body with the given content encoding.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL)
+
+
+def compress_chunks(chunks, encoding):
+    """
+    Compresses a streamed body chunk by chunk, yielding the compressed bytes as they are produced.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(GZIP_LEVEL, wbits=31)
+        process, finish = compressor.compress, compressor.flush
+    for chunk in chunks:
+        compressed = process(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def compress_response(response, accept_encodings):
+    """
+    Compresses the body of a successful JSON response in place, if the client accepts
+    a supported encoding and the body is large enough (or streamed).
+    """
+    if (response.status_code != 200 or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    if response.is_streamed:
+        response.response = compress_chunks(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
@@ -0,0 +1,125 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from jinja2 import Template
+import render
+from data import DEFAULT_ENGINE_PROFILE, ENGINE_PROFILES, FlightDataVisuals
+
+SQLITE_URI = 'sqlite:///data/flights.sqlite3'
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '_static')
+TEMPLATE_FILE = os.path.join(STATIC_DIR, 'index_template.html')
+STYLE_FILE = os.path.join(STATIC_DIR, 'style.css')
+STATE_FILE = '.dashboard_state.json'
+
+
+def fingerprint_charts(data_manager, charts):
+    """
+    Returns a fingerprint (sha256) of the aggregate result behind each chart.
+    """
+    fingerprints = {}
+    for chart in charts:
+        getter_name = render.CHARTS[chart][0]
+        data = getattr(data_manager, getter_name)(columnar=True)
+        digest = hashlib.sha256(str(data.dtype.descr).encode())
+        digest.update(data.tobytes())
+        fingerprints[chart] = digest.hexdigest()
+    return fingerprints
+
+
+def stored_data_version(data_manager):
+    """
+    Returns the database version marker in the form it takes in the JSON state file.
+    """
+    return json.loads(json.dumps(data_manager.data_version()))
+
+
+def load_state(output_dir):
+    """
+    Returns the state recorded by the last build (database version and chart fingerprints).
+    """
+    try:
+        with open(os.path.join(output_dir, STATE_FILE)) as state_file:
+            return json.load(state_file)
+    except (FileNotFoundError, ValueError):
+        return {'data_version': None, 'fingerprints': {}}
+
+
+def save_state(output_dir, state):
+    """
+    Records the state of this build, replacing the previous one atomically.
+    """
+    state_path = os.path.join(output_dir, STATE_FILE)
+    with open(f"{state_path}.tmp", 'w') as state_file:
+        json.dump(state, state_file, indent=2)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def write_index(output_dir, fingerprints):
+    """
+    Renders the dashboard template into index.html, next to a copy of the style sheet.
+    The chart URLs carry their fingerprint, so browsers reload only the charts that changed.
+    """
+    with open(TEMPLATE_FILE) as template_file:
+        template = Template(template_file.read())
+    charts = {chart: f"{render.CHARTS[chart][2]}?v={fingerprint[:12]}"
+              for chart, fingerprint in fingerprints.items()}
+
+    index_path = os.path.join(output_dir, 'index.html')
+    with open(f"{index_path}.tmp", 'w') as index_file:
+        index_file.write(template.render(charts=charts))
+    os.replace(f"{index_path}.tmp", index_path)
+    shutil.copyfile(STYLE_FILE, os.path.join(output_dir, 'style.css'))
+
+
+def build_dashboard(db_uri, output_dir, force=False, engine_profile=DEFAULT_ENGINE_PROFILE):
+    """
+    Builds the static dashboard in output_dir, re-rendering only the charts whose
+    aggregate data changed since the last build (or whose file is missing).
+    If the database did not change at all, nothing is queried.
+    Returns the list of re-rendered charts.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    state = load_state(output_dir)
+    data_manager = FlightDataVisuals(db_uri, engine_profile=engine_profile, use_summaries=True)
+    data_version = stored_data_version(data_manager)
+
+    charts = list(render.CHARTS)
+    files_present = all(os.path.exists(os.path.join(output_dir, render.CHARTS[chart][2])) for chart in charts)
+    if not force and files_present and state['data_version'] == data_version:
+        return []
+
+    fingerprints = fingerprint_charts(data_manager, charts)
+    stale = [chart for chart in charts
+             if force
+             or fingerprints[chart] != state['fingerprints'].get(chart)
+             or not os.path.exists(os.path.join(output_dir, render.CHARTS[chart][2]))]
+    if stale:
+        render.render_all(db_uri, output_dir, stale, engine_profile=engine_profile)
+
+    write_index(output_dir, fingerprints)
+    # The version is read again, as refreshing the summary tables may have written to the database
+    save_state(output_dir, {'data_version': stored_data_version(data_manager),
+                            'fingerprints': fingerprints})
+    return stale
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the static flight delay dashboard")
+    parser.add_argument('--db-uri', default=SQLITE_URI)
+    parser.add_argument('--output-dir', default='dashboard')
+    parser.add_argument('--force', action='store_true', help="re-render every chart")
+    parser.add_argument('--engine-profile', choices=ENGINE_PROFILES, default=DEFAULT_ENGINE_PROFILE,
+                        help="database engine profile (see data.ENGINE_PROFILES)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    stale = build_dashboard(args.db_uri, args.output_dir, args.force, args.engine_profile)
+    print(f"Re-rendered: {', '.join(stale) if stale else 'nothing'} "
+          f"({time.perf_counter() - start:.3f}s) -> {os.path.join(args.output_dir, 'index.html')}")
+
+
+if __name__ == '__main__':
+    main()
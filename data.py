@@ -1,6 +1,153 @@
-from sqlalchemy import create_engine, text
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+import numpy as np
+from sqlalchemy import create_engine, event, exc, make_url, text
 from flightdata_queries import *
 
+STREAM_BATCH_SIZE = 1000
+EXPORT_BATCH_SIZE = 65536
+ID_CHUNK_SIZE = 500
+STATEMENT_CACHE_SIZE = 256
+
+"""
+Query deadlines: a query given a timeout (see FlightData query_timeout) checks its deadline from
+a SQLite progress handler, called every PROGRESS_HANDLER_INSTRUCTIONS virtual machine instructions
+(well under a millisecond of work), and is interrupted by SQLite as soon as it is past it.
+"""
+PROGRESS_HANDLER_INSTRUCTIONS = 10000
+
+"""
+Counters that SQLite moves on every committed write, read from the file headers for the data version
+(see FlightData.data_version), as (offset, size) slices: the file change counter of the database
+header, and the checkpoint sequence number and salts of the write-ahead log header, which change
+whenever the log is restarted (the log then grows with every commit until the next restart).
+"""
+DATABASE_CHANGE_COUNTER = (24, 4)
+WAL_CHECKPOINT_SALTS = (12, 12)
+
+"""
+Engine profiles selectable by name.
+'default' keeps the SQLAlchemy defaults, 'tuned' is a pooled read-write engine in WAL mode,
+'readonly' opens the database file read-only, and its writes (index provisioning, summary tables)
+go through a separate 'write_profile' engine. 'immutable' additionally tells SQLite that the file
+never changes, so it cannot write at all: indexes and summary tables must be built beforehand.
+'statement_cache_size' is the number of prepared statements each SQLite connection keeps,
+so repeated queries are not parsed and planned again.
+"""
+ENGINE_PROFILES = {
+    'default': {},
+    'tuned': {
+        'pool_size': 8,
+        'max_overflow': 8,
+        'pragmas': {'journal_mode': 'WAL',
+                    'synchronous': 'NORMAL',
+                    'mmap_size': 256 * 1024 * 1024,
+                    'cache_size': -64 * 1024,
+                    'temp_store': 'MEMORY'},
+        'statement_cache_size': STATEMENT_CACHE_SIZE,
+    },
+    'readonly': {
+        'mode': 'ro',
+        'pool_size': 8,
+        'warm': True,
+        'max_overflow': 8,
+        'pragmas': {'mmap_size': 256 * 1024 * 1024,
+                    'cache_size': -64 * 1024,
+                    'temp_store': 'MEMORY',
+                    'query_only': 'ON'},
+        'statement_cache_size': STATEMENT_CACHE_SIZE,
+        'write_profile': 'tuned',
+    },
+    'immutable': {
+        'mode': 'ro',
+        'immutable': True,
+        'pool_size': 8,
+        'warm': True,
+        'max_overflow': 8,
+        'pragmas': {'mmap_size': 256 * 1024 * 1024,
+                    'cache_size': -64 * 1024,
+                    'temp_store': 'MEMORY',
+                    'query_only': 'ON'},
+        'statement_cache_size': STATEMENT_CACHE_SIZE,
+    },
+}
+DEFAULT_ENGINE_PROFILE = 'default'
+
+"""
+NumPy dtypes of the aggregate results in columnar mode (one field per result column).
+"""
+AIRLINE_DELAYS_DTYPE = np.dtype([('airline', 'U64'),
+                                 ('total_flights', 'i8'),
+                                 ('delayed_flights', 'i8'),
+                                 ('delayed_percentage', 'f8')])
+HOUR_DELAYS_DTYPE = np.dtype([('hour_of_day', 'i8'),
+                              ('total_flights', 'i8'),
+                              ('delayed_flights', 'i8'),
+                              ('delayed_percentage', 'f8')])
+ROUTE_DELAYS_DTYPE = np.dtype([('origin', 'U8'),
+                               ('destination', 'U8'),
+                               ('total_flights', 'i8'),
+                               ('delayed_flights', 'i8'),
+                               ('delayed_percentage', 'f8')])
+ROUTE_DELAYS_WITH_COORD_DTYPE = np.dtype(ROUTE_DELAYS_DTYPE.descr + [('origin_latitude', 'f8'),
+                                                                     ('origin_longitude', 'f8'),
+                                                                     ('destination_latitude', 'f8'),
+                                                                     ('destination_longitude', 'f8')])
+
+"""
+The missing value stored for a NULL in a columnar field, by NumPy dtype kind: an empty string
+for the names and codes, NaN for the floats (e.g. the coordinates of an airport missing from
+the airports table). The integer and boolean fields have none.
+"""
+COLUMNAR_NULLS = {'U': '', 'f': np.nan}
+
+"""
+The approximate aggregates: the fraction of the flights in the sample, the z-score of the
+confidence level of the intervals (1.96 for 95%), and the number of sampled flights below
+which a group (typically a rare route) is flagged as sparse, its interval being too wide
+for the estimated percentage to mean much.
+The approximate results have the fields of the exact dtype, followed by APPROXIMATE_FIELDS.
+"""
+SAMPLE_FRACTION = 0.1
+CONFIDENCE_Z = 1.96
+SPARSE_SAMPLE_FLIGHTS = 30
+APPROXIMATE_FIELDS = [('ci_low', 'f8'),
+                      ('ci_high', 'f8'),
+                      ('sample_flights', 'i8'),
+                      ('sparse', '?')]
+
+
+class QueryTimeoutError(Exception):
+    """
+    Raised when a query ran past its deadline (see FlightData query_timeout) and SQLite interrupted it.
+    """
+
+
+class ColumnarNullError(ValueError):
+    """
+    Raised when a NULL is read into a columnar field that has no missing value (see COLUMNAR_NULLS).
+    """
+
+
+class TruncatedRecords(list):
+    """
+    The records of a flight details query cut at the row cap of the data manager
+    (see FlightData max_rows): more flights matched the query than the list holds.
+    """
+    truncated = True
+
+
+class QueryPlanError(Exception):
+    """
+    Raised by FlightData.verify_query_plans() in strict mode when a registered
+    query falls back to a full table scan or misses its covering index.
+    """
+
 
 class FlightData:
     """
@@ -10,66 +157,689 @@ class FlightData:
     until the object is destroyed.
     """
 
-    def __init__(self, db_uri):
+    def __init__(self, db_uri, provision_indexes=False, cache=None, engine_profile=DEFAULT_ENGINE_PROFILE,
+                 metrics=None, query_timeout=None, max_rows=None):
         """
-        Initialize a new engine using the given database URI
+        Initialize a new engine using the given database URI and engine profile (see ENGINE_PROFILES).
+        If provision_indexes is True, the indexes used by the queries are created at startup.
+        If a QueryCache is given, query results are cached until the database file changes.
+        If a MetricsRegistry is given, the latency, row count, result size and errors
+        of every query are recorded under the query name.
+        If query_timeout is given, a query still running after that many seconds is interrupted
+        and raises QueryTimeoutError (streamed queries have no deadline, they end with their consumer).
+        If max_rows is given, the full (not paginated) flight lists stop at max_rows records
+        and are returned as TruncatedRecords when more flights matched.
         """
-        self._engine = create_engine(db_uri)
+        profile = ENGINE_PROFILES[engine_profile]
+        self._database = make_url(db_uri).database
+        self._engine = create_profile_engine(db_uri, profile)
+        if 'write_profile' in profile:
+            self._write_engine = create_profile_engine(db_uri, ENGINE_PROFILES[profile['write_profile']])
+        else:
+            self._write_engine = self._engine
+        self._cache = cache
+        self._metrics = metrics
+        self._query_timeout = query_timeout
+        self._max_rows = max_rows
+        # Whether flights has the DEPARTURE_HOUR column, looked up by the first hourly query
+        self._departure_hour = None
+        if provision_indexes:
+            self.provision_indexes()
 
-    def _execute_query(self, query, params):
+    def _execute_query(self, query, params, dtype=None, name=None, max_rows=None):
         """
         Execute an SQL query with the params provided in a dictionary,
         and returns a list of records (dictionary-like objects).
-        If an exception was raised, print the error, and return an empty list.
+        If a NumPy dtype is given, returns a structured array (one field per column) instead,
+        filled straight from the cursor.
+        If max_rows is given, at most max_rows records are read (see fetch_capped).
+        Results are served from the cache when one is configured.
+        The query is recorded in the metrics (if configured) under the given name.
+        If the query ran past its deadline, raises QueryTimeoutError, and if a NULL
+        cannot be stored in the dtype, ColumnarNullError (see to_columns).
+        If another exception was raised, print the error, and return an empty list (or array).
         """
+        start = time.perf_counter()
+        if self._cache is not None:
+            key = (query, tuple(sorted(params.items())), dtype)
+            version = self.data_version()
+            found, rows = self._cache.get(key, version)
+            if found:
+                if self._metrics is not None:
+                    self._metrics.observe_query(name, time.perf_counter() - start, rows, cached=True)
+                return rows
+
         try:
-            with self._engine.connect() as connection:
-                result = connection.execute(text(query), params)
-                rows = result.fetchall()
-            return rows
+            with self._engine.connect() as connection, query_deadline(connection, self._query_timeout):
+                result = connection.execute(compile_statement(query), params)
+                if dtype is not None:
+                    rows = to_columns(result, dtype)
+                elif max_rows is not None:
+                    rows = fetch_capped(result, max_rows)
+                else:
+                    rows = result.fetchall()
+        except (QueryTimeoutError, ColumnarNullError):
+            if self._metrics is not None:
+                self._metrics.observe_query_error(name, time.perf_counter() - start)
+            raise
         except Exception as e:
             print(f"\u001b[38;5;160;1mError executing query: {e}\u001b[0m")
-            return []
+            if self._metrics is not None:
+                self._metrics.observe_query_error(name, time.perf_counter() - start)
+            return [] if dtype is None else np.empty(0, dtype=dtype)
+
+        if self._metrics is not None:
+            self._metrics.observe_query(name, time.perf_counter() - start, rows)
+        if self._cache is not None:
+            self._cache.put(key, version, rows)
+        return rows
+
+    def data_version(self):
+        """
+        Returns a marker that changes whenever the database is written to: the modification time,
+        size and write counter (see DATABASE_CHANGE_COUNTER) of the database file and of its
+        write-ahead log, so that two writes within the granularity of the modification times
+        still give two versions. Returns None for in-memory databases.
+        """
+        database = self._database
+        if not database or database == ':memory:':
+            return None
+        version = []
+        for path, (offset, size) in ((database, DATABASE_CHANGE_COUNTER), (database + '-wal', WAL_CHECKPOINT_SALTS)):
+            try:
+                with open(path, 'rb') as file:
+                    stat = os.fstat(file.fileno())
+                    file.seek(offset)
+                    counter = int.from_bytes(file.read(size), 'big')
+                version.append((stat.st_mtime_ns, stat.st_size, counter))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+
+    def cache_stats(self):
+        """
+        Returns the hit, miss and eviction counters of the result cache,
+        or None if no cache is configured.
+        """
+        if self._cache is None:
+            return None
+        return self._cache.stats()
+
+    def add_departure_hour(self):
+        """
+        Adds the DEPARTURE_HOUR column to the flights table if it does not exist yet,
+        backfills it and creates the trigger filling it for new flights (see ADD_DEPARTURE_HOUR).
+        Returns True if the column was added.
+        """
+        with self._write_engine.begin() as connection:
+            if connection.execute(text(QUERY_HAS_DEPARTURE_HOUR)).scalar():
+                self._departure_hour = True
+                return False
+            for statement in ADD_DEPARTURE_HOUR:
+                connection.execute(text(statement))
+        self._departure_hour = True
+        return True
+
+    def has_departure_hour(self):
+        """
+        Returns True if the flights table has the DEPARTURE_HOUR column (see add_departure_hour).
+        """
+        if self._departure_hour is None:
+            with self._engine.connect() as connection:
+                self._departure_hour = bool(connection.execute(text(QUERY_HAS_DEPARTURE_HOUR)).scalar())
+        return self._departure_hour
+
+    def _hourly_query(self, query):
+        """
+        Returns a query grouping by flights.DEPARTURE_HOUR as it is if the column exists, otherwise
+        with the hour computed from SCHEDULED_DEPARTURE (e.g. on a database that was never provisioned,
+        or opened with the 'immutable' profile, which cannot add the column).
+        """
+        if self.has_departure_hour():
+            return query
+        return query.replace('flights.DEPARTURE_HOUR', DEPARTURE_HOUR_EXPRESSION)
+
+    def provision_indexes(self):
+        """
+        Adds the DEPARTURE_HOUR column, drops the indexes listed in DROPPED_INDEXES,
+        creates the indexes listed in INDEXES (if they do not exist yet) and
+        refreshes the planner statistics, so SQLite picks them up.
+        Returns the names of the provisioned indexes.
+        """
+        self.add_departure_hour()
+        with self._write_engine.begin() as connection:
+            for index in DROPPED_INDEXES:
+                connection.execute(text(f"DROP INDEX IF EXISTS {index}"))
+            for statement in INDEXES.values():
+                connection.execute(text(statement))
+            connection.execute(text("ANALYZE"))
+        return list(INDEXES)
+
+    def explain_query_plan(self, query):
+        """
+        Runs EXPLAIN QUERY PLAN for the given query and returns the plan details.
+        Every named parameter is bound to NULL, as the values do not affect the plan shape.
+        """
+        params = {name: None for name in re.findall(r'(?<!:):(\w+)', query)}
+        with self._engine.connect() as connection:
+            rows = connection.execute(text(f"EXPLAIN QUERY PLAN {query}"), params).fetchall()
+        return [row[-1] for row in rows]
+
+    def verify_query_plans(self, strict=False):
+        """
+        Checks the plan of every query in QUERIES and reports the queries that
+        scan a table from FULL_SCAN_TABLES without using an index, or read the flights
+        table other than from their covering index in QUERY_INDEXES.
+        A query that cannot be planned (e.g. on a database missing a column) is reported with its error.
+        Returns a dictionary of query name -> offending plan steps.
+        If strict is True, raises QueryPlanError instead of printing the report.
+        """
+        bad_plans = {}
+        for name, query in QUERIES.items():
+            query = self._hourly_query(_project(query, DEFAULT_FLIGHT_COLUMNS))
+            try:
+                steps = [step for step in self.explain_query_plan(query)
+                         if _is_full_scan(step) or _misses_index(step, QUERY_INDEXES.get(name))]
+            except exc.OperationalError as e:
+                steps = [f"cannot plan the query: {e.orig}"]
+            if steps:
+                bad_plans[name] = steps
+
+        if bad_plans and strict:
+            raise QueryPlanError(f"Queries falling back to a full scan or missing their index: {bad_plans}")
+        for name, steps in bad_plans.items():
+            print(f"\u001b[38;5;160;1mUnexpected plan for query '{name}': {'; '.join(steps)}\u001b[0m")
+        return bad_plans
 
-    def get_flight_by_id(self, flight_id):
+    def _stream_query(self, query, params, batch_size=STREAM_BATCH_SIZE, name=None):
+        """
+        Execute an SQL query with the params provided in a dictionary,
+        and yields the records one by one as they are read from the database cursor,
+        so the full result is never held in memory.
+        The connection is kept open until the generator is exhausted or closed.
+        """
+        for partition in self._stream_batches(query, params, batch_size, name):
+            yield from partition
+
+    def _stream_batches(self, query, params, batch_size=STREAM_BATCH_SIZE, name=None):
+        """
+        Execute an SQL query with the params provided in a dictionary,
+        and yields the records in lists of at most batch_size, as they are read from the database cursor.
+        The connection is kept open until the generator is exhausted or closed.
+        The query is recorded in the metrics (if configured) once the generator is exhausted or closed.
+        """
+        start = time.perf_counter()
+        row_count = 0
+        failed = False
+        try:
+            with self._engine.connect() as connection:
+                statement = compile_statement(query)
+                result = connection.execution_options(stream_results=True).execute(statement, params)
+                for partition in result.partitions(batch_size):
+                    row_count += len(partition)
+                    yield partition
+        except Exception:
+            failed = True
+            raise
+        finally:
+            if self._metrics is not None and failed:
+                self._metrics.observe_query_error(name, time.perf_counter() - start)
+            elif self._metrics is not None:
+                self._metrics.observe_query(name, time.perf_counter() - start, row_count)
+
+    def _fetch(self, query, params, limit=None, after=None, stream=False, columns=DEFAULT_FLIGHT_COLUMNS,
+               name=None, capped=True):
+        """
+        Runs a flight details query projected to the given columns (see _project),
+        optionally restricted to a keyset page (flights with an ID greater than 'after',
+        at most 'limit' of them, ordered by ID).
+        If stream is True, returns a generator of records instead of a list.
+        Without a limit, the list is capped at the max_rows of the data manager (see TruncatedRecords),
+        unless capped is False (for queries whose size is bounded otherwise).
+        name is the query name recorded in the metrics.
+        """
+        query = _project(query, columns)
+        query, params = _paginate(query, params, limit, after)
+        if stream:
+            return self._stream_query(query, params, name=name)
+        max_rows = self._max_rows if capped and limit is None else None
+        return self._execute_query(query, params, name=name, max_rows=max_rows)
+
+    def get_flight_by_id(self, flight_id, columns=DEFAULT_FLIGHT_COLUMNS):
         """
         Searches for flight details using flight ID.
         If the flight was found, returns a list with a single record.
         """
         params = {'id': flight_id}
-        return self._execute_query(QUERY_FLIGHT_BY_ID, params)
+        return self._fetch(QUERY_FLIGHT_BY_ID, params, columns=columns, name='flight_by_id')
+
+    def get_flights_by_ids(self, flight_ids, columns=DEFAULT_FLIGHT_COLUMNS, chunk_size=ID_CHUNK_SIZE):
+        """
+        Searches for the details of many flights at once, using their flight IDs.
+        The IDs are resolved in chunks of chunk_size, each with a single query, which is not capped
+        at max_rows: a chunk returns at most one flight per ID, and a cut chunk would report
+        existing flights as not found.
+        Returns a list in the order of flight_ids, with a record for each found flight
+        and None for each ID that was not found.
+        """
+        if columns != ALL_FLIGHT_COLUMNS and 'ID' not in columns:
+            columns = ('ID',) + tuple(columns)
+
+        unique_ids = list(dict.fromkeys(flight_ids))
+        found = {}
+        for start in range(0, len(unique_ids), chunk_size):
+            params = {'ids': json.dumps(unique_ids[start:start + chunk_size])}
+            for record in self._fetch(QUERY_FLIGHTS_BY_IDS, params, columns=columns, name='flights_by_ids',
+                                      capped=False):
+                found.setdefault(record._mapping['ID'], record)
+        return [found.get(flight_id) for flight_id in flight_ids]
 
-    def get_flights_by_date(self, day, month, year):
+    def get_flights_by_date(self, day, month, year, limit=None, after=None, stream=False,
+                            columns=DEFAULT_FLIGHT_COLUMNS):
         """
         Searches for flight details using a particular date provided by the user.
         If flights are found, returns a list of records.
+        limit/after select a keyset page, stream returns a generator of records
+        and columns selects the projected columns (see _fetch).
         """
         params = {'day': day,
                   'month': month,
                   'year': year}
-        return self._execute_query(QUERY_FLIGHT_BY_DATE, params)
+        return self._fetch(QUERY_FLIGHT_BY_DATE, params, limit, after, stream, columns, 'flight_by_date')
 
-    def get_delayed_flights_by_airline(self, airline):
+    def get_delayed_flights_by_airline(self, airline, limit=None, after=None, stream=False,
+                                       columns=DEFAULT_FLIGHT_COLUMNS):
         """
         Searches for flight details based on an airline name specified by the user.
         If flights are found, a list of records is returned.
+        limit/after select a keyset page, stream returns a generator of records
+        and columns selects the projected columns (see _fetch).
         """
         params = {'airline': airline}
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, params)
+        return self._fetch(QUERY_DELAYED_FLIGHTS_BY_AIRLINE, params, limit, after, stream, columns,
+                           'delayed_flights_by_airline')
 
-    def get_delayed_flights_by_airport(self, airport):
+    def get_delayed_flights_by_airport(self, airport, limit=None, after=None, stream=False,
+                                       columns=DEFAULT_FLIGHT_COLUMNS):
         """
         Searches for flight details based on an airport name (IATA CODE) specified by the user.
         If flights are found, a list of records is returned.
+        limit/after select a keyset page, stream returns a generator of records
+        and columns selects the projected columns (see _fetch).
         """
         params = {'airport': airport}
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_AIRPORT, params)
+        return self._fetch(QUERY_DELAYED_FLIGHTS_BY_AIRPORT, params, limit, after, stream, columns,
+                           'delayed_flights_by_airport')
+
+    def search_flights(self, start_date=None, end_date=None, airline=None, origin=None, destination=None,
+                       min_delay=None, limit=None, after=None, stream=False, columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for the flights matching every given filter: a date range (dates, both included),
+        an airline name, origin and destination airports (IATA codes) and a minimum departure
+        delay in minutes. The filters left to None are not applied.
+        Each combination of filters is built once into a cached, parameterized statement.
+        limit/after select a keyset page, stream returns a generator of records
+        and columns selects the projected columns (see _fetch).
+        """
+        query, params = _search_statement(start_date, end_date, airline, origin, destination, min_delay)
+        return self._fetch(query, params, limit, after, stream, columns, 'search_flights')
+
+    def export_flights(self, start_date=None, end_date=None, airline=None, origin=None, destination=None,
+                       min_delay=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Streams the flights matching the search filters (see search_flights) with the
+        EXPORT_COLUMNS, for the columnar exports.
+        Returns a generator of record lists of at most batch_size records, so the memory use
+        does not grow with the size of the export.
+        """
+        query, params = _search_statement(start_date, end_date, airline, origin, destination, min_delay)
+        query = query.format(columns=', '.join(EXPORT_COLUMNS.values()))
+        return self._stream_batches(query, params, batch_size, 'export_flights')
 
     def __del__(self):
         """
         Closes the connection to the database when the object is about to be destroyed
         """
         self._engine.dispose()
+        self._write_engine.dispose()
+
+
+def create_profile_engine(db_uri, profile):
+    """
+    Creates an engine for the given database URI configured by an engine profile:
+    read-only/immutable open mode, pool size, and pragmas applied to every new connection.
+    With 'warm', the pooled connections are opened up front, so the first requests find them ready.
+    """
+    url = make_url(db_uri)
+    if profile.get('mode'):
+        path = os.path.abspath(url.database)
+        query = {'mode': profile['mode'], 'uri': 'true'}
+        if profile.get('immutable'):
+            query['immutable'] = '1'
+        url = url.set(database=f"file:{path}", query=query)
+
+    options = {key: profile[key] for key in ('pool_size', 'max_overflow') if key in profile}
+    if 'statement_cache_size' in profile:
+        options['connect_args'] = {'cached_statements': profile['statement_cache_size']}
+    engine = create_engine(url, **options)
+
+    pragmas = profile.get('pragmas', {})
+    if pragmas:
+        @event.listens_for(engine, 'connect')
+        def apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            cursor.close()
+
+    if profile.get('warm'):
+        connections = [engine.connect() for _ in range(profile['pool_size'])]
+        for connection in connections:
+            connection.close()
+    return engine
+
+
+@contextmanager
+def query_deadline(connection, timeout):
+    """
+    Interrupts the queries run on a connection within the block once timeout seconds have passed,
+    from a SQLite progress handler, and raises QueryTimeoutError for the interrupted query.
+    A timeout of None sets no deadline.
+    """
+    if timeout is None:
+        yield
+        return
+    deadline = time.monotonic() + timeout
+    dbapi_connection = connection.connection.dbapi_connection
+    # A true return value makes SQLite abort the running statement with "interrupted"
+    dbapi_connection.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_HANDLER_INSTRUCTIONS)
+    try:
+        yield
+    except exc.OperationalError as e:
+        if isinstance(e.orig, sqlite3.OperationalError) and time.monotonic() > deadline:
+            raise QueryTimeoutError(f"Query interrupted after {timeout}s") from e
+        raise
+    finally:
+        dbapi_connection.set_progress_handler(None, PROGRESS_HANDLER_INSTRUCTIONS)
+
+
+def to_columns(rows, dtype):
+    """
+    Returns the rows (tuples or records) as a structured array of dtype, filled row by row.
+    A NULL is stored as the missing value of its field kind (see COLUMNAR_NULLS), rather than
+    as the string 'None'; in a field without one (e.g. an integer), it raises ColumnarNullError.
+    """
+    nulls = [COLUMNAR_NULLS.get(dtype[name].kind) for name in dtype.names]
+
+    def fill_nulls(row):
+        if None not in row:
+            return tuple(row)
+        filled = []
+        for name, null, value in zip(dtype.names, nulls, row):
+            if value is None:
+                if null is None:
+                    raise ColumnarNullError(f"NULL in the {dtype[name]} field '{name}'")
+                value = null
+            filled.append(value)
+        return tuple(filled)
+
+    return np.fromiter(map(fill_nulls, rows), dtype=dtype)
+
+
+def fetch_capped(result, max_rows):
+    """
+    Reads at most max_rows records from a result. If more records are left,
+    they are not read and the records are returned as TruncatedRecords.
+    """
+    rows = result.fetchmany(max_rows + 1)
+    if len(rows) > max_rows:
+        return TruncatedRecords(rows[:max_rows])
+    return rows
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def compile_statement(query):
+    """
+    Returns the SQLAlchemy statement of an SQL string, built once per distinct string.
+    A repeated statement is also found in SQLAlchemy's compiled cache and in the prepared
+    statement cache of the SQLite connection, so it is not parsed or planned again.
+    """
+    return text(query)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _search_query(filter_names):
+    """
+    Builds the flight search query (still with its {columns} placeholder) for a combination
+    of SEARCH_FILTERS names, once per combination.
+    """
+    conditions = ' AND '.join(SEARCH_FILTERS[name] for name in SEARCH_FILTERS if name in filter_names)
+    return QUERY_SEARCH_FLIGHTS.format(columns='{columns}', conditions=conditions or '1')
+
+
+def _search_statement(start_date=None, end_date=None, airline=None, origin=None, destination=None,
+                      min_delay=None):
+    """
+    Returns the flight search query (still with its {columns} placeholder) and its params
+    for the given search filters, the ones left to None not being applied.
+    Shared by search_flights and export_flights, so both always apply the same filters.
+    """
+    filters = {'start_date': start_date,
+               'end_date': end_date,
+               'airline': airline,
+               'origin': origin,
+               'destination': destination,
+               'min_delay': min_delay}
+    filter_names = tuple(name for name, value in filters.items() if value is not None)
+    return _search_query(filter_names), _filter_params(filters)
+
+
+def _filter_params(filters):
+    """
+    Returns the query params of the given filters (name -> value, None when not applied),
+    splitting the 'start_date' and 'end_date' dates into their year, month and day.
+    """
+    params = {}
+    for name, value in filters.items():
+        if value is None:
+            continue
+        if name in ('start_date', 'end_date'):
+            prefix = name[:-len('_date')]
+            params.update({f"{prefix}_year": value.year,
+                           f"{prefix}_month": value.month,
+                           f"{prefix}_day": value.day})
+        else:
+            params[name] = value
+    return params
+
+
+def _project(query, columns):
+    """
+    Fills the column list of a flight details query.
+    columns is a sequence of names from FLIGHT_COLUMNS or other flights columns,
+    or ALL_FLIGHT_COLUMNS for the full row.
+    """
+    if columns == ALL_FLIGHT_COLUMNS:
+        return query.format(columns=ALL_FLIGHT_COLUMNS_SQL)
+
+    expressions = []
+    for column in columns:
+        if column in FLIGHT_COLUMNS:
+            expressions.append(FLIGHT_COLUMNS[column])
+        elif column.isidentifier():
+            expressions.append(f"flights.{column}")
+        else:
+            raise ValueError(f"Invalid column name: {column!r}")
+    return query.format(columns=', '.join(expressions))
+
+
+def _paginate(query, params, limit, after):
+    """
+    Extends a flight details query with keyset pagination on flights.ID.
+    Returns the new query and params.
+    """
+    if after is None and limit is None:
+        return query, params
+    params = dict(params)
+    if after is not None:
+        query += " AND flights.ID > :after"
+        params['after'] = after
+    query += " ORDER BY flights.ID"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params['limit'] = limit
+    return query, params
+
+
+def approximate_dtype(dtype):
+    """
+    Returns the dtype of the approximate results of an aggregate of the given dtype.
+    """
+    return np.dtype(dtype.descr + APPROXIMATE_FIELDS)
+
+
+def wilson_interval(successes, trials, z=CONFIDENCE_Z):
+    """
+    Returns the lower and upper bounds (in percent) of the Wilson score confidence intervals
+    of the proportions successes / trials (NumPy arrays). Unlike the normal approximation,
+    the bounds stay within [0, 100] and are meaningful for small samples and extreme proportions.
+    """
+    trials = np.maximum(trials, 1)
+    proportion = successes / trials
+    denominator = 1 + z ** 2 / trials
+    center = (proportion + z ** 2 / (2 * trials)) / denominator
+    margin = z * np.sqrt(proportion * (1 - proportion) / trials + z ** 2 / (4 * trials ** 2)) / denominator
+    return (center - margin) * 100, (center + margin) * 100
+
+
+def estimate_delays(counts, sample_fraction):
+    """
+    Turns the counts of an aggregate over a sample (a structured array of an aggregate dtype)
+    into estimates for all the flights: the totals are scaled by 1 / sample_fraction, and each
+    percentage gets its confidence interval (see wilson_interval) and the sparse flag
+    (fewer than SPARSE_SAMPLE_FLIGHTS sampled flights). A group without any sampled flight
+    (see complete_groups) keeps a NaN percentage and gets the uninformative [0, 100] interval.
+    With a sample_fraction of 1 (exact counts), the intervals are reduced to the percentages.
+    Returns a structured array of approximate_dtype(counts.dtype).
+    """
+    result = np.zeros(len(counts), dtype=approximate_dtype(counts.dtype))
+    for field in counts.dtype.names:
+        result[field] = counts[field]
+    result['sample_flights'] = counts['total_flights']
+    if sample_fraction == 1:
+        result['ci_low'] = result['ci_high'] = counts['delayed_percentage']
+        return result
+
+    result['total_flights'] = np.rint(counts['total_flights'] / sample_fraction)
+    result['delayed_flights'] = np.rint(counts['delayed_flights'] / sample_fraction)
+    result['ci_low'], result['ci_high'] = wilson_interval(counts['delayed_flights'], counts['total_flights'])
+    unsampled = counts['total_flights'] == 0
+    result['ci_low'][unsampled] = 0
+    result['ci_high'][unsampled] = 100
+    result['sparse'] = counts['total_flights'] < SPARSE_SAMPLE_FLIGHTS
+    return result
+
+
+def complete_groups(counts, groups):
+    """
+    Adds to the counts of an aggregate over the sample the groups of groups (an array of the same
+    dtype, e.g. the aggregate from the summary tables) that have no sampled flight, with zero
+    flights and a NaN percentage, so they are flagged as sparse rather than missing.
+    The groups are identified by the fields before total_flights; the other fields of an added
+    group (e.g. the coordinates of a route) are taken from groups.
+    Returns a structured array of counts.dtype, ordered by group.
+    """
+    keys = list(counts.dtype.names[:counts.dtype.names.index('total_flights')])
+    sampled = set(counts[keys].tolist())
+    missing = groups[np.fromiter((group not in sampled for group in groups[keys].tolist()), dtype=bool,
+                                 count=len(groups))]
+    if not len(missing):
+        return counts
+    missing = missing.astype(counts.dtype)
+    missing['total_flights'] = 0
+    missing['delayed_flights'] = 0
+    missing['delayed_percentage'] = np.nan
+    return np.sort(np.concatenate([counts, missing]), order=keys)
+
+
+class RouteDelayMatrix:
+    """
+    The delayed percentages of the routes as a sparse (coordinate) matrix: one entry per route,
+    at (rows[i], columns[i]) for the airports origins[rows[i]] and destinations[columns[i]].
+    The airports of both axes are ordered by traffic (flights from and to the airport over the
+    selected routes, most first) and then by IATA code, so the order is the same on every run and
+    the hubs, which share most routes, are clustered in the top left corner.
+    """
+
+    def __init__(self, origins, destinations, rows, columns, percentages, total_flights, sparse):
+        self.origins = origins
+        self.destinations = destinations
+        self.rows = rows
+        self.columns = columns
+        self.percentages = percentages
+        self.total_flights = total_flights
+        self.sparse = sparse
+
+    @property
+    def shape(self):
+        return len(self.origins), len(self.destinations)
+
+    def to_dense(self, fill_value=np.nan):
+        """
+        Returns the matrix as a dense 2D array, with fill_value for the routes without flights.
+        Only meant for small matrices (e.g. a top-N selection).
+        """
+        dense = np.full(self.shape, fill_value)
+        dense[self.rows, self.columns] = self.percentages
+        return dense
+
+
+def route_delay_matrix(routes, top_airports=None, min_flights=None):
+    """
+    Builds the RouteDelayMatrix of the routes returned by get_delayed_flights_per_route
+    (a structured array, exact or approximate), keeping only the routes with at least
+    min_flights flights and, if top_airports is given, the routes between the top_airports
+    busiest airports. The sparse flags of approximate results are kept (all False otherwise).
+    """
+    if min_flights is not None:
+        routes = routes[routes['total_flights'] >= min_flights]
+
+    airports, indices = np.unique(np.concatenate([routes['origin'], routes['destination']]), return_inverse=True)
+    traffic = np.bincount(indices, weights=np.tile(routes['total_flights'], 2), minlength=len(airports))
+    # Rank the airports by traffic, most first, then by code (np.lexsort sorts by the last key first)
+    ranking = np.lexsort((airports, -traffic))
+    ranks = np.empty(len(airports), dtype=np.intp)
+    ranks[ranking] = np.arange(len(airports))
+    origin_ranks, destination_ranks = np.split(ranks[indices], 2)
+    if top_airports is not None:
+        selected = (origin_ranks < top_airports) & (destination_ranks < top_airports)
+        routes, origin_ranks, destination_ranks = routes[selected], origin_ranks[selected], destination_ranks[selected]
+
+    # Each axis keeps the airports it uses, in the order of the ranking
+    origin_axis, rows = np.unique(origin_ranks, return_inverse=True)
+    destination_axis, columns = np.unique(destination_ranks, return_inverse=True)
+    sparse = routes['sparse'] if 'sparse' in routes.dtype.names else np.zeros(len(routes), dtype=bool)
+    return RouteDelayMatrix(airports[ranking[origin_axis]], airports[ranking[destination_axis]], rows, columns,
+                            routes['delayed_percentage'], routes['total_flights'], sparse)
+
+
+def _misses_index(plan_step, index):
+    """
+    Returns True if an EXPLAIN QUERY PLAN step reads the flights table other than from
+    the given covering index (None: any access is expected).
+    """
+    if index is None or not re.match(r'(?:SCAN|SEARCH) (?:TABLE )?flights\b', plan_step):
+        return False
+    return not re.search(rf'USING COVERING INDEX {index}\b', plan_step)
+
+
+def _is_full_scan(plan_step):
+    """
+    Returns True if an EXPLAIN QUERY PLAN step reads a whole large table
+    without an index, e.g. "SCAN flights" (or "SCAN TABLE flights" in older SQLite versions).
+    """
+    match = re.match(r'SCAN (?:TABLE )?(\w+)', plan_step)
+    return bool(match) and match.group(1) in FULL_SCAN_TABLES and 'INDEX' not in plan_step
 
 
 class FlightDataVisuals(FlightData):
@@ -78,35 +848,255 @@ class FlightDataVisuals(FlightData):
     for visualizing flight data.
     """
 
-    def __init__(self, db_uri):
+    def __init__(self, db_uri, provision_indexes=False, cache=None, engine_profile=DEFAULT_ENGINE_PROFILE,
+                 use_summaries=False, metrics=None, query_timeout=None, max_rows=None, prepare_tables=False):
+        """
+        Initialize a new engine using the given database URI and engine profile.
+        If use_summaries is True, the aggregates are answered from the summary tables if they
+        exist, read as they are: the flights appended later are added by refresh_summaries()
+        (ingest.py calls it after a load).
+        The summary tables, the flights sample and the DEPARTURE_HOUR column are built by an
+        explicit step (python main.py --provision, ingest.py, render.py, or build_summaries() and
+        build_sample()), so by default creating a data manager never writes to the database.
+        If prepare_tables is True, the summary tables are built and brought up to date here
+        (with use_summaries), and the flights sample by the first approximate aggregate.
+        query_timeout and max_rows bound the queries (see FlightData).
+        """
+        super().__init__(db_uri, provision_indexes, cache, engine_profile, metrics, query_timeout, max_rows)
+        self._prepare_tables = prepare_tables
+        if use_summaries and prepare_tables:
+            self._use_summaries = self.build_summaries()
+        else:
+            self._use_summaries = use_summaries and self.has_derived_table(DELAY_SUMMARIES)
+        # The flights sample is looked up (or, with prepare_tables, built) by the first approximate aggregate
+        self._sample_built = None
+        self._summaries_built = self._use_summaries or None
+
+    def build_summaries(self):
+        """
+        Creates the summary tables and the DEPARTURE_HOUR column (if they do not exist yet)
+        and brings the summary tables up to date.
+        Returns True on success. If an exception was raised, print the error, and return False.
+        """
+        try:
+            self.add_departure_hour()
+            with self._write_engine.begin() as connection:
+                for statement in SUMMARY_TABLES:
+                    connection.execute(text(statement))
+                connection.execute(text(INSERT_SUMMARY_STATE), {'name': DELAY_SUMMARIES})
+        except Exception as e:
+            print(f"\u001b[38;5;160;1mError creating summary tables: {e}\u001b[0m")
+            return False
+        return self.refresh_summaries()
+
+    def has_derived_table(self, name):
+        """
+        Returns True if the derived tables stored in summary_state under name (DELAY_SUMMARIES
+        or FLIGHTS_SAMPLE) were built, without writing to the database.
+        """
+        try:
+            with self._engine.connect() as connection:
+                return connection.execute(text(QUERY_SUMMARY_HIGH_WATER_MARK), {'name': name}).first() is not None
+        except exc.OperationalError:
+            return False
+
+    def refresh_summaries(self):
+        """
+        Adds the flights appended since the last refresh (flights with an ID above
+        the stored high-water mark) to the summary tables.
+        Returns True if the summary tables are up to date. If an exception was raised,
+        print the error, and return False.
+        """
+        try:
+            self._refresh_incrementally(DELAY_SUMMARIES, REFRESH_SUMMARIES)
+            return True
+        except Exception as e:
+            print(f"\u001b[38;5;160;1mError refreshing summary tables: {e}\u001b[0m")
+            return False
+
+    def _refresh_incrementally(self, name, statements, params=None):
         """
-        Initialize a new engine using the given database URI
+        Runs the statements maintaining a derived table (summary tables, sample) over the flights
+        with an ID above the high-water mark stored in summary_state under name, up to the current
+        maximum ID, and moves the high-water mark, in one transaction.
+        The statements get :high_water_mark, :new_high_water_mark and the given params.
         """
-        super().__init__(db_uri)
+        with self._write_engine.begin() as connection:
+            high_water_mark = connection.execute(text(QUERY_SUMMARY_HIGH_WATER_MARK), {'name': name}).scalar()
+            min_id, max_id = connection.execute(text(QUERY_FLIGHT_ID_RANGE)).one()
+            if high_water_mark is not None and (max_id is None or max_id <= high_water_mark):
+                return
 
-    def get_percentage_of_delayed_flights_by_airline(self):
+            params = dict(params or {}, name=name, high_water_mark=high_water_mark, new_high_water_mark=max_id)
+            # The conditional update takes the write lock, so a concurrent refresh
+            # that already moved the high-water mark cannot be applied twice
+            if connection.execute(text(UPDATE_SUMMARY_HIGH_WATER_MARK), params).rowcount == 0:
+                return
+            if max_id is None:
+                return
+            if high_water_mark is None:
+                params['high_water_mark'] = min_id - 1
+            for statement in statements:
+                connection.execute(text(statement), params)
+
+    def build_sample(self):
+        """
+        Creates the flights sample of the approximate aggregates and the DEPARTURE_HOUR column
+        (if they do not exist yet) and brings the sample up to date, together with the summary
+        tables, which give the approximate aggregates their complete set of groups.
+        Returns True on success. If an exception was raised, print the error, and return False.
+        """
+        self._summaries_built = self.build_summaries()
+        try:
+            self.add_departure_hour()
+            with self._write_engine.begin() as connection:
+                connection.execute(text(SUMMARY_TABLES[0]))
+                connection.execute(text(CREATE_FLIGHTS_SAMPLE))
+                connection.execute(text(INSERT_SUMMARY_STATE), {'name': FLIGHTS_SAMPLE})
+        except Exception as e:
+            print(f"\u001b[38;5;160;1mError creating the flights sample: {e}\u001b[0m")
+            return False
+        return self.refresh_sample()
+
+    def refresh_sample(self):
+        """
+        Adds the flights appended since the last refresh to the flights sample:
+        SAMPLE_FRACTION of them, picked by a hash of their ID.
+        Returns True if the sample is up to date. If an exception was raised,
+        print the error, and return False.
+        """
+        try:
+            self._refresh_incrementally(FLIGHTS_SAMPLE, [REFRESH_FLIGHTS_SAMPLE],
+                                        {'sample_threshold': int(SAMPLE_FRACTION * SAMPLE_HASH_MODULUS)})
+            return True
+        except Exception as e:
+            print(f"\u001b[38;5;160;1mError refreshing the flights sample: {e}\u001b[0m")
+            return False
+
+    def _execute_aggregate(self, summary_query, query, dtype=None, name=None):
+        """
+        Runs an aggregate query from the summary tables if they are enabled, otherwise over the
+        flights table. The summary tables are read as they are, without taking the write lock
+        to refresh them, so the aggregates stay read-only queries.
+        In the metrics, the summary variant is recorded as 'summary_<name>'.
+        """
+        if self._use_summaries:
+            return self._execute_query(summary_query, {}, dtype, f"summary_{name}")
+        return self._execute_query(query, {}, dtype, name)
+
+    def _execute_approximate(self, sample_query, summary_query, query, dtype, name, columnar):
+        """
+        Runs an aggregate query over the flights sample (see build_sample) and estimates the
+        figures of all the flights from it (see estimate_delays); if there is no sample,
+        runs the exact query, with intervals reduced to the exact percentages.
+        The groups without any sampled flight are taken from the summary tables (summary_query)
+        and flagged as sparse (see complete_groups); without summary tables, they are missing.
+        The sample is used if it exists (with prepare_tables, it is built and brought up to date
+        by the first call), and read as it is, like the summary tables (see refresh_sample).
+        Returns a structured array of approximate_dtype(dtype) if columnar is True,
+        otherwise a list of tuples.
+        """
+        if self._sample_built is None:
+            self._sample_built = (self.build_sample() if self._prepare_tables
+                                  else self.has_derived_table(FLIGHTS_SAMPLE))
+        if self._sample_built:
+            counts = self._execute_query(sample_query, {}, dtype, f"sample_{name}")
+            if self._summaries_built is None:
+                self._summaries_built = self.has_derived_table(DELAY_SUMMARIES)
+            if self._summaries_built:
+                counts = complete_groups(counts, self._execute_query(summary_query, {}, dtype, f"summary_{name}"))
+            result = estimate_delays(counts, SAMPLE_FRACTION)
+        else:
+            result = estimate_delays(self._execute_query(query, {}, dtype, name), 1.0)
+        return result if columnar else result.tolist()
+
+    def get_percentage_of_delayed_flights_by_airline(self, columnar=False, approximate=False):
         """
         Retrieves the percentage of delayed flights for each airline.
+        If columnar is True, returns a structured array of AIRLINE_DELAYS_DTYPE.
+        If approximate is True, the figures are estimated from the flights sample
+        (see _execute_approximate), with confidence intervals.
         """
-        return self._execute_query(QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE, {})
+        if approximate:
+            return self._execute_approximate(QUERY_SAMPLE_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+                                             QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+                                             QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+                                             AIRLINE_DELAYS_DTYPE, 'percentage_of_delayed_flights_by_airline',
+                                             columnar)
+        return self._execute_aggregate(QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+                                       QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+                                       AIRLINE_DELAYS_DTYPE if columnar else None,
+                                       'percentage_of_delayed_flights_by_airline')
 
-    def get_percentage_of_delayed_flights_per_hour(self):
+    def get_percentage_of_delayed_flights_per_hour(self, columnar=False, approximate=False):
         """
         Retrieves the percentage of delayed flights per hour of the day.
+        If columnar is True, returns a structured array of HOUR_DELAYS_DTYPE.
+        If approximate is True, the figures are estimated from the flights sample
+        (see _execute_approximate), with confidence intervals.
+        """
+        if approximate:
+            return self._execute_approximate(QUERY_SAMPLE_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR,
+                                             QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR,
+                                             self._hourly_query(QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR),
+                                             HOUR_DELAYS_DTYPE, 'percentage_of_delayed_flights_per_hour', columnar)
+        return self._execute_aggregate(QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR,
+                                       self._hourly_query(QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR),
+                                       HOUR_DELAYS_DTYPE if columnar else None,
+                                       'percentage_of_delayed_flights_per_hour')
+
+    def get_percentage_of_delayed_flights_per_hour_filtered(self, airline=None, airport=None, start_date=None,
+                                                            end_date=None, columnar=False):
+        """
+        Retrieves the percentage of delayed flights per hour of the day, for the flights of
+        an airline (name), from an origin airport (IATA code) and/or in a date range
+        (dates, both included). Without any filter, the same as get_percentage_of_delayed_flights_per_hour().
+        If columnar is True, returns a structured array of HOUR_DELAYS_DTYPE.
         """
-        return self._execute_query(QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR, {})
+        filters = {'airline': airline, 'airport': airport, 'start_date': start_date, 'end_date': end_date}
+        filters = {name: value for name, value in filters.items() if value is not None}
+        if not filters:
+            return self.get_percentage_of_delayed_flights_per_hour(columnar)
+
+        params = _filter_params(filters)
+        conditions = ' AND '.join(HOURLY_DELAY_FILTERS[name] for name in filters)
+        query = self._hourly_query(QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR_WHERE.format(conditions=conditions))
+        return self._execute_query(query, params, HOUR_DELAYS_DTYPE if columnar else None,
+                                   'percentage_of_delayed_flights_per_hour_filtered')
 
-    def get_delayed_flights_per_route(self):
+    def get_delayed_flights_per_route(self, columnar=False, approximate=False):
         """
         Retrieves the percentage of delayed flights per route (origin and destination).
+        If columnar is True, returns a structured array of ROUTE_DELAYS_DTYPE.
+        If approximate is True, the figures are estimated from the flights sample
+        (see _execute_approximate), with confidence intervals.
         """
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_ROUTE, {})
+        if approximate:
+            return self._execute_approximate(QUERY_SAMPLE_DELAYED_FLIGHTS_BY_ROUTE, QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE,
+                                             QUERY_DELAYED_FLIGHTS_BY_ROUTE, ROUTE_DELAYS_DTYPE,
+                                             'delayed_flights_by_route', columnar)
+        return self._execute_aggregate(QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE,
+                                       QUERY_DELAYED_FLIGHTS_BY_ROUTE,
+                                       ROUTE_DELAYS_DTYPE if columnar else None,
+                                       'delayed_flights_by_route')
 
-    def get_delayed_flights_per_route_with_coordinates(self):
+    def get_delayed_flights_per_route_with_coordinates(self, columnar=False, approximate=False):
         """
         Retrieves the percentage of delayed flights per route (origin and
-        destination) with geographical coordinates."""
-        return self._execute_query(QUERY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD, {})
+        destination) with geographical coordinates.
+        If columnar is True, returns a structured array of ROUTE_DELAYS_WITH_COORD_DTYPE.
+        If approximate is True, the figures are estimated from the flights sample
+        (see _execute_approximate), with confidence intervals."""
+        if approximate:
+            return self._execute_approximate(QUERY_SAMPLE_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+                                             QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+                                             QUERY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+                                             ROUTE_DELAYS_WITH_COORD_DTYPE, 'delayed_flights_by_route_with_coord',
+                                             columnar)
+        return self._execute_aggregate(QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+                                       QUERY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+                                       ROUTE_DELAYS_WITH_COORD_DTYPE if columnar else None,
+                                       'delayed_flights_by_route_with_coord')
 
     def __del__(self):
         """Closes the connection to the database."""
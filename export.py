@@ -0,0 +1,175 @@
+import argparse
+import os
+import time
+from datetime import datetime
+from data import EXPORT_COLUMNS, FlightData
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+"""
+Columnar exports of the flights: the record batches streamed by FlightData.export_flights
+are converted to Arrow record batches and encoded as an Arrow IPC stream or as a Parquet file
+(one row group per batch), chunk after chunk, so an export of any size is written with
+the memory of a single batch. pyarrow is optional: only the exports need it.
+"""
+EXPORT_FORMATS = {'arrow': 'application/vnd.apache.arrow.stream',
+                  'parquet': 'application/vnd.apache.parquet'}
+EXPORT_FILE_EXTENSIONS = {'arrow': 'arrows', 'parquet': 'parquet'}
+
+"""
+The Arrow type of each of the EXPORT_COLUMNS (pyarrow type factory names).
+"""
+EXPORT_COLUMN_TYPES = {
+    'ID': 'int64',
+    'YEAR': 'int16',
+    'MONTH': 'int8',
+    'DAY': 'int8',
+    'AIRLINE_CODE': 'string',
+    'AIRLINE': 'string',
+    'FLIGHT_NUMBER': 'int32',
+    'TAIL_NUMBER': 'string',
+    'ORIGIN_AIRPORT': 'string',
+    'DESTINATION_AIRPORT': 'string',
+    'SCHEDULED_DEPARTURE': 'string',
+    'DEPARTURE_TIME': 'string',
+    'DEPARTURE_DELAY': 'int32',
+    'ARRIVAL_TIME': 'string',
+    'ARRIVAL_DELAY': 'int32',
+    'DIVERTED': 'int8',
+    'CANCELLED': 'int8',
+}
+
+
+class ChunkSink:
+    """
+    A write-only file object collecting the encoded bytes until they are drained.
+    Its position keeps counting the bytes written since the start, as the Parquet
+    footer records the offsets of the row groups in the whole file.
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        """
+        Returns the bytes written since the previous drain.
+        """
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def export_available():
+    """
+    Returns True if pyarrow is installed, so the columnar exports can be written.
+    """
+    return pa is not None
+
+
+def export_schema():
+    """
+    Returns the Arrow schema of the exports (the EXPORT_COLUMNS, in order).
+    """
+    return pa.schema([(name, getattr(pa, EXPORT_COLUMN_TYPES[name])()) for name in EXPORT_COLUMNS])
+
+
+def record_batches(batches, schema):
+    """
+    Converts lists of records (as returned by FlightData.export_flights) into Arrow record batches,
+    column by column.
+    """
+    for records in batches:
+        columns = zip(*records)
+        arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_export(batches, export_format):
+    """
+    Encodes lists of records in one of the EXPORT_FORMATS, and yields the encoded bytes
+    after each batch (then the end of the stream or the Parquet footer).
+    """
+    schema = export_schema()
+    sink = ChunkSink()
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    with writer:
+        for batch in record_batches(batches, schema):
+            writer.write_batch(batch)
+            yield sink.drain()
+    yield sink.drain()
+
+
+def export_flights(data_manager, output, export_format, **filters):
+    """
+    Writes the flights matching the search filters (see FlightData.search_flights) to the output file.
+    Returns the number of exported flights.
+    """
+    row_count = 0
+
+    def count(batches):
+        nonlocal row_count
+        for records in batches:
+            row_count += len(records)
+            yield records
+
+    with open(output, 'wb') as output_file:
+        for chunk in write_export(count(data_manager.export_flights(**filters)), export_format):
+            output_file.write(chunk)
+    return row_count
+
+
+def parse_date(date_str):
+    """
+    Parses a DD/MM/YYYY date argument.
+    """
+    return datetime.strptime(date_str, '%d/%m/%Y').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export flights as an Arrow IPC stream or a Parquet file")
+    parser.add_argument('output', help="output file")
+    parser.add_argument('--db', default='data/flights.sqlite3', help="flights database file")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='parquet')
+    parser.add_argument('--start-date', type=parse_date, help="first date (DD/MM/YYYY)")
+    parser.add_argument('--end-date', type=parse_date, help="last date (DD/MM/YYYY)")
+    parser.add_argument('--airline', help="airline name")
+    parser.add_argument('--origin', help="origin airport IATA code")
+    parser.add_argument('--destination', help="destination airport IATA code")
+    args = parser.parse_args()
+
+    if not export_available():
+        print("\u001b[38;5;160;1mThe exports need pyarrow: pip install pyarrow\u001b[0m")
+        return
+    data_manager = FlightData(f"sqlite:///{os.path.abspath(args.db)}")
+    start = time.perf_counter()
+    row_count = export_flights(data_manager, args.output, args.format, start_date=args.start_date,
+                               end_date=args.end_date, airline=args.airline, origin=args.origin,
+                               destination=args.destination)
+    print(f"Exported {row_count} flights to {args.output} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
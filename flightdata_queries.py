@@ -1,28 +1,101 @@
+"""
+Columns that the flight details queries can project, by result column name.
+Any other flights column can be requested by its name.
+DELAY is always an integer: NULL (cancelled flights) and non-numeric delays become 0.
+"""
+FLIGHT_COLUMNS = {
+    'ID': 'flights.ID',
+    'FLIGHT_ID': 'flights.ID AS FLIGHT_ID',
+    'ORIGIN_AIRPORT': 'flights.ORIGIN_AIRPORT',
+    'DESTINATION_AIRPORT': 'flights.DESTINATION_AIRPORT',
+    'AIRLINE': 'airlines.AIRLINE',
+    'DELAY': 'COALESCE(CAST(flights.DEPARTURE_DELAY AS INTEGER), 0) AS DELAY',
+}
+
+"""
+The columns used by the API and the CLI, and the full row (every flights column).
+"""
+DEFAULT_FLIGHT_COLUMNS = ('ID', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'AIRLINE', 'DELAY')
+ALL_FLIGHT_COLUMNS = '*'
+ALL_FLIGHT_COLUMNS_SQL = ("flights.*, airlines.airline, flights.ID as FLIGHT_ID, "
+                          f"{FLIGHT_COLUMNS['DELAY']}")
+
+"""
+The columns of the columnar exports, by result column name. Each column has a single type:
+the numeric columns are integers, with NULL for missing and empty ('') values, and the
+codes and times are text.
+"""
+EXPORT_COLUMNS = {
+    'ID': 'flights.ID',
+    'YEAR': 'CAST(flights.YEAR AS INTEGER) AS YEAR',
+    'MONTH': 'CAST(flights.MONTH AS INTEGER) AS MONTH',
+    'DAY': 'CAST(flights.DAY AS INTEGER) AS DAY',
+    'AIRLINE_CODE': 'CAST(flights.AIRLINE AS TEXT) AS AIRLINE_CODE',
+    'AIRLINE': 'airlines.AIRLINE',
+    'FLIGHT_NUMBER': "CAST(NULLIF(flights.FLIGHT_NUMBER, '') AS INTEGER) AS FLIGHT_NUMBER",
+    'TAIL_NUMBER': "NULLIF(CAST(flights.TAIL_NUMBER AS TEXT), '') AS TAIL_NUMBER",
+    'ORIGIN_AIRPORT': 'CAST(flights.ORIGIN_AIRPORT AS TEXT) AS ORIGIN_AIRPORT',
+    'DESTINATION_AIRPORT': 'CAST(flights.DESTINATION_AIRPORT AS TEXT) AS DESTINATION_AIRPORT',
+    'SCHEDULED_DEPARTURE': "NULLIF(CAST(flights.SCHEDULED_DEPARTURE AS TEXT), '') AS SCHEDULED_DEPARTURE",
+    'DEPARTURE_TIME': "NULLIF(CAST(flights.DEPARTURE_TIME AS TEXT), '') AS DEPARTURE_TIME",
+    'DEPARTURE_DELAY': "CAST(NULLIF(flights.DEPARTURE_DELAY, '') AS INTEGER) AS DEPARTURE_DELAY",
+    'ARRIVAL_TIME': "NULLIF(CAST(flights.ARRIVAL_TIME AS TEXT), '') AS ARRIVAL_TIME",
+    'ARRIVAL_DELAY': "CAST(NULLIF(flights.ARRIVAL_DELAY, '') AS INTEGER) AS ARRIVAL_DELAY",
+    'DIVERTED': "CAST(NULLIF(flights.DIVERTED, '') AS INTEGER) AS DIVERTED",
+    'CANCELLED': "CAST(NULLIF(flights.CANCELLED, '') AS INTEGER) AS CANCELLED",
+}
 
 QUERY_FLIGHT_BY_ID = """
-SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY 
+SELECT {columns}
 FROM flights JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.ID = :id
 """
 
-QUERY_FLIGHT_BY_DATE = """
-SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY 
+QUERY_FLIGHTS_BY_IDS = """
+SELECT {columns}
 FROM flights JOIN airlines ON flights.airline = airlines.id 
+WHERE flights.ID IN (SELECT value FROM json_each(:ids))
+"""
+
+QUERY_FLIGHT_BY_DATE = """
+SELECT {columns}
+FROM flights CROSS JOIN airlines ON flights.airline = airlines.id
 WHERE YEAR = :year AND MONTH = :month AND DAY = :day
 """
 
 QUERY_DELAYED_FLIGHTS_BY_AIRLINE = """
-SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY 
+SELECT {columns}
 FROM flights JOIN airlines ON flights.airline = airlines.id 
 WHERE airlines.AIRLINE = :airline
 """
 
 QUERY_DELAYED_FLIGHTS_BY_AIRPORT = """
-SELECT flights.*, airlines.airline, flights.ID as FLIGHT_ID, flights.DEPARTURE_DELAY as DELAY 
+SELECT {columns}
 FROM flights JOIN airlines ON flights.airline = airlines.id 
 WHERE flights.ORIGIN_AIRPORT = :airport
 """
 
+"""
+The flight search: {conditions} is filled with the SEARCH_FILTERS conditions of the
+given filters, joined with AND (in the order of SEARCH_FILTERS, so each combination
+of filters always yields the same statement), and {columns} as in the queries above.
+Delays that are not integers (empty strings in the source data) never reach min_delay.
+"""
+QUERY_SEARCH_FLIGHTS = """
+SELECT {columns}
+FROM flights JOIN airlines ON flights.airline = airlines.id 
+WHERE {conditions}
+"""
+
+SEARCH_FILTERS = {
+    'start_date': "(flights.YEAR, flights.MONTH, flights.DAY) >= (:start_year, :start_month, :start_day)",
+    'end_date': "(flights.YEAR, flights.MONTH, flights.DAY) <= (:end_year, :end_month, :end_day)",
+    'airline': "airlines.AIRLINE = :airline",
+    'origin': "flights.ORIGIN_AIRPORT = :origin",
+    'destination': "flights.DESTINATION_AIRPORT = :destination",
+    'min_delay': "flights.DEPARTURE_DELAY >= :min_delay AND typeof(flights.DEPARTURE_DELAY) = 'integer'",
+}
+
 QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE = """
 SELECT 
     airlines.AIRLINE,
@@ -35,15 +108,38 @@ GROUP BY airlines.AIRLINE;"""
 
 QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR = """
 SELECT 
-    SUBSTR(flights.SCHEDULED_DEPARTURE, 1, 2) AS hour_of_day,
+    flights.DEPARTURE_HOUR AS hour_of_day,
     COUNT(flights.ID) AS total_flights,
     COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights,
     (COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) * 100.0 / COUNT(flights.ID)) AS delayed_percentage
 FROM flights
-GROUP BY hour_of_day
-ORDER BY hour_of_day;
+GROUP BY flights.DEPARTURE_HOUR
+ORDER BY flights.DEPARTURE_HOUR;
+"""
+
+"""
+The per hour delays restricted by filters: {conditions} is filled with the
+HOURLY_DELAY_FILTERS conditions of the given filters, joined with AND.
+"""
+QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR_WHERE = """
+SELECT 
+    flights.DEPARTURE_HOUR AS hour_of_day,
+    COUNT(flights.ID) AS total_flights,
+    COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) AS delayed_flights,
+    (COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END) * 100.0 / COUNT(flights.ID)) AS delayed_percentage
+FROM flights
+WHERE {conditions}
+GROUP BY +flights.DEPARTURE_HOUR
+ORDER BY flights.DEPARTURE_HOUR;
 """
 
+HOURLY_DELAY_FILTERS = {
+    'airline': "flights.AIRLINE = (SELECT airlines.ID FROM airlines WHERE airlines.AIRLINE = :airline)",
+    'airport': "flights.ORIGIN_AIRPORT = :airport",
+    'start_date': "(flights.YEAR, flights.MONTH, flights.DAY) >= (:start_year, :start_month, :start_day)",
+    'end_date': "(flights.YEAR, flights.MONTH, flights.DAY) <= (:end_year, :end_month, :end_day)",
+}
+
 QUERY_DELAYED_FLIGHTS_BY_ROUTE = """
 SELECT 
     flights.ORIGIN_AIRPORT,
@@ -73,4 +169,320 @@ JOIN airports AS origin_airports ON flights.ORIGIN_AIRPORT = origin_airports.IAT
 JOIN airports AS dest_airports ON flights.DESTINATION_AIRPORT = dest_airports.IATA_CODE
 GROUP BY flights.ORIGIN_AIRPORT, flights.DESTINATION_AIRPORT
 ORDER BY flights.ORIGIN_AIRPORT, flights.DESTINATION_AIRPORT;
-"""
\ No newline at end of file
+"""
+
+"""
+The departure hour column (flights.DEPARTURE_HOUR), added by FlightData.add_departure_hour().
+It is a plain column rather than a virtual generated one: SQLite reads the table row to evaluate
+a virtual column even when it is indexed, so only a stored hour lets the hour indexes cover the
+hourly breakdowns. It is backfilled from SCHEDULED_DEPARTURE ("HHMM") once, and a trigger fills
+it for the flights inserted later without it.
+"""
+DEPARTURE_HOUR_EXPRESSION = "CAST(SUBSTR(SCHEDULED_DEPARTURE, 1, 2) AS INTEGER)"
+
+QUERY_HAS_DEPARTURE_HOUR = """
+SELECT COUNT(*) FROM pragma_table_info('flights') WHERE name = 'DEPARTURE_HOUR'
+"""
+
+ADD_DEPARTURE_HOUR = [
+    "ALTER TABLE flights ADD COLUMN DEPARTURE_HOUR INTEGER",
+    f"UPDATE flights SET DEPARTURE_HOUR = {DEPARTURE_HOUR_EXPRESSION}",
+    f"""
+CREATE TRIGGER IF NOT EXISTS flights_departure_hour AFTER INSERT ON flights
+WHEN NEW.DEPARTURE_HOUR IS NULL
+BEGIN
+    UPDATE flights SET DEPARTURE_HOUR = {DEPARTURE_HOUR_EXPRESSION} WHERE rowid = NEW.rowid;
+END""",
+]
+
+"""
+Indexes replaced by newer ones, dropped by FlightData.provision_indexes().
+"""
+DROPPED_INDEXES = ['idx_flights_departure_delay']
+
+"""
+Indexes provisioned by FlightData.provision_indexes().
+The ID, date, airport and airline indexes cover the detail lookups with the
+DEFAULT_FLIGHT_COLUMNS projection and their keyset pages (ordered by ID); the composite
+(..., DEPARTURE_DELAY, ID) indexes cover the aggregate queries, so SQLite can
+answer them from the index without reading the flights table itself.
+The (..., YEAR, MONTH, DAY, DEPARTURE_HOUR, DEPARTURE_DELAY, ID) indexes do the same for the
+hourly breakdowns filtered by airline, airport and/or date range.
+"""
+INDEXES = {
+    'idx_flights_id': "CREATE INDEX IF NOT EXISTS idx_flights_id "
+                      "ON flights (ID, ORIGIN_AIRPORT, DESTINATION_AIRPORT, AIRLINE, DEPARTURE_DELAY)",
+    'idx_flights_date': "CREATE INDEX IF NOT EXISTS idx_flights_date ON flights "
+                        "(YEAR, MONTH, DAY, ID, ORIGIN_AIRPORT, DESTINATION_AIRPORT, AIRLINE, DEPARTURE_DELAY)",
+    'idx_flights_origin': "CREATE INDEX IF NOT EXISTS idx_flights_origin "
+                          "ON flights (ORIGIN_AIRPORT, ID, DESTINATION_AIRPORT, AIRLINE, DEPARTURE_DELAY)",
+    'idx_flights_airline_id': "CREATE INDEX IF NOT EXISTS idx_flights_airline_id "
+                              "ON flights (AIRLINE, ID, ORIGIN_AIRPORT, DESTINATION_AIRPORT, DEPARTURE_DELAY)",
+    'idx_flights_airline_delay':
+        "CREATE INDEX IF NOT EXISTS idx_flights_airline_delay ON flights (AIRLINE, DEPARTURE_DELAY, ID)",
+    'idx_flights_hour_delay':
+        "CREATE INDEX IF NOT EXISTS idx_flights_hour_delay ON flights (DEPARTURE_HOUR, DEPARTURE_DELAY, ID)",
+    'idx_flights_airline_hour': "CREATE INDEX IF NOT EXISTS idx_flights_airline_hour "
+                                "ON flights (AIRLINE, YEAR, MONTH, DAY, DEPARTURE_HOUR, DEPARTURE_DELAY, ID)",
+    'idx_flights_origin_hour': "CREATE INDEX IF NOT EXISTS idx_flights_origin_hour "
+                               "ON flights (ORIGIN_AIRPORT, YEAR, MONTH, DAY, DEPARTURE_HOUR, DEPARTURE_DELAY, ID)",
+    'idx_flights_date_hour': "CREATE INDEX IF NOT EXISTS idx_flights_date_hour "
+                             "ON flights (YEAR, MONTH, DAY, DEPARTURE_HOUR, DEPARTURE_DELAY, ID)",
+    'idx_flights_route_delay': "CREATE INDEX IF NOT EXISTS idx_flights_route_delay "
+                               "ON flights (ORIGIN_AIRPORT, DESTINATION_AIRPORT, DEPARTURE_DELAY, ID)",
+    'idx_airlines_id': "CREATE INDEX IF NOT EXISTS idx_airlines_id ON airlines (ID, AIRLINE)",
+    'idx_airlines_airline': "CREATE INDEX IF NOT EXISTS idx_airlines_airline ON airlines (AIRLINE, ID)",
+    'idx_airports_iata':
+        "CREATE INDEX IF NOT EXISTS idx_airports_iata ON airports (IATA_CODE, LATITUDE, LONGITUDE)",
+}
+
+"""
+Registry of every query, checked by FlightData.verify_query_plans()
+(the flight details queries with the DEFAULT_FLIGHT_COLUMNS projection).
+"""
+QUERIES = {
+    'flight_by_id': QUERY_FLIGHT_BY_ID,
+    'flights_by_ids': QUERY_FLIGHTS_BY_IDS,
+    'flight_by_date': QUERY_FLIGHT_BY_DATE,
+    'delayed_flights_by_airline': QUERY_DELAYED_FLIGHTS_BY_AIRLINE,
+    'delayed_flights_by_airport': QUERY_DELAYED_FLIGHTS_BY_AIRPORT,
+    'percentage_of_delayed_flights_by_airline': QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE,
+    'percentage_of_delayed_flights_per_hour': QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR,
+    'percentage_of_delayed_flights_per_hour_by_airline': QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR_WHERE.format(
+        conditions=HOURLY_DELAY_FILTERS['airline']),
+    'percentage_of_delayed_flights_per_hour_by_airport': QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR_WHERE.format(
+        conditions=HOURLY_DELAY_FILTERS['airport']),
+    'percentage_of_delayed_flights_per_hour_by_date_range': QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR_WHERE.format(
+        conditions=f"{HOURLY_DELAY_FILTERS['start_date']} AND {HOURLY_DELAY_FILTERS['end_date']}"),
+    'delayed_flights_by_route': QUERY_DELAYED_FLIGHTS_BY_ROUTE,
+    'delayed_flights_by_route_with_coord': QUERY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD,
+}
+
+"""
+Tables too large to be read without an index. A plan step that scans one of
+these directly (not through an index) is reported as a full table scan.
+"""
+FULL_SCAN_TABLES = ('flights',)
+
+"""
+The covering index each query in QUERIES is meant to read the flights table from, checked by
+FlightData.verify_query_plans(). Without statistics the SQLite planner may prefer another index
+(e.g. the date lookup starting from the airlines table, on idx_flights_airline_hour), so the
+queries fix the join order (CROSS JOIN) or the grouping where needed: the unary + in the filtered
+hourly breakdowns keeps the planner from walking idx_flights_hour_delay in hour order and
+looking every row up, so it searches the filtered index and sorts the 24 groups instead.
+"""
+QUERY_INDEXES = {
+    'flight_by_id': 'idx_flights_id',
+    'flights_by_ids': 'idx_flights_id',
+    'flight_by_date': 'idx_flights_date',
+    'delayed_flights_by_airline': 'idx_flights_airline_id',
+    'delayed_flights_by_airport': 'idx_flights_origin',
+    'percentage_of_delayed_flights_by_airline': 'idx_flights_airline_delay',
+    'percentage_of_delayed_flights_per_hour': 'idx_flights_hour_delay',
+    'percentage_of_delayed_flights_per_hour_by_airline': 'idx_flights_airline_hour',
+    'percentage_of_delayed_flights_per_hour_by_airport': 'idx_flights_origin_hour',
+    'percentage_of_delayed_flights_per_hour_by_date_range': 'idx_flights_date_hour',
+    'delayed_flights_by_route': 'idx_flights_route_delay',
+    'delayed_flights_by_route_with_coord': 'idx_flights_route_delay',
+}
+
+
+"""
+Summary tables holding the total and delayed flight counts per airline, per hour
+and per route. They are maintained by FlightDataVisuals.refresh_summaries(), which
+adds the flights with an ID above the high-water mark stored in summary_state.
+"""
+SUMMARY_TABLES = [
+    """
+CREATE TABLE IF NOT EXISTS summary_state (
+    name TEXT PRIMARY KEY,
+    high_water_mark INTEGER
+)""",
+    """
+CREATE TABLE IF NOT EXISTS delay_summary_airline (
+    AIRLINE PRIMARY KEY,
+    total_flights INTEGER NOT NULL,
+    delayed_flights INTEGER NOT NULL
+)""",
+    """
+CREATE TABLE IF NOT EXISTS delay_summary_hour (
+    hour_of_day PRIMARY KEY,
+    total_flights INTEGER NOT NULL,
+    delayed_flights INTEGER NOT NULL
+)""",
+    """
+CREATE TABLE IF NOT EXISTS delay_summary_route (
+    ORIGIN_AIRPORT,
+    DESTINATION_AIRPORT,
+    total_flights INTEGER NOT NULL,
+    delayed_flights INTEGER NOT NULL,
+    PRIMARY KEY (ORIGIN_AIRPORT, DESTINATION_AIRPORT)
+)""",
+]
+
+DELAY_SUMMARIES = 'delay_summaries'
+
+INSERT_SUMMARY_STATE = """
+INSERT OR IGNORE INTO summary_state (name, high_water_mark) VALUES (:name, NULL)
+"""
+
+QUERY_SUMMARY_HIGH_WATER_MARK = """
+SELECT high_water_mark FROM summary_state WHERE name = :name
+"""
+
+QUERY_FLIGHT_ID_RANGE = """
+SELECT MIN(ID), MAX(ID) FROM flights
+"""
+
+UPDATE_SUMMARY_HIGH_WATER_MARK = """
+UPDATE summary_state SET high_water_mark = :new_high_water_mark
+WHERE name = :name AND high_water_mark IS :high_water_mark
+"""
+
+REFRESH_SUMMARIES = [
+    """
+INSERT INTO delay_summary_airline (AIRLINE, total_flights, delayed_flights)
+SELECT
+    flights.AIRLINE,
+    COUNT(flights.ID),
+    COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END)
+FROM flights
+WHERE flights.ID > :high_water_mark AND flights.ID <= :new_high_water_mark
+GROUP BY flights.AIRLINE
+ON CONFLICT (AIRLINE) DO UPDATE SET
+    total_flights = total_flights + excluded.total_flights,
+    delayed_flights = delayed_flights + excluded.delayed_flights
+""",
+    f"""
+INSERT INTO delay_summary_hour (hour_of_day, total_flights, delayed_flights)
+SELECT
+    {DEPARTURE_HOUR_EXPRESSION} AS hour_of_day,
+    COUNT(flights.ID),
+    COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END)
+FROM flights
+WHERE flights.ID > :high_water_mark AND flights.ID <= :new_high_water_mark
+GROUP BY hour_of_day
+ON CONFLICT (hour_of_day) DO UPDATE SET
+    total_flights = total_flights + excluded.total_flights,
+    delayed_flights = delayed_flights + excluded.delayed_flights
+""",
+    """
+INSERT INTO delay_summary_route (ORIGIN_AIRPORT, DESTINATION_AIRPORT, total_flights, delayed_flights)
+SELECT
+    flights.ORIGIN_AIRPORT,
+    flights.DESTINATION_AIRPORT,
+    COUNT(flights.ID),
+    COUNT(CASE WHEN flights.DEPARTURE_DELAY > 0 THEN 1 END)
+FROM flights
+WHERE flights.ID > :high_water_mark AND flights.ID <= :new_high_water_mark
+GROUP BY flights.ORIGIN_AIRPORT, flights.DESTINATION_AIRPORT
+ON CONFLICT (ORIGIN_AIRPORT, DESTINATION_AIRPORT) DO UPDATE SET
+    total_flights = total_flights + excluded.total_flights,
+    delayed_flights = delayed_flights + excluded.delayed_flights
+""",
+]
+
+"""
+The aggregate queries answered from the summary tables. They return the same
+columns as the corresponding queries over the flights table.
+"""
+QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE = """
+SELECT
+    airlines.AIRLINE,
+    SUM(summary.total_flights) AS total_flights,
+    SUM(summary.delayed_flights) AS delayed_flights,
+    (SUM(summary.delayed_flights) * 100.0 / SUM(summary.total_flights)) AS delayed_percentage
+FROM delay_summary_airline AS summary
+JOIN airlines ON summary.AIRLINE = airlines.id
+GROUP BY airlines.AIRLINE;"""
+
+QUERY_SUMMARY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR = """
+SELECT
+    CAST(summary.hour_of_day AS INTEGER) AS hour_of_day,
+    SUM(summary.total_flights) AS total_flights,
+    SUM(summary.delayed_flights) AS delayed_flights,
+    (SUM(summary.delayed_flights) * 100.0 / SUM(summary.total_flights)) AS delayed_percentage
+FROM delay_summary_hour AS summary
+GROUP BY CAST(summary.hour_of_day AS INTEGER)
+ORDER BY CAST(summary.hour_of_day AS INTEGER);
+"""
+
+QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE = """
+SELECT
+    summary.ORIGIN_AIRPORT,
+    summary.DESTINATION_AIRPORT,
+    SUM(summary.total_flights) AS total_flights,
+    SUM(summary.delayed_flights) AS delayed_flights,
+    (SUM(summary.delayed_flights) * 100.0 / SUM(summary.total_flights)) AS delayed_percentage
+FROM delay_summary_route AS summary
+GROUP BY summary.ORIGIN_AIRPORT, summary.DESTINATION_AIRPORT
+ORDER BY summary.ORIGIN_AIRPORT, summary.DESTINATION_AIRPORT;
+"""
+
+QUERY_SUMMARY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD = """
+SELECT
+    summary.ORIGIN_AIRPORT,
+    summary.DESTINATION_AIRPORT,
+    SUM(summary.total_flights) AS total_flights,
+    SUM(summary.delayed_flights) AS delayed_flights,
+    (SUM(summary.delayed_flights) * 100.0 / SUM(summary.total_flights)) AS delayed_percentage,
+    origin_airports.LATITUDE AS origin_latitude,
+    origin_airports.LONGITUDE AS origin_longitude,
+    dest_airports.LATITUDE AS destination_latitude,
+    dest_airports.LONGITUDE AS destination_longitude
+FROM delay_summary_route AS summary
+JOIN airports AS origin_airports ON summary.ORIGIN_AIRPORT = origin_airports.IATA_CODE
+JOIN airports AS dest_airports ON summary.DESTINATION_AIRPORT = dest_airports.IATA_CODE
+GROUP BY summary.ORIGIN_AIRPORT, summary.DESTINATION_AIRPORT
+ORDER BY summary.ORIGIN_AIRPORT, summary.DESTINATION_AIRPORT;
+"""
+
+"""
+The sample of the flights answering the approximate aggregates: a flight is sampled when
+a multiplicative hash of its ID falls below :sample_threshold (out of 2^32), so the sample is
+uniform, reproducible, and grows with the appended flights without resampling the older ones.
+It keeps the flights columns the aggregates read, under their own names, and is maintained like
+the summary tables: FlightDataVisuals.refresh_sample() adds the flights with an ID above the
+high-water mark stored in summary_state under FLIGHTS_SAMPLE.
+"""
+FLIGHTS_SAMPLE = 'flights_sample'
+SAMPLE_HASH_MODULUS = 2 ** 32
+
+CREATE_FLIGHTS_SAMPLE = """
+CREATE TABLE IF NOT EXISTS flights_sample (
+    ID INTEGER PRIMARY KEY,
+    AIRLINE,
+    ORIGIN_AIRPORT,
+    DESTINATION_AIRPORT,
+    DEPARTURE_HOUR,
+    DEPARTURE_DELAY
+)"""
+
+REFRESH_FLIGHTS_SAMPLE = f"""
+INSERT INTO flights_sample (ID, AIRLINE, ORIGIN_AIRPORT, DESTINATION_AIRPORT, DEPARTURE_HOUR, DEPARTURE_DELAY)
+SELECT
+    flights.ID,
+    flights.AIRLINE,
+    flights.ORIGIN_AIRPORT,
+    flights.DESTINATION_AIRPORT,
+    flights.DEPARTURE_HOUR,
+    flights.DEPARTURE_DELAY
+FROM flights
+WHERE flights.ID > :high_water_mark AND flights.ID <= :new_high_water_mark
+    AND (flights.ID * 2654435761) % {SAMPLE_HASH_MODULUS} < :sample_threshold
+"""
+
+"""
+The aggregate queries answered from the sample: the exact queries, reading flights_sample
+in place of flights. Their counts are those of the sampled flights.
+"""
+SAMPLE_SOURCE = 'FROM flights_sample AS flights\n'
+QUERY_SAMPLE_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE = \
+    QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_BY_AIRLINE.replace('FROM flights\n', SAMPLE_SOURCE)
+QUERY_SAMPLE_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR = \
+    QUERY_PERCENTAGE_OF_DELAYED_FLIGHTS_PER_HOUR.replace('FROM flights\n', SAMPLE_SOURCE)
+QUERY_SAMPLE_DELAYED_FLIGHTS_BY_ROUTE = \
+    QUERY_DELAYED_FLIGHTS_BY_ROUTE.replace('FROM flights\n', SAMPLE_SOURCE)
+QUERY_SAMPLE_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD = \
+    QUERY_DELAYED_FLIGHTS_BY_ROUTE_WITH_COORD.replace('FROM flights\n', SAMPLE_SOURCE)
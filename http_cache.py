@@ -0,0 +1,71 @@
+import hashlib
+from datetime import datetime, timedelta, timezone
+from flask import Response
+
+"""
+HTTP conditional requests for the API responses, which only change when the database is written to.
+The validators of a response are derived from the data version of the database (see
+FlightData.data_version, made of the modification times, sizes and write counters of its files),
+so they are computed without querying SQLite:
+- the ETag is weak, as the same data may be sent with different content encodings,
+- Last-Modified is the latest modification time of the database files. As it only has a one second
+  granularity, it is only sent and compared once that second is over (a later write in the same
+  second would keep it unchanged); until then the clients revalidate with the ETag alone.
+Clients revalidate on every request (Cache-Control: no-cache) and get a 304 while the data is unchanged.
+"""
+CACHE_CONTROL = 'no-cache'
+CACHED_METHODS = ('GET', 'HEAD')
+
+
+def validators(version):
+    """
+    Returns the ETag and the Last-Modified time (a datetime, in UTC) of the responses
+    at a data version, or None if the version is unknown (e.g. an in-memory database).
+    """
+    if not version:
+        return None
+    modification_times = [entry[0] for entry in version if entry is not None]
+    if not modification_times:
+        return None
+    etag = hashlib.sha1(repr(version).encode()).hexdigest()[:20]
+    last_modified = datetime.fromtimestamp(max(modification_times) // 1_000_000_000, tz=timezone.utc)
+    return etag, last_modified
+
+
+def _is_settled(last_modified):
+    """
+    Returns True if the second of a Last-Modified time is over, so that no later write can share it.
+    """
+    return datetime.now(timezone.utc) >= last_modified + timedelta(seconds=1)
+
+
+def is_not_modified(request, etag, last_modified):
+    """
+    Returns True if the conditional headers of the request show that the client
+    already holds the current response. If-None-Match takes precedence over If-Modified-Since.
+    """
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since is not None:
+        return _is_settled(last_modified) and last_modified <= request.if_modified_since
+    return False
+
+
+def set_validators(response, etag, last_modified):
+    """
+    Sets the validator and cache control headers of a response
+    (Last-Modified only once its second is over, see _is_settled).
+    """
+    response.set_etag(etag, weak=True)
+    if _is_settled(last_modified):
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = CACHE_CONTROL
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def not_modified_response(etag, last_modified):
+    """
+    Returns the 304 Not Modified response (without a body) for the given validators.
+    """
+    return set_validators(Response(status=304), etag, last_modified)
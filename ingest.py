@@ -0,0 +1,285 @@
+import argparse
+import csv
+import itertools
+import json
+import os
+import sqlite3
+import time
+from data import FlightDataVisuals
+from flightdata_queries import DEPARTURE_HOUR_EXPRESSION, FLIGHTS_SAMPLE, INDEXES
+
+"""
+Streaming bulk loader: appends the flights of a CSV file (e.g. the flights.csv export of the
+US DOT on-time performance data) to the flights table of a live database.
+The load runs in two resumable phases:
+1. The CSV is streamed into a staging database next to the target, in batches of batch_size rows.
+2. The staged flights are appended month by month, ordered by date, each month in one transaction.
+   New flights get increasing IDs after the current maximum, so the summary tables (and the
+   partitions) see them as appended flights.
+The target database is switched to WAL mode, so readers are never blocked by the load, and its
+indexes are maintained by the load, so a served database keeps answering from them.
+The progress is recorded in a checkpoint file, and an interrupted load continues where it stopped.
+"""
+BATCH_SIZE = 50000
+CHECKPOINT_SUFFIX = '.ingest.json'
+STAGING_SUFFIX = '.ingest.sqlite3'
+STAGING_TABLE = 'staged_flights'
+REQUIRED_COLUMNS = ('YEAR', 'MONTH', 'DAY')
+ASSIGNED_COLUMNS = ('ID', 'DEPARTURE_HOUR')
+
+"""
+Pragmas of the connections to the target database (readers are not blocked in WAL mode)
+and to the staging database (a scratch file that is rebuilt if lost).
+"""
+TARGET_PRAGMAS = {'journal_mode': 'WAL', 'synchronous': 'NORMAL', 'cache_size': -256 * 1024}
+STAGING_PRAGMAS = {'journal_mode': 'OFF', 'synchronous': 'OFF', 'cache_size': -256 * 1024}
+
+
+class IngestError(Exception):
+    """
+    Raised when a CSV file cannot be loaded into the flights table.
+    """
+
+
+def connect(path, pragmas):
+    """
+    Opens an SQLite connection in autocommit mode (transactions are explicit) with the given pragmas.
+    """
+    connection = sqlite3.connect(path, isolation_level=None)
+    for name, value in pragmas.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+    return connection
+
+
+def load_checkpoint(db_path):
+    """
+    Returns the checkpoint of an interrupted load into the database, or None.
+    """
+    try:
+        with open(db_path + CHECKPOINT_SUFFIX) as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+
+
+def save_checkpoint(db_path, checkpoint):
+    """
+    Records the progress of the load, replacing the previous checkpoint atomically.
+    """
+    path = db_path + CHECKPOINT_SUFFIX
+    with open(f"{path}.tmp", 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file, indent=2)
+    os.replace(f"{path}.tmp", path)
+
+
+def flights_columns(connection):
+    """
+    Returns the (name, declared type) of every column of the flights table.
+    """
+    return [(row[1], row[2]) for row in connection.execute("PRAGMA table_info(flights)")]
+
+
+def stage_csv(csv_path, staging_path, columns, batch_size=BATCH_SIZE):
+    """
+    Streams the CSV rows into the staging table, batch_size rows per executemany and transaction.
+    Only the given flights columns (name, declared type) are kept, matched by CSV header
+    (case-insensitively); empty fields become NULL. Staged rows keep their CSV order as rowid,
+    so a resumed run skips the rows staged before.
+    Returns the number of staged rows.
+    """
+    staging = connect(staging_path, STAGING_PRAGMAS)
+    definitions = ', '.join(f"{name} {declared_type}" for name, declared_type in columns)
+    staging.execute(f"CREATE TABLE IF NOT EXISTS {STAGING_TABLE} ({definitions})")
+    staged = staging.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {STAGING_TABLE}").fetchone()[0]
+
+    names = [name for name, declared_type in columns]
+    insert = f"INSERT INTO {STAGING_TABLE} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})"
+    with open(csv_path, newline='') as csv_file:
+        reader = csv.reader(csv_file)
+        header = {field.strip().upper(): position for position, field in enumerate(next(reader))}
+        positions = [header[name.upper()] for name in names]
+        for batch in iter(lambda: list(itertools.islice(reader, batch_size)), []):
+            if staged >= len(batch):
+                staged -= len(batch)
+                continue
+            rows = [[row[position] or None for position in positions] for row in batch[staged:]]
+            staged = 0
+            staging.execute("BEGIN")
+            staging.executemany(insert, rows)
+            staging.execute("COMMIT")
+
+    staging.execute(f"CREATE INDEX IF NOT EXISTS {STAGING_TABLE}_date ON {STAGING_TABLE} "
+                    f"(YEAR, MONTH, DAY{', SCHEDULED_DEPARTURE' if 'SCHEDULED_DEPARTURE' in names else ''})")
+    total = staging.execute(f"SELECT COUNT(*) FROM {STAGING_TABLE}").fetchone()[0]
+    staging.close()
+    return total
+
+
+def plan_months(connection, first_id):
+    """
+    Assigns the ID range of every staged month: months in date order, IDs from first_id on.
+    Returns a list of [year, month, first ID, last ID].
+    """
+    months = []
+    next_id = first_id
+    for year, month, count in connection.execute(
+            f"SELECT YEAR, MONTH, COUNT(*) FROM staging.{STAGING_TABLE} GROUP BY YEAR, MONTH ORDER BY YEAR, MONTH"):
+        months.append([year, month, next_id, next_id + count - 1])
+        next_id += count
+    return months
+
+
+def drop_flight_indexes(connection):
+    """
+    Drops the provisioned indexes (INDEXES) of the flights table, so the load does not
+    maintain them row by row. Readers fall back to full scans until they are rebuilt, so this
+    is only meant for a database that is not being served. Returns the names of the dropped indexes.
+    """
+    existing = {row[0] for row in connection.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'flights'")}
+    dropped = [name for name in INDEXES if name in existing]
+    for name in dropped:
+        connection.execute(f"DROP INDEX {name}")
+    return dropped
+
+
+def load_month(connection, names, has_departure_hour, year, month, first_id):
+    """
+    Appends the staged flights of a month, ordered by date and scheduled departure,
+    with consecutive IDs from first_id, in one transaction.
+    """
+    order = 'DAY, SCHEDULED_DEPARTURE, rowid' if 'SCHEDULED_DEPARTURE' in names else 'DAY, rowid'
+    target = ['ID'] + names + (['DEPARTURE_HOUR'] if has_departure_hour else [])
+    source = ([f"{first_id} - 1 + ROW_NUMBER() OVER (ORDER BY {order})"] + names
+              + ([DEPARTURE_HOUR_EXPRESSION] if has_departure_hour else []))
+    connection.execute("BEGIN IMMEDIATE")
+    connection.execute(f"INSERT INTO flights ({', '.join(target)}) "
+                       f"SELECT {', '.join(source)} FROM staging.{STAGING_TABLE} "
+                       f"WHERE YEAR = ? AND MONTH = ? ORDER BY {order}", (year, month))
+    connection.execute("COMMIT")
+    connection.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+
+def last_inserted_id(connection):
+    """
+    Returns the ID of the last flight appended to the table (highest rowid), or None.
+    """
+    row = connection.execute("SELECT ID FROM flights ORDER BY rowid DESC LIMIT 1").fetchone()
+    return row[0] if row else None
+
+
+def ingest(csv_path, db_path, batch_size=BATCH_SIZE, defer_indexes=False, progress=print):
+    """
+    Appends the flights of a CSV file to the database, resuming an interrupted load of the same file.
+    The indexes are maintained by the load, unless defer_indexes drops them for the load and
+    provisions them again at the end (faster, for a database that is not being served).
+    The summary tables are brought up to date.
+    Returns the number of loaded flights.
+    """
+    with open(csv_path, newline='') as csv_file:
+        header = {field.strip().upper() for field in next(csv.reader(csv_file), [])}
+    missing = [name for name in REQUIRED_COLUMNS if name not in header]
+    if missing:
+        raise IngestError(f"The CSV file has no {', '.join(missing)} column")
+
+    connection = connect(db_path, TARGET_PRAGMAS)
+    table_columns = flights_columns(connection)
+    has_departure_hour = any(name == 'DEPARTURE_HOUR' for name, declared_type in table_columns)
+    # The IDs and departure hours are assigned by the load, other flights columns missing from the CSV stay NULL
+    columns = [(name, declared_type) for name, declared_type in table_columns
+               if name not in ASSIGNED_COLUMNS and name.upper() in header]
+    names = [name for name, declared_type in columns]
+
+    stat = os.stat(csv_path)
+    source = {'csv': os.path.abspath(csv_path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    checkpoint = load_checkpoint(db_path)
+    if checkpoint is not None and checkpoint['source'] != source:
+        connection.close()
+        raise IngestError(f"An interrupted load of {checkpoint['source']['csv']} is pending; "
+                          f"finish it or run again with --restart")
+    if checkpoint is None:
+        checkpoint = {'source': source, 'staged': False, 'months': None, 'loaded': 0, 'dropped_indexes': []}
+        save_checkpoint(db_path, checkpoint)
+
+    staging_path = db_path + STAGING_SUFFIX
+    if not checkpoint['staged']:
+        start = time.perf_counter()
+        staged = stage_csv(csv_path, staging_path, columns, batch_size)
+        checkpoint['staged'] = True
+        save_checkpoint(db_path, checkpoint)
+        progress(f"Staged {staged} flights ({time.perf_counter() - start:.1f}s)")
+
+    connection.execute("ATTACH DATABASE ? AS staging", (staging_path,))
+    if checkpoint['months'] is None:
+        max_id = connection.execute("SELECT MAX(ID) FROM flights").fetchone()[0]
+        checkpoint['months'] = plan_months(connection, (max_id or 0) + 1)
+        save_checkpoint(db_path, checkpoint)
+    if defer_indexes and not checkpoint['dropped_indexes']:
+        checkpoint['dropped_indexes'] = drop_flight_indexes(connection)
+        save_checkpoint(db_path, checkpoint)
+
+    loaded = 0
+    for position, (year, month, first_id, last_id) in enumerate(checkpoint['months']):
+        if position < checkpoint['loaded']:
+            continue
+        # The month may have been committed just before an interruption, without its checkpoint
+        last_id_in_table = last_inserted_id(connection)
+        if last_id_in_table is None or last_id_in_table < first_id:
+            start = time.perf_counter()
+            load_month(connection, names, has_departure_hour, year, month, first_id)
+            loaded += last_id - first_id + 1
+            progress(f"Loaded {year}-{month:02d}: {last_id - first_id + 1} flights "
+                     f"({time.perf_counter() - start:.1f}s)")
+        checkpoint['loaded'] = position + 1
+        save_checkpoint(db_path, checkpoint)
+    connection.execute("DETACH DATABASE staging")
+    connection.close()
+
+    start = time.perf_counter()
+    data_manager = FlightDataVisuals(f"sqlite:///{os.path.abspath(db_path)}")
+    if checkpoint['dropped_indexes']:
+        data_manager.provision_indexes()
+        progress(f"Rebuilt {len(checkpoint['dropped_indexes'])} indexes ({time.perf_counter() - start:.1f}s)")
+    data_manager.build_summaries()
+    if data_manager.has_derived_table(FLIGHTS_SAMPLE):
+        data_manager.refresh_sample()
+
+    os.remove(staging_path)
+    os.remove(db_path + CHECKPOINT_SUFFIX)
+    return loaded
+
+
+def discard_checkpoint(db_path):
+    """
+    Forgets an interrupted load: removes its checkpoint and staging database.
+    Flights already appended to the table are kept.
+    """
+    for path in (db_path + CHECKPOINT_SUFFIX, db_path + STAGING_SUFFIX):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Append the flights of a CSV file to the flights database")
+    parser.add_argument('csv', help="CSV file with a header row (YEAR, MONTH, DAY, AIRLINE, ... columns)")
+    parser.add_argument('--db', default='data/flights.sqlite3', help="flights database file")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--defer-indexes', action='store_true',
+                        help="drop the indexes during the load and rebuild them at the end "
+                             "(faster, but only for a database that is not being served)")
+    parser.add_argument('--restart', action='store_true', help="discard the checkpoint of an interrupted load")
+    args = parser.parse_args()
+
+    if args.restart:
+        discard_checkpoint(args.db)
+    start = time.perf_counter()
+    try:
+        loaded = ingest(args.csv, args.db, args.batch_size, args.defer_indexes)
+    except IngestError as e:
+        print(f"\u001b[38;5;160;1mError loading {args.csv}: {e}\u001b[0m")
+        return
+    print(f"Loaded {loaded} flights into {args.db} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
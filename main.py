@@ -1,4 +1,7 @@
+import argparse
+import batch
 import data
+import sys
 from datetime import datetime
 import sqlalchemy
 from plots import *
@@ -75,7 +78,7 @@ def plot_percentage_of_delayed_flights_per_airline(data_manager):
     """
     Fetch the data and plot the percentage of delayed flights by airline.
     """
-    plot_data = data_manager.get_percentage_of_delayed_flights_by_airline()
+    plot_data = data_manager.get_percentage_of_delayed_flights_by_airline(columnar=True)
     plot_percentage_of_delayed_flights_by_airline(plot_data)
 
 
@@ -83,7 +86,7 @@ def plot_percentage_of_delayed_flights_per_hour_of_day(data_manager):
     """
     Fetch the data and plot the percentage of delayed flights by airline.
     """
-    plot_data = data_manager.get_percentage_of_delayed_flights_per_hour()
+    plot_data = data_manager.get_percentage_of_delayed_flights_per_hour(columnar=True)
     plot_percentage_of_delayed_flights_per_hour(plot_data)
 
 
@@ -91,7 +94,7 @@ def plot_heatmap_of_delayed_flights_per_route(data_manager):
     """
     Fetch the data and plot the percentage of delayed flights by airline.
     """
-    plot_data = data_manager.get_delayed_flights_per_route()
+    plot_data = data_manager.get_delayed_flights_per_route(columnar=True)
     plot_heatmap_of_delayed_flights_by_route(plot_data)
 
 
@@ -99,7 +102,7 @@ def plot_map_of_delayed_flights_per_route(data_manager):
     """
     Fetch the data and plot the percentage of delayed flights by airline.
     """
-    plot_data = data_manager.get_delayed_flights_per_route_with_coordinates()
+    plot_data = data_manager.get_delayed_flights_per_route_with_coordinates(columnar=True)
     plot_routes_on_map(plot_data)
 
 
@@ -178,9 +181,58 @@ FUNCTIONS = { 1: (flight_by_id, "\u001b[38;5;214;1mShow flight by ID\u001b[0m"),
               }
 
 
+def run_batch_file(data_manager, args):
+    """
+    Runs the batch file given on the command line (see batch.py) and returns the exit status:
+    1 if any of its queries failed, 0 otherwise.
+    """
+    # The operations can be named by their menu number as well
+    aliases = {key: function.__name__ for key, (function, _) in FUNCTIONS.items()
+               if getattr(function, '__name__', None) in batch.BATCH_OPERATIONS}
+    with (sys.stdin if args.batch == '-' else open(args.batch, encoding='utf-8')) as lines, \
+            batch.open_output(args.output) as output:
+        failures = batch.run_batch(data_manager, lines, output, args.format, args.workers, aliases)
+    return 1 if failures else 0
+
+
+def provision(data_manager):
+    """
+    Prepares the database for the queries: creates the indexes and the DEPARTURE_HOUR column,
+    and builds (or brings up to date) the summary tables and the flights sample.
+    The other entry points only read them. Returns the exit status of the CLI.
+    """
+    try:
+        indexes = data_manager.provision_indexes()
+    except Exception as e:
+        print(f"\u001b[38;5;160;1mError provisioning the indexes: {e}\u001b[0m")
+        return 1
+    print(f"Provisioned {len(indexes)} indexes")
+    if not (data_manager.build_summaries() and data_manager.build_sample()):
+        return 1
+    print("Built the summary tables and the flights sample")
+    return 0
+
+
 def main():
+    parser = argparse.ArgumentParser(description="SkySQL - Flight Data Analysis")
+    parser.add_argument('--engine-profile', choices=data.ENGINE_PROFILES, default=data.DEFAULT_ENGINE_PROFILE,
+                        help="database engine profile (see data.ENGINE_PROFILES)")
+    parser.add_argument('--batch', metavar='FILE',
+                        help="run the query specs of a JSON lines file ('-' for stdin) instead of the menu")
+    parser.add_argument('--output', metavar='FILE', help="batch output file (default: stdout)")
+    parser.add_argument('--format', choices=batch.BATCH_FORMATS, default='plain', help="batch output format")
+    parser.add_argument('--workers', type=int, default=batch.BATCH_WORKERS,
+                        help="number of batch queries run in parallel")
+    parser.add_argument('--provision', action='store_true',
+                        help="create the indexes, the summary tables and the flights sample, then exit")
+    args = parser.parse_args()
+
     # Create an instance of the Data Object using our SQLite URI
-    data_manager = data.FlightDataVisuals(SQLITE_URI)
+    data_manager = data.FlightDataVisuals(SQLITE_URI, engine_profile=args.engine_profile, use_summaries=True)
+    if args.provision:
+        sys.exit(provision(data_manager))
+    if args.batch:
+        sys.exit(run_batch_file(data_manager, args))
     print(type(data_manager))
 
     # The Main Menu loop
@@ -0,0 +1,211 @@
+import bisect
+import threading
+from query_cache import estimate_size
+
+"""
+Histogram buckets: latencies in seconds, and result sizes in rows.
+"""
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+SIZE_SAMPLE_ROWS = 100
+UNNAMED_QUERY = 'unnamed'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Counter:
+    """
+    A Prometheus counter with labels: a monotonically increasing value per label combination.
+    """
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        """
+        Adds amount to the value of the given label values (a tuple in the order of label_names).
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        """
+        Returns the counter in Prometheus text format, as a list of lines.
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    A Prometheus histogram with labels: cumulative bucket counts, sum and count
+    of the observed values per label combination.
+    """
+
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        """
+        Records a value for the given label values (a tuple in the order of label_names).
+        """
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def render(self):
+        """
+        Returns the histogram in Prometheus text format, as a list of lines.
+        """
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    bucket_labels = format_labels(self.label_names + ('le',), labels + (str(bound),))
+                    lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {total}")
+                lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    The MetricsRegistry class collects the latency, row count, result size and error
+    metrics of the queries (by query name) and of the API requests (by endpoint),
+    and renders them in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.query_duration = Histogram('skysql_query_duration_seconds',
+                                        'Time spent running a query, or reading its result from the cache.',
+                                        ('query', 'cached'), LATENCY_BUCKETS)
+        self.query_rows = Histogram('skysql_query_rows', 'Rows returned by a query.', ('query',), ROW_BUCKETS)
+        self.query_result_bytes = Counter('skysql_query_result_bytes_total',
+                                          'Approximate size in bytes of the query results.', ('query',))
+        self.query_errors = Counter('skysql_query_errors_total', 'Queries that raised an error.', ('query',))
+        self.request_duration = Histogram('skysql_request_duration_seconds',
+                                          'Time spent handling an API request.',
+                                          ('endpoint', 'method'), LATENCY_BUCKETS)
+        self.requests = Counter('skysql_requests_total', 'API requests by response status.',
+                                ('endpoint', 'method', 'status'))
+        self.request_errors = Counter('skysql_request_errors_total', 'API requests answered with a server error.',
+                                      ('endpoint', 'method'))
+        self.response_bytes = Counter('skysql_response_bytes_total',
+                                      'Size in bytes of the API responses (streamed responses are not counted).',
+                                      ('endpoint',))
+
+    def observe_query(self, name, seconds, result, cached=False):
+        """
+        Records a query that returned result (a list of records, a NumPy array,
+        or the number of rows of a streamed result).
+        """
+        name = name or UNNAMED_QUERY
+        self.query_duration.observe((name, 'true' if cached else 'false'), seconds)
+        if isinstance(result, int):
+            self.query_rows.observe((name,), result)
+        else:
+            self.query_rows.observe((name,), len(result))
+            self.query_result_bytes.inc((name,), result_size(result))
+
+    def observe_query_error(self, name, seconds):
+        """
+        Records a query that raised an error after the given time.
+        """
+        name = name or UNNAMED_QUERY
+        self.query_duration.observe((name, 'false'), seconds)
+        self.query_errors.inc((name,))
+
+    def observe_request(self, endpoint, method, status, seconds, size=None):
+        """
+        Records an API request answered with the given status code and response size.
+        """
+        self.request_duration.observe((endpoint, method), seconds)
+        self.requests.inc((endpoint, method, str(status)))
+        if status >= 500:
+            self.request_errors.inc((endpoint, method))
+        if size is not None:
+            self.response_bytes.inc((endpoint,), size)
+
+    def render(self, cache_stats=None, admission_stats=None):
+        """
+        Returns every metric in Prometheus text format, together with the
+        counters of the result cache if its stats (see QueryCache.stats) are given,
+        and those of the admission control if its stats (see AdmissionController.stats) are given.
+        """
+        lines = []
+        for metric in (self.query_duration, self.query_rows, self.query_result_bytes, self.query_errors,
+                       self.request_duration, self.requests, self.request_errors, self.response_bytes):
+            lines.extend(metric.render())
+        if cache_stats is not None:
+            lines.extend(render_cache_stats(cache_stats))
+        if admission_stats is not None:
+            lines.extend(render_admission_stats(admission_stats))
+        return '\n'.join(lines) + '\n'
+
+
+def result_size(result):
+    """
+    Returns the approximate size in bytes of a query result. For lists of records,
+    the size is extrapolated from the first SIZE_SAMPLE_ROWS records.
+    """
+    if hasattr(result, 'nbytes') or len(result) <= SIZE_SAMPLE_ROWS:
+        return estimate_size(result)
+    return estimate_size(result[:SIZE_SAMPLE_ROWS]) * len(result) // SIZE_SAMPLE_ROWS
+
+
+def render_cache_stats(cache_stats):
+    """
+    Returns the result cache counters and size in Prometheus text format, as a list of lines.
+    """
+    lines = []
+    for key in ('hits', 'misses', 'evictions', 'expirations', 'invalidations'):
+        name = f"skysql_cache_{key}_total"
+        lines += [f"# HELP {name} Result cache {key}.", f"# TYPE {name} counter", f"{name} {cache_stats[key]}"]
+    for key in ('entries', 'bytes', 'max_entries', 'max_bytes'):
+        name = f"skysql_cache_{key}"
+        lines += [f"# HELP {name} Result cache {key.replace('_', ' ')}.", f"# TYPE {name} gauge",
+                  f"{name} {cache_stats[key]}"]
+    return lines
+
+
+def render_admission_stats(admission_stats):
+    """
+    Returns the admission control counters and limits, by request class, in Prometheus text format,
+    as a list of lines.
+    """
+    lines = []
+    for key, name, kind, help_text in (
+            ('admitted', 'skysql_admission_admitted_total', 'counter', 'Requests admitted, by class.'),
+            ('rejected', 'skysql_admission_rejected_total', 'counter', 'Requests rejected, by class.'),
+            ('limit', 'skysql_admission_limit', 'gauge', 'Requests allowed to run at once, by class.')):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for request_class, stats in sorted(admission_stats.items()):
+            lines.append(f"{name}{format_labels(('class',), (request_class,))} {stats[key]}")
+    return lines
+
+
+def format_labels(names, values):
+    """
+    Formats label names and values as a Prometheus label set, e.g. {query="flight_by_id"}.
+    """
+    if not names:
+        return ''
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{name}="{value}"')
+    return '{' + ','.join(pairs) + '}'
@@ -0,0 +1,364 @@
+import argparse
+import itertools
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from data import (AIRLINE_DELAYS_DTYPE, DEFAULT_ENGINE_PROFILE, DEFAULT_FLIGHT_COLUMNS, ENGINE_PROFILES,
+                  EXPORT_BATCH_SIZE, HOUR_DELAYS_DTYPE, ROUTE_DELAYS_DTYPE, ROUTE_DELAYS_WITH_COORD_DTYPE,
+                  FlightDataVisuals, TruncatedRecords)
+
+MANIFEST_FILE = 'partitions.json'
+PARTITION_FILE = 'flights_{year}_{month:02d}.sqlite3'
+COPIED_TABLES = ('flights', 'airlines', 'airports')
+
+"""
+Aggregate getters answered by fanning out to every partition:
+getter name -> (dtype of the result, number of key fields at the start of a row).
+The partial counts of a key are summed, and the delayed percentage is computed again.
+"""
+FAN_OUT_AGGREGATES = {
+    'get_percentage_of_delayed_flights_by_airline': (AIRLINE_DELAYS_DTYPE, 1),
+    'get_percentage_of_delayed_flights_per_hour': (HOUR_DELAYS_DTYPE, 1),
+    'get_delayed_flights_per_route': (ROUTE_DELAYS_DTYPE, 2),
+    'get_delayed_flights_per_route_with_coordinates': (ROUTE_DELAYS_WITH_COORD_DTYPE, 2),
+}
+
+
+class Partition:
+    """
+    A month of flights: its own SQLite file, accessed through a FlightDataVisuals object,
+    and the range of flight IDs it holds.
+    """
+
+    def __init__(self, path, year, month, min_id, max_id, data_manager):
+        self.path = path
+        self.year = year
+        self.month = month
+        self.min_id = min_id
+        self.max_id = max_id
+        self.data_manager = data_manager
+
+    def holds_id(self, flight_id):
+        """
+        Returns True if the flight ID is in the range of IDs of this partition.
+        """
+        return self.min_id is not None and self.min_id <= flight_id <= self.max_id
+
+    def overlaps(self, start_date, end_date):
+        """
+        Returns True if the month of this partition overlaps the date range (either end may be None).
+        """
+        month = (self.year, self.month)
+        return ((start_date is None or month >= (start_date.year, start_date.month))
+                and (end_date is None or month <= (end_date.year, end_date.month)))
+
+
+class PartitionedFlightData:
+    """
+    The PartitionedFlightData class routes the FlightDataVisuals getters to a directory of
+    monthly partitions written by partition_database(). Point and date queries only go to the
+    partitions that can hold the result, the other lookups and the delay aggregates run on a
+    thread pool across the partitions, and their partial results are merged.
+    Flight IDs are assumed to grow with the date, so the partitions hold disjoint ID ranges
+    and keyset pages can be read from one partition after the other.
+    """
+
+    def __init__(self, partitions_dir, provision_indexes=False, engine_profile=DEFAULT_ENGINE_PROFILE,
+                 use_summaries=False, metrics=None, workers=None, query_timeout=None, max_rows=None,
+                 prepare_tables=False):
+        """
+        Opens every partition listed in the manifest of partitions_dir with the given options
+        (see FlightDataVisuals). Results are not cached, as every partition runs the same queries.
+        workers is the size of the fan-out thread pool (default: one thread per partition, up to the CPU count).
+        query_timeout applies to the query of each partition, and max_rows to the combined flight lists.
+        """
+        with open(os.path.join(partitions_dir, MANIFEST_FILE)) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        self._partitions = []
+        for entry in sorted(manifest['partitions'], key=lambda entry: (entry['year'], entry['month'])):
+            path = os.path.join(partitions_dir, entry['file'])
+            data_manager = FlightDataVisuals(f"sqlite:///{os.path.abspath(path)}", provision_indexes,
+                                             engine_profile=engine_profile, use_summaries=use_summaries,
+                                             metrics=metrics, query_timeout=query_timeout, max_rows=max_rows,
+                                             prepare_tables=prepare_tables)
+            self._partitions.append(Partition(path, entry['year'], entry['month'],
+                                              entry['min_id'], entry['max_id'], data_manager))
+        self._max_rows = max_rows
+        workers = workers or min(len(self._partitions), os.cpu_count() or 1) or 1
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='partition')
+
+    def partitions(self):
+        """
+        Returns the partitions, ordered by month.
+        """
+        return list(self._partitions)
+
+    def data_version(self):
+        """
+        Returns a marker that changes whenever one of the partitions is written to:
+        the data versions (see FlightData.data_version) of all the partitions, concatenated.
+        """
+        return tuple(entry for partition in self._partitions for entry in partition.data_manager.data_version() or ())
+
+    def cache_stats(self):
+        """
+        Returns None, as partitioned results are not cached.
+        """
+        return None
+
+    def _fan_out(self, partitions, getter_name, *args, **kwargs):
+        """
+        Calls a getter on the data manager of every given partition concurrently.
+        Returns the results in the order of the partitions.
+        """
+        futures = [self._executor.submit(getattr(partition.data_manager, getter_name), *args, **kwargs)
+                   for partition in partitions]
+        return [future.result() for future in futures]
+
+    def _list(self, partitions, getter_name, args, limit=None, after=None, stream=False,
+              columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Runs a flight details getter over the given partitions and combines the records in ID order:
+        a stream reads the partitions one after the other, a keyset page stops at the partition
+        that fills it, and a full result is fetched from every partition concurrently
+        (and capped at max_rows, see TruncatedRecords).
+        """
+        if after is not None:
+            partitions = [partition for partition in partitions
+                          if partition.max_id is not None and partition.max_id > after]
+        if stream:
+            return itertools.chain.from_iterable(
+                getattr(partition.data_manager, getter_name)(*args, after=after, stream=True, columns=columns)
+                for partition in partitions)
+        if limit is None:
+            results = self._fan_out(partitions, getter_name, *args, after=after, columns=columns)
+            records = list(itertools.chain.from_iterable(results))
+            if self._max_rows is not None and (len(records) > self._max_rows
+                                               or any(getattr(result, 'truncated', False) for result in results)):
+                return TruncatedRecords(records[:self._max_rows])
+            return records
+
+        records = []
+        for partition in partitions:
+            getter = getattr(partition.data_manager, getter_name)
+            records.extend(getter(*args, limit=limit - len(records), after=after, columns=columns))
+            if len(records) == limit:
+                break
+        return records
+
+    def get_flight_by_id(self, flight_id, columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for flight details using flight ID, in the partition holding that ID.
+        """
+        records = []
+        for partition in self._partitions:
+            if partition.holds_id(flight_id):
+                records.extend(partition.data_manager.get_flight_by_id(flight_id, columns))
+        return records
+
+    def get_flights_by_ids(self, flight_ids, columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for the details of many flights at once; each partition resolves the IDs in its range.
+        Returns a list in the order of flight_ids, with None for each ID that was not found.
+        """
+        unique_ids = list(dict.fromkeys(flight_ids))
+        partitions = []
+        partition_ids = []
+        for partition in self._partitions:
+            ids = [flight_id for flight_id in unique_ids if partition.holds_id(flight_id)]
+            if ids:
+                partitions.append(partition)
+                partition_ids.append(ids)
+
+        futures = [self._executor.submit(partition.data_manager.get_flights_by_ids, ids, columns)
+                   for partition, ids in zip(partitions, partition_ids)]
+        found = {}
+        for ids, future in zip(partition_ids, futures):
+            for flight_id, record in zip(ids, future.result()):
+                if record is not None:
+                    found.setdefault(flight_id, record)
+        return [found.get(flight_id) for flight_id in flight_ids]
+
+    def get_flights_by_date(self, day, month, year, limit=None, after=None, stream=False,
+                            columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for flight details on a date, in the partition of its month.
+        """
+        partitions = [partition for partition in self._partitions
+                      if (partition.year, partition.month) == (year, month)]
+        return self._list(partitions, 'get_flights_by_date', (day, month, year), limit, after, stream, columns)
+
+    def get_delayed_flights_by_airline(self, airline, limit=None, after=None, stream=False,
+                                       columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for flight details based on an airline name, across the partitions.
+        """
+        return self._list(self._partitions, 'get_delayed_flights_by_airline', (airline,),
+                          limit, after, stream, columns)
+
+    def get_delayed_flights_by_airport(self, airport, limit=None, after=None, stream=False,
+                                       columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for flight details based on an origin airport (IATA CODE), across the partitions.
+        """
+        return self._list(self._partitions, 'get_delayed_flights_by_airport', (airport,),
+                          limit, after, stream, columns)
+
+    def search_flights(self, start_date=None, end_date=None, airline=None, origin=None, destination=None,
+                       min_delay=None, limit=None, after=None, stream=False, columns=DEFAULT_FLIGHT_COLUMNS):
+        """
+        Searches for the flights matching every given filter (see FlightData.search_flights),
+        in the partitions of the months overlapping the date range.
+        """
+        partitions = [partition for partition in self._partitions if partition.overlaps(start_date, end_date)]
+        return self._list(partitions, 'search_flights',
+                          (start_date, end_date, airline, origin, destination, min_delay),
+                          limit, after, stream, columns)
+
+    def export_flights(self, start_date=None, end_date=None, airline=None, origin=None, destination=None,
+                       min_delay=None, batch_size=EXPORT_BATCH_SIZE):
+        """
+        Streams the record batches of a columnar export (see FlightData.export_flights)
+        from the partitions of the months overlapping the date range, one partition after the other.
+        """
+        partitions = [partition for partition in self._partitions if partition.overlaps(start_date, end_date)]
+        return itertools.chain.from_iterable(
+            partition.data_manager.export_flights(start_date, end_date, airline, origin, destination,
+                                                  min_delay, batch_size)
+            for partition in partitions)
+
+    def _aggregate(self, getter_name, columnar):
+        """
+        Runs a delay aggregate on every partition concurrently and merges the partial counts.
+        Returns a structured array if columnar is True, otherwise a list of tuples.
+        """
+        dtype, key_count = FAN_OUT_AGGREGATES[getter_name]
+        partials = self._fan_out(self._partitions, getter_name, columnar=True)
+        merged = merge_delay_counts(partials, dtype, key_count)
+        return merged if columnar else merged.tolist()
+
+    def get_percentage_of_delayed_flights_by_airline(self, columnar=False):
+        """
+        Retrieves the percentage of delayed flights for each airline, across the partitions.
+        """
+        return self._aggregate('get_percentage_of_delayed_flights_by_airline', columnar)
+
+    def get_percentage_of_delayed_flights_per_hour(self, columnar=False):
+        """
+        Retrieves the percentage of delayed flights per hour of the day, across the partitions.
+        """
+        return self._aggregate('get_percentage_of_delayed_flights_per_hour', columnar)
+
+    def get_delayed_flights_per_route(self, columnar=False):
+        """
+        Retrieves the percentage of delayed flights per route, across the partitions.
+        """
+        return self._aggregate('get_delayed_flights_per_route', columnar)
+
+    def get_delayed_flights_per_route_with_coordinates(self, columnar=False):
+        """
+        Retrieves the percentage of delayed flights per route with geographical coordinates,
+        across the partitions.
+        """
+        return self._aggregate('get_delayed_flights_per_route_with_coordinates', columnar)
+
+    def __del__(self):
+        """
+        Stops the fan-out thread pool.
+        """
+        self._executor.shutdown(wait=False)
+
+
+def merge_delay_counts(partials, dtype, key_count):
+    """
+    Merges partial delay aggregates (structured arrays of dtype whose first key_count fields
+    form the key): the total and delayed flights of each key are summed, the other fields
+    (e.g. coordinates) are taken from the first partial holding the key, and the delayed
+    percentage is computed from the sums. Returns a structured array ordered by key.
+    """
+    combined = np.concatenate([np.asarray(partial, dtype=dtype) for partial in partials] or [np.empty(0, dtype)])
+    keys = combined[list(dtype.names[:key_count])]
+    unique_keys, first_index, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    inverse = inverse.ravel()
+
+    merged = combined[first_index].copy()
+    merged['total_flights'] = np.bincount(inverse, weights=combined['total_flights'],
+                                          minlength=len(unique_keys)).astype(np.int64)
+    merged['delayed_flights'] = np.bincount(inverse, weights=combined['delayed_flights'],
+                                            minlength=len(unique_keys)).astype(np.int64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        merged['delayed_percentage'] = merged['delayed_flights'] * 100.0 / merged['total_flights']
+    return merged
+
+
+def partition_database(source_path, partitions_dir):
+    """
+    Splits the flights of a database into one SQLite file per month in partitions_dir,
+    each with a copy of the airlines and airports tables, and writes the manifest
+    (file, month, ID range and row count of every partition).
+    Returns the manifest entries.
+    """
+    os.makedirs(partitions_dir, exist_ok=True)
+    source = sqlite3.connect(source_path)
+    schema = dict(source.execute("SELECT name, sql FROM sqlite_master WHERE type = 'table'").fetchall())
+    triggers = [row[0] for row in source.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'flights'")]
+    months = source.execute("SELECT DISTINCT YEAR, MONTH FROM flights ORDER BY YEAR, MONTH").fetchall()
+    source.close()
+
+    entries = []
+    for year, month in months:
+        filename = PARTITION_FILE.format(year=year, month=month)
+        path = os.path.join(partitions_dir, filename)
+        if os.path.exists(path):
+            os.remove(path)
+
+        connection = sqlite3.connect(path)
+        connection.execute("ATTACH DATABASE ? AS source", (os.path.abspath(source_path),))
+        for table in COPIED_TABLES:
+            connection.execute(schema[table])
+        for trigger in triggers:
+            connection.execute(trigger)
+        connection.execute("INSERT INTO airlines SELECT * FROM source.airlines")
+        connection.execute("INSERT INTO airports SELECT * FROM source.airports")
+        connection.execute("INSERT INTO flights SELECT * FROM source.flights WHERE YEAR = ? AND MONTH = ? "
+                           "ORDER BY ID", (year, month))
+        connection.commit()
+        min_id, max_id, rows = connection.execute("SELECT MIN(ID), MAX(ID), COUNT(*) FROM flights").fetchone()
+        connection.execute("DETACH DATABASE source")
+        connection.close()
+        entries.append({'file': filename, 'year': year, 'month': month,
+                        'min_id': min_id, 'max_id': max_id, 'rows': rows})
+
+    with open(os.path.join(partitions_dir, f"{MANIFEST_FILE}.tmp"), 'w') as manifest_file:
+        json.dump({'source': os.path.abspath(source_path), 'partitions': entries}, manifest_file, indent=2)
+    os.replace(os.path.join(partitions_dir, f"{MANIFEST_FILE}.tmp"), os.path.join(partitions_dir, MANIFEST_FILE))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split the flights database into monthly partitions")
+    parser.add_argument('--source', default='data/flights.sqlite3', help="flights database file")
+    parser.add_argument('--output-dir', default='data/partitions')
+    parser.add_argument('--provision-indexes', action='store_true',
+                        help="create the indexes and the summary tables in every partition")
+    parser.add_argument('--engine-profile', choices=ENGINE_PROFILES, default=DEFAULT_ENGINE_PROFILE,
+                        help="database engine profile (see data.ENGINE_PROFILES)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    entries = partition_database(args.source, args.output_dir)
+    if args.provision_indexes:
+        PartitionedFlightData(args.output_dir, provision_indexes=True, engine_profile=args.engine_profile,
+                              use_summaries=True, prepare_tables=True)
+    for entry in entries:
+        print(f"{entry['file']:28} {entry['rows']:10} flights  IDs {entry['min_id']} - {entry['max_id']}")
+    print(f"{len(entries)} partitions in {args.output_dir} ({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == '__main__':
+    main()
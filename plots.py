@@ -1,56 +1,129 @@
+import argparse
+import os
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 import numpy as np
-import seaborn as sns
+from matplotlib.collections import LineCollection
 from mpl_toolkits.basemap import Basemap
-from data import FlightDataVisuals
+from data import (DEFAULT_ENGINE_PROFILE, ENGINE_PROFILES, FlightDataVisuals, AIRLINE_DELAYS_DTYPE,
+                  HOUR_DELAYS_DTYPE, ROUTE_DELAYS_DTYPE, ROUTE_DELAYS_WITH_COORD_DTYPE, approximate_dtype,
+                  route_delay_matrix, to_columns)
 
+"""
+The projected USA base layer, built on the first map render and reused by the next ones:
+the shaded relief image warped to the projection (RGBA, uint8) and the projected segments
+of the boundary layers, drawn with the given line widths.
+"""
+BOUNDARY_LAYERS = {'coastlines': 1.0, 'countries': 0.5, 'states': 0.5}
+_usa_base_layer = {}
 
-def plot_percentage_of_delayed_flights_by_airline(data):
+"""
+Default output files of the charts.
+"""
+AIRLINE_PLOT_FILE = 'delayed_flights_per_airline.png'
+HOUR_PLOT_FILE = 'percentage_of_delayed_flights_per_hour.png'
+ROUTE_HEATMAP_FILE = 'percentage_of_delayed_flights_by_route.png'
+ROUTE_MAP_FILE = 'delayed_flights_routes_map.png'
+
+"""
+The route heatmap shows the routes between the HEATMAP_TOP_AIRPORTS busiest airports by default,
+and labels at most HEATMAP_MAX_LABELS airports per axis (every n-th airport on larger charts).
+"""
+HEATMAP_TOP_AIRPORTS = 50
+HEATMAP_MAX_LABELS = 60
+
+
+def save_plot(output_path, show):
+    """
+    Saves the current figure to output_path, atomically replacing an existing file,
+    then shows it (blocking) if show is True, or closes it otherwise.
+    """
+    directory, filename = os.path.split(output_path)
+    name, extension = os.path.splitext(filename)
+    temp_path = os.path.join(directory, f".{name}.{os.getpid()}.tmp{extension}")
+    plt.savefig(temp_path)
+    os.replace(temp_path, output_path)
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+
+def as_columns(data, dtype):
+    """
+    Returns the plot data as a structured NumPy array of the given dtype.
+    Columnar results (from FlightDataVisuals with columnar=True) are used as they are,
+    lists of records are converted (to approximate_dtype(dtype) for approximate results).
+    """
+    if isinstance(data, np.ndarray):
+        return data
+    data = list(data)
+    if data and len(data[0]) > len(dtype.names):
+        dtype = approximate_dtype(dtype)
+    return to_columns(data, dtype)
+
+
+def interval_errors(data):
+    """
+    Returns the distances from the delayed percentages to the bounds of their confidence
+    intervals (the yerr of an error bar plot), or None for exact results.
+    """
+    if 'ci_low' not in data.dtype.names:
+        return None
+    return np.vstack([data['delayed_percentage'] - data['ci_low'], data['ci_high'] - data['delayed_percentage']])
+
+
+def sparse_groups(data):
+    """
+    Returns the mask of the groups flagged as sparse in approximate results (none for exact results).
+    """
+    if 'sparse' not in data.dtype.names:
+        return np.zeros(len(data), dtype=bool)
+    return data['sparse']
+
+
+def plot_percentage_of_delayed_flights_by_airline(data, output_path=AIRLINE_PLOT_FILE, show=True):
     """
     Plots the percentage of delayed flights by airline.
     """
-    if not data:
+    data = as_columns(data, AIRLINE_DELAYS_DTYPE)
+    if len(data) == 0:
         print("No data available to plot.")
         return
 
     # Extract data for plotting
-    airlines = [record[0] for record in data]
-    percentages = [record[3] for record in data]
+    airlines = data['airline']
+    percentages = data['delayed_percentage']
 
     plt.figure(figsize=(8, 5))
-    plt.bar(airlines, percentages, color='tab:olive')
+    plt.bar(airlines, percentages, color='tab:olive', yerr=interval_errors(data), capsize=3)
     plt.xlabel('Airline')
     plt.ylabel('Percentage of Delayed Flights')
     plt.title('Percentage of Delayed Flights by Airline')
     plt.xticks(rotation=45)
     plt.tight_layout()
-    plt.savefig('delayed_flights_per_airline.png')
-    plt.show()
+    save_plot(output_path, show)
 
 
-def plot_percentage_of_delayed_flights_per_hour(data):
+def plot_percentage_of_delayed_flights_per_hour(data, output_path=HOUR_PLOT_FILE, show=True):
     """
     Plots the percentage of delayed flights per hour of the day.
     """
-    # Extract columns from the tuple based on the expected order
-    hours = [record[0] for record in data]  # Extract 'hour_of_day'
-    percentages = [record[3] for record in data]  # Extract 'delayed_percentage'
-
-    # Convert hours to integers for the x-axis
-    hours = list(map(int, hours))
+    data = as_columns(data, HOUR_DELAYS_DTYPE)
+    hours = data['hour_of_day']
+    percentages = data['delayed_percentage']
 
     # Normalize the percentage data for the color gradient
-    norm = plt.Normalize(min(percentages), max(percentages))
+    norm = plt.Normalize(percentages.min(), percentages.max())
     colors = cm.viridis_r(norm(percentages))  # Using the 'viridis' colormap for the gradient
 
     plt.figure(figsize=(12, 7))
-    bars = plt.bar(hours, percentages, color=colors, edgecolor='black')
+    bars = plt.bar(hours, percentages, color=colors, edgecolor='black', yerr=interval_errors(data), capsize=3)
 
     # Add color gradient bar (legend)
     sm = plt.cm.ScalarMappable(cmap="viridis_r", norm=norm)
     sm.set_array([])
-    cbar = plt.colorbar(sm, orientation='vertical', pad=0.02)
+    cbar = plt.colorbar(sm, ax=plt.gca(), orientation='vertical', pad=0.02)
     cbar.set_label('Percentage of Delayed Flights')
 
     plt.xlabel('Hour of Day')
@@ -58,101 +131,201 @@ def plot_percentage_of_delayed_flights_per_hour(data):
     plt.title('Percentage of Delayed Flights per Hour of the Day')
     plt.xticks(np.arange(0, 24, step=1))  # Set x-ticks for every hour
     plt.tight_layout()
-    plt.savefig('percentage_of_delayed_flights_per_hour.png')
-    plt.show()
+    save_plot(output_path, show)
 
 
-def plot_heatmap_of_delayed_flights_by_route(data):
+def plot_heatmap_of_delayed_flights_by_route(data, output_path=ROUTE_HEATMAP_FILE, show=True,
+                                             top_airports=HEATMAP_TOP_AIRPORTS, min_flights=None):
     """
-    Plots the heatmap of the delayed flights by route.
+    Plots the heatmap of the delayed flights by route, for the routes between the top_airports
+    busiest airports (all of them if None) with at least min_flights flights.
+    The routes are drawn from their sparse representation (see data.route_delay_matrix), one square
+    marker per route, so the chart never holds a dense airports x airports matrix; the airports
+    are ordered by traffic, and only some of them are labeled on large charts.
+    Sparse routes of approximate results are left out of the color scale and drawn in gray.
     """
-    routes = [(record[0], record[1], record[4]) for record in
-              data]  # Extract 'origin', 'destination', 'delayed_percentage'
-    origins = list(set(record[0] for record in routes))
-    destinations = list(set(record[1] for record in routes))
-
-    # Create a 2D array to hold the delayed percentages
-    heatmap_data = np.zeros((len(origins), len(destinations)))
+    matrix = route_delay_matrix(as_columns(data, ROUTE_DELAYS_DTYPE), top_airports, min_flights)
+    if len(matrix.rows) == 0:
+        print("No data available to plot.")
+        return
 
-    # Fill the heatmap data
-    origin_to_index = {origin: idx for idx, origin in enumerate(origins)}
-    destination_to_index = {destination: idx for idx, destination in enumerate(destinations)}
+    fig = plt.figure(figsize=(12, 8))
+    ax = plt.gca()
+    rows_count, columns_count = matrix.shape
+    ax.set_xlim(-0.5, columns_count - 0.5)
+    ax.set_ylim(rows_count - 0.5, -0.5)
 
-    for origin, destination, percentage in routes:
-        heatmap_data[origin_to_index[origin], destination_to_index[destination]] = percentage
+    # Size the markers to fill their cell: the axes size in points, divided by the cells per axis
+    box = ax.get_window_extent()
+    cell = min(box.width / columns_count, box.height / rows_count) * 72 / fig.dpi
+    sparse = matrix.sparse
+    if sparse.any():
+        ax.scatter(matrix.columns[sparse], matrix.rows[sparse], s=cell ** 2, marker='s', color='lightgray',
+                   linewidths=0)
+    routes = ax.scatter(matrix.columns[~sparse], matrix.rows[~sparse], c=matrix.percentages[~sparse],
+                        s=cell ** 2, marker='s', cmap='PiYG', linewidths=0)
+    plt.colorbar(routes, ax=ax, label='Percentage of Delayed Flights')
 
-    plt.figure(figsize=(12, 8))
-    sns.heatmap(heatmap_data, xticklabels=destinations, yticklabels=origins, cmap='PiYG', annot=False, fmt=".1f")
+    for axis, airports in ((ax.xaxis, matrix.destinations), (ax.yaxis, matrix.origins)):
+        step = -(-len(airports) // HEATMAP_MAX_LABELS)
+        axis.set_ticks(np.arange(0, len(airports), step))
+        axis.set_ticklabels(airports[::step], fontsize=8 if step == 1 else 6)
+    plt.xticks(rotation=90)
     plt.xlabel('Destination Airport')
     plt.ylabel('Origin Airport')
     plt.title('Percentage of Delayed Flights by Route')
     plt.tight_layout()
-    plt.savefig('percentage_of_delayed_flights_by_route.png')
-    plt.show()
+    save_plot(output_path, show)
 
 
-def plot_routes_on_map(data):
+def get_usa_basemap():
+    """
+    Returns the Basemap of the USA, created once and kept in memory.
+    """
+    if 'basemap' not in _usa_base_layer:
+        _usa_base_layer['basemap'] = Basemap(projection='lcc', resolution='c',
+                                             lat_0=37.5, lon_0=-95,
+                                             width=5E6, height=3E6)
+    return _usa_base_layer['basemap']
+
+
+def load_usa_base_layer(cache_path):
+    """
+    Loads the projected base layer from a cache file (.npz), or returns None if there is none.
+    """
+    if not cache_path or not os.path.exists(cache_path):
+        return None
+    with np.load(cache_path) as cache:
+        layers = {'relief': cache['relief']}
+        for name in BOUNDARY_LAYERS:
+            points = cache[f'{name}_points']
+            lengths = cache[f'{name}_lengths']
+            layers[name] = np.split(points, np.cumsum(lengths)[:-1])
+    return layers
+
+
+def save_usa_base_layer(layers, cache_path):
+    """
+    Saves the projected base layer to a cache file (.npz), replacing it atomically.
+    """
+    arrays = {'relief': layers['relief']}
+    for name in BOUNDARY_LAYERS:
+        segments = layers[name]
+        arrays[f'{name}_points'] = np.concatenate(segments) if segments else np.empty((0, 2))
+        arrays[f'{name}_lengths'] = np.array([len(segment) for segment in segments], dtype=np.int64)
+
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as cache_file:
+        np.savez(cache_file, **arrays)
+    os.replace(temp_path, cache_path)
+
+
+def draw_usa_base_layer(cache_path=None):
+    """
+    Draws the USA base layer (shaded relief, coastlines, countries and states) on the current axes
+    and returns the Basemap. The layer is only projected on the first call and then reused
+    from memory, or from cache_path across processes.
+    """
+    m = get_usa_basemap()
+    layers = _usa_base_layer.get('layers') or load_usa_base_layer(cache_path)
+
+    if layers is None:
+        image = m.shadedrelief()
+        layers = {'relief': np.round(np.ma.filled(image.get_array(), 0) * 255).astype(np.uint8),
+                  'coastlines': m.drawcoastlines(color='gray').get_segments(),
+                  'countries': m.drawcountries(color='gray').get_segments(),
+                  'states': m.drawstates(color='gray').get_segments()}
+        if cache_path:
+            save_usa_base_layer(layers, cache_path)
+    else:
+        m.imshow(layers['relief'])
+        for name, linewidth in BOUNDARY_LAYERS.items():
+            plt.gca().add_collection(LineCollection(layers[name], colors='gray', linewidths=linewidth))
+
+    _usa_base_layer['layers'] = layers
+    return m
+
+
+def plot_routes_on_map(data, basemap_cache_path=None, output_path=ROUTE_MAP_FILE, show=True):
     """
     Plot the percentage of delayed flights per route on a map of the USA.
+    The projected base layer is cached (see draw_usa_base_layer) and all the routes
+    are drawn as a single LineCollection. Sparse routes of approximate results are
+    drawn as thin dashed gray lines, out of the color scale.
     """
     plt.figure(figsize=(12, 8))
 
     # Setup Basemap for USA
-    m = Basemap(projection='lcc', resolution='c',
-                lat_0=37.5, lon_0=-95,
-                width=5E6, height=3E6)
+    m = draw_usa_base_layer(basemap_cache_path)
 
-    m.shadedrelief()
-    m.drawcoastlines(color='gray')
-    m.drawcountries(color='gray')
-    m.drawstates(color='gray')
+    data = as_columns(data, ROUTE_DELAYS_WITH_COORD_DTYPE)
+    sparse = sparse_groups(data)
+    percentages = data['delayed_percentage'][~sparse]
 
     # Create a color map for the delays
-    max_delay = max(record[4] for record in data)
-    min_delay = min(record[4] for record in data)
-    norm = plt.Normalize(vmin=min_delay, vmax=max_delay)
+    norm = plt.Normalize(vmin=percentages.min(), vmax=percentages.max())
     cmap = plt.get_cmap('Spectral')
 
-    # Plot each route
-    for record in data:
-        origin = record[0]
-        destination = record[1]
-        percentage = record[4]
-        origin_latitude = record[5]
-        origin_longitude = record[6]
-        destination_latitude = record[7]
-        destination_longitude = record[8]
+    # Project all the airports at once and build one segment per route
+    x_o, y_o = m(data['origin_longitude'], data['origin_latitude'])
+    x_d, y_d = m(data['destination_longitude'], data['destination_latitude'])
+    segments = np.stack([np.column_stack([x_o, y_o]), np.column_stack([x_d, y_d])], axis=1)
 
-        x_o, y_o = m(origin_longitude, origin_latitude)
-        x_d, y_d = m(destination_longitude, destination_latitude)
-
-        color = cmap(norm(percentage))
-        m.plot([x_o, x_d], [y_o, y_d], marker=None, color=color, linewidth=2)
+    if sparse.any():
+        plt.gca().add_collection(LineCollection(segments[sparse], colors='gray', linewidths=0.5,
+                                                linestyles='dashed'))
+    routes = LineCollection(segments[~sparse], cmap=cmap, norm=norm, linewidths=2)
+    routes.set_array(percentages)
+    plt.gca().add_collection(routes)
 
     # Add color bar
-    sm = plt.cm.ScalarMappable(cmap=cmap, norm=norm)
-    sm.set_array([])
-    plt.colorbar(sm, orientation='horizontal', pad=0.05, label='Percentage of Delayed Flights')
+    plt.colorbar(routes, ax=plt.gca(), orientation='horizontal', pad=0.05, label='Percentage of Delayed Flights')
 
     # Add a title
     plt.title('Percentage of Delayed Flights per Route', fontsize=15)
     plt.tight_layout()
-    plt.savefig('delayed_flights_routes_map.png')
-    plt.show()
+    save_plot(output_path, show)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Plot the flight delay charts")
+    parser.add_argument('--engine-profile', choices=ENGINE_PROFILES, default=DEFAULT_ENGINE_PROFILE,
+                        help="database engine profile (see data.ENGINE_PROFILES)")
+    parser.add_argument('--basemap-cache', default=None,
+                        help="file (.npz) caching the projected map base layer between runs")
+    parser.add_argument('--headless', action='store_true',
+                        help="render the charts in parallel without showing them (see render.py)")
+    parser.add_argument('--output-dir', default='.', help="directory the charts are written to in headless mode")
+    parser.add_argument('--approximate', action='store_true',
+                        help="plot the estimates from the flights sample, with their confidence intervals")
+    parser.add_argument('--heatmap-airports', type=int, default=HEATMAP_TOP_AIRPORTS,
+                        help="number of busiest airports in the route heatmap (0 for all of them)")
+    parser.add_argument('--heatmap-min-flights', type=int, default=None,
+                        help="minimum number of flights of the routes in the heatmap")
+    args = parser.parse_args()
+
     db_uri = 'sqlite:///data/flights.sqlite3'
-    flight_data_visuals = FlightDataVisuals(db_uri)
-    data = flight_data_visuals.get_percentage_of_delayed_flights_by_airline()
+    if args.headless:
+        # Imported here, as render imports this module
+        import render
+        results = render.render_all(db_uri, args.output_dir, engine_profile=args.engine_profile,
+                                    approximate=args.approximate)
+        for chart, result in results.items():
+            print(f"{chart}: query {result['query']:.2f}s, render {result['render']:.2f}s -> {result['path']}")
+        return
+
+    flight_data_visuals = FlightDataVisuals(db_uri, engine_profile=args.engine_profile, use_summaries=True)
+    data = flight_data_visuals.get_percentage_of_delayed_flights_by_airline(columnar=True,
+                                                                          approximate=args.approximate)
     plot_percentage_of_delayed_flights_by_airline(data)
-    data = flight_data_visuals.get_percentage_of_delayed_flights_per_hour()
+    data = flight_data_visuals.get_percentage_of_delayed_flights_per_hour(columnar=True, approximate=args.approximate)
     plot_percentage_of_delayed_flights_per_hour(data)
-    data = flight_data_visuals.get_delayed_flights_per_route()
-    plot_heatmap_of_delayed_flights_by_route(data)
-    data = flight_data_visuals.get_delayed_flights_per_route_with_coordinates()
-    plot_routes_on_map(data)
-
+    data = flight_data_visuals.get_delayed_flights_per_route(columnar=True, approximate=args.approximate)
+    plot_heatmap_of_delayed_flights_by_route(data, top_airports=args.heatmap_airports or None,
+                                             min_flights=args.heatmap_min_flights)
+    data = flight_data_visuals.get_delayed_flights_per_route_with_coordinates(columnar=True,
+                                                                            approximate=args.approximate)
+    plot_routes_on_map(data, args.basemap_cache)
 
 if __name__ == "__main__":
     main()
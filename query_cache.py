@@ -0,0 +1,124 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    The QueryCache class is a bounded LRU cache for query results, keyed by query and params.
+    Entries are evicted when the cache holds more than max_entries results or more than
+    max_bytes (approximate size of the cached records), and expire after ttl seconds if set.
+    Every lookup carries the current version of the database; when it changes,
+    the whole cache is invalidated.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, ttl=None):
+        """
+        Initialize an empty cache with the given limits (ttl in seconds, None for no expiry).
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key, version):
+        """
+        Looks up the result cached for the key.
+        Returns a tuple (found, result).
+        """
+        with self._lock:
+            self._check_version(version)
+            entry = self._entries.get(key)
+            if entry is not None and self._ttl is not None and time.monotonic() - entry[2] > self._ttl:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[0]
+
+    def put(self, key, version, result):
+        """
+        Caches a result, evicting the least recently used entries if a limit is exceeded.
+        Results larger than the whole cache are not cached.
+        """
+        size = estimate_size(result)
+        if size > self._max_bytes:
+            return
+        with self._lock:
+            self._check_version(version)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, time.monotonic())
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes every entry from the cache.
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns the cache counters and current size as a dictionary.
+        """
+        with self._lock:
+            return {'hits': self.hits,
+                    'misses': self.misses,
+                    'evictions': self.evictions,
+                    'expirations': self.expirations,
+                    'invalidations': self.invalidations,
+                    'entries': len(self._entries),
+                    'bytes': self._bytes,
+                    'max_entries': self._max_entries,
+                    'max_bytes': self._max_bytes}
+
+    def _check_version(self, version):
+        """
+        Drops every entry if the database version changed since the last call.
+        """
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+            self._version = version
+
+    def _remove(self, key):
+        """
+        Removes an entry and releases its size.
+        """
+        result, size, created = self._entries.pop(key)
+        self._bytes -= size
+
+
+def estimate_size(result):
+    """
+    Returns the approximate memory size in bytes of a list of records
+    (or the exact size of a NumPy array).
+    """
+    if hasattr(result, 'nbytes'):
+        return result.nbytes
+    size = sys.getsizeof(result)
+    for record in result:
+        size += sys.getsizeof(record)
+        for value in record:
+            size += sys.getsizeof(value)
+    return size
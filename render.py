@@ -0,0 +1,107 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import matplotlib
+import plots
+from data import DEFAULT_ENGINE_PROFILE, ENGINE_PROFILES, FlightDataVisuals
+
+SQLITE_URI = 'sqlite:///data/flights.sqlite3'
+BASE_LAYER_CACHE_FILE = '.usa_base_layer.npz'
+
+"""
+Chart Dispatch Dictionary
+Each chart is rendered from the columnar result of a FlightDataVisuals getter by a plots function.
+"""
+CHARTS = {'airline': ('get_percentage_of_delayed_flights_by_airline',
+                      plots.plot_percentage_of_delayed_flights_by_airline, plots.AIRLINE_PLOT_FILE),
+          'hour': ('get_percentage_of_delayed_flights_per_hour',
+                   plots.plot_percentage_of_delayed_flights_per_hour, plots.HOUR_PLOT_FILE),
+          'route_heatmap': ('get_delayed_flights_per_route',
+                            plots.plot_heatmap_of_delayed_flights_by_route, plots.ROUTE_HEATMAP_FILE),
+          'route_map': ('get_delayed_flights_per_route_with_coordinates',
+                        plots.plot_routes_on_map, plots.ROUTE_MAP_FILE)}
+
+
+def init_worker():
+    """
+    Switches the render processes to the non-interactive Agg backend.
+    """
+    matplotlib.use('Agg', force=True)
+
+
+def render_chart(db_uri, chart, output_dir, engine_profile=DEFAULT_ENGINE_PROFILE, approximate=False):
+    """
+    Runs the aggregate query of a chart (approximate: from the flights sample) and renders it
+    to its file in output_dir.
+    Returns a dictionary with the output path and the time spent querying and rendering.
+    """
+    getter_name, plot_function, filename = CHARTS[chart]
+    output_path = os.path.join(output_dir, filename)
+
+    start = time.perf_counter()
+    # The tables are prepared by render_all: the workers only read them
+    data_manager = FlightDataVisuals(db_uri, engine_profile=engine_profile, use_summaries=not approximate,
+                                     prepare_tables=False)
+    data = getattr(data_manager, getter_name)(columnar=True, approximate=approximate)
+    queried = time.perf_counter()
+
+    if chart == 'route_map':
+        plot_function(data, os.path.join(output_dir, BASE_LAYER_CACHE_FILE), output_path=output_path, show=False)
+    else:
+        plot_function(data, output_path=output_path, show=False)
+    rendered = time.perf_counter()
+
+    return {'path': output_path,
+            'query': queried - start,
+            'render': rendered - queried}
+
+
+def render_all(db_uri, output_dir, charts=None, workers=None, engine_profile=DEFAULT_ENGINE_PROFILE,
+               approximate=False):
+    """
+    Renders the charts (all of them by default) concurrently in a process pool.
+    The summary tables (and the flights sample, for approximate charts) are brought up to date
+    once beforehand, and the workers open the database without preparing any table
+    (prepare_tables=False), so they only read it.
+    Returns a dictionary of chart name -> output path and timings (see render_chart).
+    """
+    charts = list(charts or CHARTS)
+    os.makedirs(output_dir, exist_ok=True)
+    data_manager = FlightDataVisuals(db_uri, engine_profile=engine_profile)
+    if approximate:
+        data_manager.build_sample()
+    else:
+        data_manager.build_summaries()
+
+    with ProcessPoolExecutor(max_workers=workers or len(charts), initializer=init_worker) as executor:
+        futures = {chart: executor.submit(render_chart, db_uri, chart, output_dir, engine_profile, approximate)
+                   for chart in charts}
+        return {chart: future.result() for chart, future in futures.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render the flight delay charts without a display")
+    parser.add_argument('--db-uri', default=SQLITE_URI)
+    parser.add_argument('--output-dir', default='.', help="directory the charts are written to")
+    parser.add_argument('--chart', action='append', choices=CHARTS, help="chart to render (default: all)")
+    parser.add_argument('--workers', type=int, default=None, help="number of render processes")
+    parser.add_argument('--engine-profile', choices=ENGINE_PROFILES, default=DEFAULT_ENGINE_PROFILE,
+                        help="database engine profile (see data.ENGINE_PROFILES)")
+    parser.add_argument('--approximate', action='store_true',
+                        help="render the estimates from the flights sample, with their confidence intervals")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = render_all(args.db_uri, args.output_dir, args.chart, args.workers, args.engine_profile,
+                         args.approximate)
+    for chart, result in results.items():
+        print(f"{chart:14} query {result['query']:7.2f}s  render {result['render']:7.2f}s  -> {result['path']}")
+    print(f"{'total':14} {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import json
+from operator import itemgetter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+"""
+The fields of a flight in the API responses, in order.
+The flight details queries return them as columns of the same name, with NULL delays
+already turned into 0 (see FLIGHT_COLUMNS), so the serializer does not parse any value.
+"""
+API_FLIGHT_FIELDS = ('ID', 'ORIGIN_AIRPORT', 'DESTINATION_AIRPORT', 'AIRLINE', 'DELAY')
+JSON_MIMETYPE = 'application/json'
+TRUNCATED_HEADER = 'X-Result-Truncated'
+
+
+def row_getter(column_names, fields=API_FLIGHT_FIELDS):
+    """
+    Returns a function extracting the given fields from a record, by position.
+    The positions are looked up once per result set from its column names; as with
+    record._mapping, the last column wins when several have the same name.
+    """
+    positions = {name: position for position, name in enumerate(column_names)}
+    getter = itemgetter(*(positions[field] for field in fields))
+    if len(fields) == 1:
+        return lambda record: (getter(record),)
+    return getter
+
+
+def serialize_flights(results, fields=API_FLIGHT_FIELDS):
+    """
+    Converts a list of flight records into the list of dictionaries returned by the API.
+    A truncated list of records (see data.TruncatedRecords) gives a list of the same class.
+    """
+    if not results:
+        return []
+    getter = row_getter(results[0]._fields, fields)
+    flight_details = [dict(zip(fields, getter(record))) for record in results]
+    if getattr(results, 'truncated', False):
+        return type(results)(flight_details)
+    return flight_details
+
+
+def iter_flights(results, fields=API_FLIGHT_FIELDS):
+    """
+    Converts flight records (e.g. streamed from a database cursor) into API dictionaries one by one.
+    """
+    getter = None
+    for record in results:
+        if getter is None:
+            getter = row_getter(record._fields, fields)
+        yield dict(zip(fields, getter(record)))
+
+
+def dumps(obj):
+    """
+    Encodes an object to compact JSON bytes, with orjson when it is installed.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(',', ':')).encode()
@@ -0,0 +1,66 @@
+import importlib
+import os
+import shutil
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+from benchmarks.generate_dataset import generate_dataset
+from data import FlightDataVisuals
+
+"""
+Size of the synthetic flights database of the tests: a year of flights between a few airports,
+so that every month, airline and route has flights.
+"""
+TEST_ROWS = 3000
+TEST_AIRPORTS = 20
+
+
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    """
+    Writes the synthetic flights database once per test session.
+    """
+    path = str(tmp_path_factory.mktemp('dataset') / 'flights.sqlite3')
+    generate_dataset(path, TEST_ROWS, airport_count=TEST_AIRPORTS)
+    return path
+
+
+@pytest.fixture
+def db_path(dataset, tmp_path):
+    """
+    A copy of the synthetic database that the test may write to.
+    """
+    path = str(tmp_path / 'flights.sqlite3')
+    shutil.copyfile(dataset, path)
+    return path
+
+
+@pytest.fixture
+def db_uri(db_path):
+    return f"sqlite:///{db_path}"
+
+
+@pytest.fixture
+def data_manager(db_uri):
+    return FlightDataVisuals(db_uri)
+
+
+@pytest.fixture
+def app_module(dataset, monkeypatch):
+    """
+    The Flask application module, serving a fresh data manager of the synthetic database
+    (replaced with monkeypatch.setattr(app_module, 'data_manager', ...) to serve another one).
+    """
+    monkeypatch.setenv('SKYSQL_DB_URI', f"sqlite:///{dataset}")
+    app = importlib.import_module('app')
+    monkeypatch.setattr(app, 'data_manager', FlightDataVisuals(f"sqlite:///{dataset}",
+                                                               max_rows=app.MAX_RESULT_ROWS))
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
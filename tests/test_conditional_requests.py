@@ -0,0 +1,56 @@
+import sqlite3
+import pytest
+from data import FlightDataVisuals
+
+URL = '/api/flights_by_date?date=15/06/2015&limit=5'
+
+
+@pytest.fixture
+def served(app_module, db_uri, monkeypatch):
+    """
+    Serves a database copy that the test may write to, and counts the queries it runs.
+    """
+    data_manager = FlightDataVisuals(db_uri)
+    queries = []
+    execute_query = data_manager._execute_query
+    monkeypatch.setattr(data_manager, '_execute_query',
+                        lambda *args, **kwargs: queries.append(args[0]) or execute_query(*args, **kwargs))
+    monkeypatch.setattr(app_module, 'data_manager', data_manager)
+    return queries
+
+
+def test_unchanged_data_is_answered_with_304_before_any_query(client, served):
+    etag = client.get(URL).headers['ETag']
+    served.clear()
+
+    response = client.get(URL, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+    assert response.headers['ETag'] == etag
+    assert served == []
+
+
+def test_invalid_request_gets_400_despite_a_matching_etag(client, served):
+    etag = client.get(URL).headers['ETag']
+
+    for url in ('/api/flights_by_date?date=15-06-2015', URL + '&after=abc',
+                '/api/flights', '/api/flight_number?flight_no=abc', '/api/export?format=csv'):
+        assert client.get(url, headers={'If-None-Match': etag}).status_code == 400
+
+
+def test_stale_etag_gets_the_full_response(client, served):
+    response = client.get(URL, headers={'If-None-Match': 'W/"stale"'})
+
+    assert response.status_code == 200
+    assert response.get_json()['flights']
+
+
+def test_write_changes_the_etag(client, served, db_path):
+    etag = client.get(URL).headers['ETag']
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("UPDATE flights SET DEPARTURE_DELAY = DEPARTURE_DELAY + 1 WHERE ID = 1")
+
+    response = client.get(URL, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert client.get(URL, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
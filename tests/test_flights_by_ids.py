@@ -0,0 +1,47 @@
+from data import FlightDataVisuals
+
+
+def test_chunks_return_every_flight_in_request_order(data_manager):
+    flight_ids = [42, 7, 2999, 7, 1500, 3, 8, 9, 10, 11]
+    results = data_manager.get_flights_by_ids(flight_ids, chunk_size=3)
+
+    assert [record.ID for record in results] == flight_ids
+
+
+def test_missing_ids_are_none(data_manager):
+    results = data_manager.get_flights_by_ids([5, 999999, 6, -1], chunk_size=2)
+
+    assert [record.ID if record is not None else None for record in results] == [5, None, 6, None]
+
+
+def test_chunks_are_not_capped_at_max_rows(db_uri):
+    data_manager = FlightDataVisuals(db_uri, max_rows=10)
+    flight_ids = list(range(1, 50))
+
+    results = data_manager.get_flights_by_ids(flight_ids)
+    assert [record.ID for record in results] == flight_ids
+
+
+def test_api_reports_the_missing_ids(client):
+    response = client.get('/api/flights_by_ids?ids=3,999999,1')
+
+    assert response.status_code == 200
+    flights = response.get_json()
+    assert [flight['ID'] for flight in flights] == [3, 999999, 1]
+    assert flights[1] == {'ID': 999999, 'error': 'No flight found with this ID'}
+    assert 'error' not in flights[0] and 'error' not in flights[2]
+
+
+def test_api_accepts_a_json_body(client):
+    response = client.post('/api/flights_by_ids', json={'ids': [2, 1]})
+
+    assert response.status_code == 200
+    assert [flight['ID'] for flight in response.get_json()] == [2, 1]
+
+
+def test_api_rejects_invalid_id_lists(client, app_module):
+    assert client.get('/api/flights_by_ids').status_code == 400
+    assert client.get('/api/flights_by_ids?ids=1,x').status_code == 400
+    assert client.post('/api/flights_by_ids', json={'ids': 'x'}).status_code == 400
+    too_many = ','.join(['1'] * (app_module.MAX_BATCH_IDS + 1))
+    assert client.get(f'/api/flights_by_ids?ids={too_many}').status_code == 400
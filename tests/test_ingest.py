@@ -0,0 +1,102 @@
+import csv
+import os
+import sqlite3
+import pytest
+import ingest
+
+
+@pytest.fixture
+def csv_path(dataset, tmp_path):
+    """
+    A CSV export of the flights of the synthetic database (without their IDs), to be appended again.
+    """
+    path = str(tmp_path / 'flights.csv')
+    with sqlite3.connect(dataset) as connection:
+        cursor = connection.execute("SELECT * FROM flights ORDER BY ID")
+        columns = [description[0] for description in cursor.description]
+        with open(path, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(column for column in columns if column != 'ID')
+            writer.writerows(row[1:] for row in cursor)
+    return path
+
+
+def quiet(message):
+    pass
+
+
+def interrupt(*args):
+    raise KeyboardInterrupt
+
+
+def flights(db_path):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute("SELECT ID, YEAR, MONTH, DAY, FLIGHT_NUMBER FROM flights ORDER BY ID").fetchall()
+
+
+def test_ingest_appends_every_flight_with_new_ids(csv_path, db_path):
+    before = flights(db_path)
+    loaded = ingest.ingest(csv_path, db_path, batch_size=500, progress=quiet)
+
+    after = flights(db_path)
+    assert loaded == len(before)
+    assert [row[0] for row in after] == list(range(1, 2 * len(before) + 1))
+    assert sorted(row[1:] for row in after[len(before):]) == sorted(row[1:] for row in before)
+    assert not os.path.exists(db_path + ingest.CHECKPOINT_SUFFIX)
+    assert not os.path.exists(db_path + ingest.STAGING_SUFFIX)
+
+
+def test_interrupted_ingest_resumes_where_it_stopped(csv_path, db_path, dataset, tmp_path, monkeypatch):
+    load_month = ingest.load_month
+    calls = []
+
+    def interrupted_load_month(*args):
+        calls.append(args)
+        if len(calls) == 4:
+            interrupt()
+        load_month(*args)
+
+    monkeypatch.setattr(ingest, 'load_month', interrupted_load_month)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.ingest(csv_path, db_path, batch_size=500, progress=quiet)
+    assert ingest.load_checkpoint(db_path)['loaded'] == 3
+    monkeypatch.setattr(ingest, 'load_month', load_month)
+    ingest.ingest(csv_path, db_path, batch_size=500, progress=quiet)
+
+    # The same load without interruption gives the same table
+    uninterrupted = str(tmp_path / 'uninterrupted.sqlite3')
+    with sqlite3.connect(dataset) as source, sqlite3.connect(uninterrupted) as target:
+        source.backup(target)
+    ingest.ingest(csv_path, uninterrupted, batch_size=500, progress=quiet)
+    assert flights(db_path) == flights(uninterrupted)
+
+
+def test_month_committed_without_its_checkpoint_is_not_loaded_twice(csv_path, db_path, monkeypatch):
+    save_checkpoint = ingest.save_checkpoint
+
+    def interrupted_save_checkpoint(db_path, checkpoint):
+        # Interrupted right after the first month was committed, before its checkpoint
+        if checkpoint['loaded'] == 1:
+            interrupt()
+        save_checkpoint(db_path, checkpoint)
+
+    rows = len(flights(db_path))
+    monkeypatch.setattr(ingest, 'save_checkpoint', interrupted_save_checkpoint)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.ingest(csv_path, db_path, batch_size=500, progress=quiet)
+    monkeypatch.setattr(ingest, 'save_checkpoint', save_checkpoint)
+    ingest.ingest(csv_path, db_path, batch_size=500, progress=quiet)
+
+    assert [row[0] for row in flights(db_path)] == list(range(1, 2 * rows + 1))
+
+
+def test_pending_load_of_another_file_is_refused(csv_path, db_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(ingest, 'load_month', interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        ingest.ingest(csv_path, db_path, progress=quiet)
+
+    other_csv = str(tmp_path / 'other.csv')
+    with open(csv_path) as source, open(other_csv, 'w') as target:
+        target.write(source.readline())
+    with pytest.raises(ingest.IngestError):
+        ingest.ingest(other_csv, db_path, progress=quiet)
@@ -0,0 +1,51 @@
+def read_pages(client, url, limit):
+    """
+    Follows the next_after cursors of a list endpoint from the first page to the last one.
+    Returns the pages (lists of flights).
+    """
+    pages = []
+    after = None
+    while True:
+        page_url = f"{url}&limit={limit}" + (f"&after={after}" if after is not None else '')
+        response = client.get(page_url)
+        assert response.status_code == 200
+        body = response.get_json()
+        pages.append(body['flights'])
+        after = body['next_after']
+        if after is None:
+            return pages
+        assert after == body['flights'][-1]['ID']
+
+
+def test_pages_cover_the_full_list_in_id_order(client):
+    full = client.get('/api/flights?origin=ATL').get_json()
+    pages = read_pages(client, '/api/flights?origin=ATL', 7)
+
+    flights = [flight for page in pages for flight in page]
+    assert [flight['ID'] for flight in flights] == sorted(flight['ID'] for flight in full)
+    assert all(len(page) == 7 for page in pages[:-1])
+    assert len(pages[-1]) < 7
+
+
+def test_last_full_page_is_followed_by_an_empty_page(client):
+    ids = [flight['ID'] for flight in client.get('/api/flights?origin=ATL').get_json()]
+    limit = len(ids) // 2
+    after = sorted(ids)[-limit - 1]
+
+    body = client.get(f'/api/flights?origin=ATL&limit={limit}&after={after}').get_json()
+    assert len(body['flights']) == limit
+    assert body['next_after'] == max(ids)
+    body = client.get(f"/api/flights?origin=ATL&limit={limit}&after={body['next_after']}").get_json()
+    assert body == {'flights': [], 'next_after': None}
+
+
+def test_date_pages_match_the_data_manager(client, app_module):
+    flights = app_module.data_manager.get_flights_by_date(15, 6, 2015)
+    pages = read_pages(client, '/api/flights_by_date?date=15/06/2015', 2)
+
+    assert [flight['ID'] for page in pages for flight in page] == sorted(flight.ID for flight in flights)
+
+
+def test_invalid_page_arguments_are_rejected(client):
+    for arguments in ('limit=0', 'limit=abc', 'after=abc', 'limit=5&stream=ndjson', 'stream=xml'):
+        assert client.get(f'/api/flights_by_date?date=15/06/2015&{arguments}').status_code == 400
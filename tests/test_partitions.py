@@ -0,0 +1,83 @@
+import sqlite3
+from datetime import date
+import numpy as np
+import pytest
+from partitions import PartitionedFlightData, partition_database
+
+AGGREGATE_GETTERS = ('get_percentage_of_delayed_flights_by_airline', 'get_percentage_of_delayed_flights_per_hour',
+                     'get_delayed_flights_per_route', 'get_delayed_flights_per_route_with_coordinates')
+
+
+@pytest.fixture
+def partitioned(db_path, tmp_path):
+    partitions_dir = str(tmp_path / 'partitions')
+    partition_database(db_path, partitions_dir)
+    return PartitionedFlightData(partitions_dir)
+
+
+@pytest.fixture
+def airline(db_path):
+    with sqlite3.connect(db_path) as connection:
+        return connection.execute("SELECT AIRLINE FROM airlines ORDER BY ID LIMIT 1").fetchone()[0]
+
+
+def ids(records):
+    return [record.ID for record in records]
+
+
+def test_partitions_split_the_flights_by_month(partitioned, data_manager):
+    assert len(partitioned.partitions()) == 12
+    assert sum(len(ids(partitioned.get_flights_by_date(1, month, 2015))) for month in range(1, 13)) == \
+        sum(len(ids(data_manager.get_flights_by_date(1, month, 2015))) for month in range(1, 13))
+
+
+@pytest.mark.parametrize('getter', AGGREGATE_GETTERS)
+def test_aggregates_match_the_single_file(partitioned, data_manager, getter):
+    expected = getattr(data_manager, getter)(columnar=True)
+    result = getattr(partitioned, getter)(columnar=True)
+
+    assert len(result) == len(expected)
+    for field in expected.dtype.names:
+        if expected.dtype[field].kind == 'f':
+            np.testing.assert_allclose(result[field], expected[field], err_msg=field)
+        else:
+            np.testing.assert_array_equal(result[field], expected[field], err_msg=field)
+
+
+def test_flight_lists_match_the_single_file(partitioned, data_manager, airline):
+    lookups = [('get_flight_by_id', (1500,), {}),
+               ('get_flights_by_date', (15, 6, 2015), {}),
+               ('get_delayed_flights_by_airline', (airline,), {}),
+               ('get_delayed_flights_by_airport', ('ATL',), {}),
+               ('search_flights', (), {'start_date': date(2015, 3, 20), 'end_date': date(2015, 5, 10),
+                                       'min_delay': 15})]
+    for getter, args, kwargs in lookups:
+        expected = getattr(data_manager, getter)(*args, **kwargs)
+        assert expected, getter
+        assert sorted(ids(getattr(partitioned, getter)(*args, **kwargs))) == sorted(ids(expected)), getter
+
+
+def test_pages_cross_the_partitions_like_the_single_file(partitioned, data_manager, airline):
+    after = {'single': None, 'partitioned': None}
+    while True:
+        expected = data_manager.get_delayed_flights_by_airline(airline, limit=50, after=after['single'])
+        result = partitioned.get_delayed_flights_by_airline(airline, limit=50, after=after['partitioned'])
+        assert ids(result) == ids(expected)
+        if len(expected) < 50:
+            break
+        after = {'single': expected[-1].ID, 'partitioned': result[-1].ID}
+
+
+def test_streams_match_the_single_file(partitioned, data_manager):
+    expected = data_manager.get_delayed_flights_by_airport('ATL', stream=True)
+    result = partitioned.get_delayed_flights_by_airport('ATL', stream=True)
+
+    assert ids(result) == ids(expected)
+
+
+def test_id_lookup_matches_the_single_file(partitioned, data_manager):
+    flight_ids = [2999, 5, 999999, 1200, 5, 3000]
+    expected = data_manager.get_flights_by_ids(flight_ids)
+    result = partitioned.get_flights_by_ids(flight_ids)
+
+    assert [record and record.ID for record in result] == [record and record.ID for record in expected]
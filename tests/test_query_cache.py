@@ -0,0 +1,54 @@
+import sqlite3
+import pytest
+from data import FlightDataVisuals
+from query_cache import QueryCache
+
+QUERY = "SELECT DEPARTURE_DELAY FROM flights WHERE ID = :id"
+
+
+@pytest.fixture
+def cached(db_uri):
+    cache = QueryCache()
+    return FlightDataVisuals(db_uri, cache=cache), cache
+
+
+def delay(data_manager):
+    return data_manager._execute_query(QUERY, {'id': 1})[0][0]
+
+
+def write_delay(db_path, value, journal_mode):
+    connection = sqlite3.connect(db_path)
+    connection.execute(f"PRAGMA journal_mode = {journal_mode}")
+    with connection:
+        connection.execute("UPDATE flights SET DEPARTURE_DELAY = ? WHERE ID = 1", (value,))
+    connection.close()
+
+
+def test_repeated_query_is_served_from_the_cache(cached):
+    data_manager, cache = cached
+    assert delay(data_manager) == delay(data_manager)
+
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+@pytest.mark.parametrize('journal_mode', ['DELETE', 'WAL'])
+def test_write_invalidates_the_cache(cached, db_path, journal_mode):
+    data_manager, cache = cached
+    delay(data_manager)
+
+    # Writes of the same size within the same second are told apart by the write counters
+    for value in (1001, 1002, 1003):
+        write_delay(db_path, value, journal_mode)
+        assert delay(data_manager) == value
+    assert cache.stats()['invalidations'] == 3
+
+
+def test_lru_entries_are_evicted():
+    cache = QueryCache(max_entries=2)
+    for key in ('a', 'b', 'c'):
+        cache.put(key, 1, [key])
+
+    assert cache.get('a', 1) == (False, None)
+    assert cache.get('c', 1) == (True, ['c'])
+    assert cache.stats()['evictions'] == 1
@@ -0,0 +1,72 @@
+import hashlib
+import sqlite3
+import numpy as np
+import pytest
+from data import FlightDataVisuals
+
+GETTERS = ('get_percentage_of_delayed_flights_by_airline', 'get_percentage_of_delayed_flights_per_hour',
+           'get_delayed_flights_per_route', 'get_delayed_flights_per_route_with_coordinates')
+
+
+def assert_same_aggregates(summarized, exact):
+    for getter in GETTERS:
+        expected = getattr(exact, getter)(columnar=True)
+        result = getattr(summarized, getter)(columnar=True)
+        assert result.dtype.names == expected.dtype.names, getter
+        assert len(result) == len(expected), getter
+        for field in expected.dtype.names:
+            if expected.dtype[field].kind == 'f':
+                np.testing.assert_allclose(result[field], expected[field], err_msg=f"{getter}.{field}")
+            else:
+                np.testing.assert_array_equal(result[field], expected[field], err_msg=f"{getter}.{field}")
+
+
+def append_flights(db_path, count):
+    """
+    Appends copies of the first flights with new IDs and other delays, as a load would.
+    """
+    with sqlite3.connect(db_path) as connection:
+        columns = [row[1] for row in connection.execute("PRAGMA table_info(flights)") if row[1] != 'DEPARTURE_HOUR']
+        copied = ', '.join(column for column in columns[1:])
+        connection.execute(f"INSERT INTO flights ({', '.join(columns)}) "
+                           f"SELECT ID + (SELECT MAX(ID) FROM flights), {copied.replace('DEPARTURE_DELAY', '45')} "
+                           f"FROM flights ORDER BY ID LIMIT ?", (count,))
+
+
+@pytest.fixture
+def summarized(db_uri):
+    data_manager = FlightDataVisuals(db_uri, use_summaries=True, prepare_tables=True)
+    assert data_manager._use_summaries
+    return data_manager
+
+
+def test_summaries_match_the_exact_aggregates(summarized, data_manager):
+    assert_same_aggregates(summarized, data_manager)
+
+
+def test_refresh_adds_the_appended_flights(summarized, data_manager, db_path):
+    append_flights(db_path, 500)
+    assert summarized.refresh_summaries()
+
+    assert_same_aggregates(summarized, data_manager)
+
+
+def test_refresh_without_new_flights_changes_nothing(summarized, db_path):
+    with open(db_path, 'rb') as db_file:
+        digest = hashlib.md5(db_file.read()).hexdigest()
+    assert summarized.refresh_summaries()
+
+    with open(db_path, 'rb') as db_file:
+        assert hashlib.md5(db_file.read()).hexdigest() == digest
+
+
+def test_creating_a_data_manager_never_writes(db_path, db_uri):
+    with open(db_path, 'rb') as db_file:
+        digest = hashlib.md5(db_file.read()).hexdigest()
+    data_manager = FlightDataVisuals(db_uri, use_summaries=True)
+    data_manager.get_percentage_of_delayed_flights_by_airline()
+    data_manager.get_delayed_flights_per_route(approximate=True)
+
+    assert not data_manager._use_summaries
+    with open(db_path, 'rb') as db_file:
+        assert hashlib.md5(db_file.read()).hexdigest() == digest